@@ -0,0 +1,323 @@
+import argparse
+import json
+import os
+import shutil
+import threading
+import time
+import traceback
+from datetime import datetime
+import pandas as pd
+from models import Cliente, Pago, Estado, TipoServicio, MetodoDePago, ResumenIngresoMensual
+from db_config import session_scope
+
+try:
+    import pyarrow as pa  # Opcional: solo se necesita para el snapshot de analítica
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pc = None
+    ds = None
+    pq = None
+
+# Snapshot columnar de clientes, pagos y catálogos para las consultas analíticas del Dashboard
+# (ingresos por tipo de servicio, bajas por mes de instalación, ARPU), que se calculan sobre
+# archivos Parquet con pyarrow en lugar de consultar la base transaccional.
+#
+# Estructura de cada snapshot (un directorio por exportación; actual.json indica el vigente):
+#   <DIRECTORIO>/<snapshot>/clientes.parquet
+#   <DIRECTORIO>/<snapshot>/pagos/Ano=2024/datos.parquet   (una partición por año del periodo pagado)
+#   <DIRECTORIO>/<snapshot>/estados.parquet, tipos_servicio.parquet, metodos_pago.parquet
+#
+# La exportación es incremental: el manifiesto guarda la cantidad y el total de pagos de cada
+# (Ano, Mes) según resumen_ingresos, que libro_pagos.py actualiza en la misma transacción que cada
+# pago; solo se reescriben los años con algún mes distinto del snapshot anterior (así se incluyen
+# también los pagos confirmados en otro orden que el de sus ID) y las particiones de los demás años
+# se enlazan desde el snapshot anterior. Los clientes y los catálogos se exportan completos.
+# Los pagos sin mes válido no están en el resumen: se incorporan cuando se reescribe su año.
+# Si se corrigen pagos a mano en la base, rehacer con
+#   python analitica.py --completo
+# Los archivos no incluyen nombres, teléfonos ni cédulas de los clientes.
+
+DIRECTORIO = os.environ.get('ANALITICA_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'analitica'))
+INTERVALO = int(os.environ.get('ANALITICA_INTERVALO', 3600))  # Segundos entre exportaciones en segundo plano
+COMPRESION = 'zstd'
+TAMANO_LOTE = 50000
+SNAPSHOTS_GUARDADOS = 2  # El anterior se conserva para las lecturas que estén en curso
+MANIFIESTO = 'actual.json'
+
+_lock_exportacion = threading.Lock()
+
+
+def _esquema_clientes():
+    return pa.schema([
+        ('ID', pa.int64()), ('TipoServicioID', pa.int64()), ('EstadoID', pa.int64()),
+        ('FechaInstalacion', pa.date32()), ('Tarifa', pa.float64()), ('PlanMB', pa.string()), ('Ubicacion', pa.string())
+    ])
+
+
+def _esquema_pagos():
+    return pa.schema([
+        ('ID', pa.int64()), ('ClienteID', pa.int64()), ('FechaPago', pa.date32()),
+        ('Mes', pa.int64()), ('Monto', pa.float64()), ('Metodo_de_PagoID', pa.int64())
+    ])
+
+
+# Escribir el resultado de la consulta en un archivo Parquet, un row group por lote leído con
+# un cursor del lado del servidor; devuelve la cantidad de filas
+def _escribir_consulta(session, consulta, esquema, destino):
+    filas_escritas = 0
+    writer = pq.ParquetWriter(destino, esquema, compression=COMPRESION)
+    try:
+        resultado = session.connection().execution_options(stream_results=True, yield_per=TAMANO_LOTE).execute(consulta.statement)
+        for filas in resultado.partitions():
+            columnas = list(zip(*filas))
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(valores, type=campo.type) for valores, campo in zip(columnas, esquema)], schema=esquema
+            ))
+            filas_escritas += len(filas)
+    finally:
+        writer.close()
+    return filas_escritas
+
+
+def _escribir_catalogo(session, id_columna, nombre_columna, destino):
+    filas = session.query(id_columna, nombre_columna).all()
+    pq.write_table(pa.table({
+        'ID': pa.array([fila[0] for fila in filas], type=pa.int64()),
+        'Nombre': pa.array([fila[1] for fila in filas], type=pa.string())
+    }), destino, compression=COMPRESION)
+
+
+# Enlazar el archivo del snapshot anterior (sin copiar los datos si el sistema de archivos lo permite)
+def _enlazar(origen, destino):
+    os.makedirs(os.path.dirname(destino), exist_ok=True)
+    try:
+        os.link(origen, destino)
+    except OSError:
+        shutil.copy2(origen, destino)
+
+
+def leer_manifiesto(directorio=DIRECTORIO):
+    try:
+        with open(os.path.join(directorio, MANIFIESTO)) as archivo:
+            return json.load(archivo)
+    except FileNotFoundError:
+        return None
+
+
+def ruta_snapshot(manifiesto, directorio=DIRECTORIO):
+    return os.path.join(directorio, manifiesto['snapshot'])
+
+
+def _particion(ruta, anio):
+    return os.path.join(ruta, 'pagos', f'Ano={anio}', 'datos.parquet')
+
+
+# Cantidad y total de pagos por año y mes según el resumen mensual: {'2025': {'3': [cantidad, total]}}
+def _resumen_por_mes(session):
+    resumen = {}
+    filas = session.query(ResumenIngresoMensual.Ano, ResumenIngresoMensual.Mes,
+                          ResumenIngresoMensual.CantidadPagos, ResumenIngresoMensual.Total)
+    for ano, mes, cantidad, total in filas:
+        resumen.setdefault(str(ano), {})[str(mes)] = [int(cantidad or 0), float(total or 0.0)]
+    return resumen
+
+
+# Exportar un snapshot nuevo (incremental respecto del vigente, o completo) y publicarlo; devuelve el manifiesto.
+# Se escribe en un directorio oculto y se publica al final reemplazando actual.json, así las lecturas
+# nunca ven un snapshot a medio escribir.
+def exportar_snapshot(session, directorio=DIRECTORIO, completo=False):
+    if pa is None:
+        raise RuntimeError("Para el snapshot de analítica se necesita el paquete pyarrow.")
+    with _lock_exportacion:
+        inicio = time.perf_counter()
+        anterior = None if completo else leer_manifiesto(directorio)
+        # El resumen se lee antes que los pagos: un pago confirmado entre las dos lecturas queda en la
+        # partición pero no en el manifiesto, y su año se vuelve a escribir en la próxima exportación
+        resumen = _resumen_por_mes(session)
+        anios = sorted(int(anio) for anio in resumen)
+        if anterior is None or 'resumen' not in anterior:
+            reescribir = set(anios)
+        else:
+            # Años con algún mes que cambió y años que no estaban en el snapshot anterior
+            reescribir = {anio for anio in anios if resumen[str(anio)] != anterior['resumen'].get(str(anio))}
+
+        nombre = datetime.now().strftime('%Y%m%d-%H%M%S-%f')
+        temporal = os.path.join(directorio, f'.{nombre}')
+        os.makedirs(temporal)
+        try:
+            clientes = _escribir_consulta(session, session.query(
+                Cliente.ID, Cliente.TipoServicioID, Cliente.EstadoID, Cliente.FechaInstalacion,
+                Cliente.Tarifa, Cliente.PlanMB, Cliente.Ubicacion
+            ).order_by(Cliente.ID), _esquema_clientes(), os.path.join(temporal, 'clientes.parquet'))
+            _escribir_catalogo(session, Estado.ID, Estado.Estado, os.path.join(temporal, 'estados.parquet'))
+            _escribir_catalogo(session, TipoServicio.ID, TipoServicio.Tipo, os.path.join(temporal, 'tipos_servicio.parquet'))
+            _escribir_catalogo(session, MetodoDePago.ID, MetodoDePago.Metodo, os.path.join(temporal, 'metodos_pago.parquet'))
+
+            pagos = 0
+            for anio in anios:
+                destino = _particion(temporal, anio)
+                if anio in reescribir:
+                    os.makedirs(os.path.dirname(destino))
+                    pagos += _escribir_consulta(session, session.query(
+                        Pago.ID, Pago.ClienteID, Pago.FechaPago, Pago.Mes, Pago.Monto, Pago.Metodo_de_PagoID
+                    ).filter(Pago.Ano == anio).order_by(Pago.ID), _esquema_pagos(), destino)
+                else:
+                    _enlazar(_particion(ruta_snapshot(anterior, directorio), anio), destino)
+                    pagos += pq.ParquetFile(destino).metadata.num_rows
+
+            os.rename(temporal, os.path.join(directorio, nombre))
+        except BaseException:
+            shutil.rmtree(temporal, ignore_errors=True)
+            raise
+
+        manifiesto = {
+            'snapshot': nombre,
+            'creado': datetime.now().isoformat(timespec='seconds'),
+            'anios': anios,
+            'resumen': resumen,
+            'anios_reescritos': sorted(reescribir),
+            'clientes': clientes,
+            'pagos': pagos,
+            'segundos': time.perf_counter() - inicio
+        }
+        temporal_manifiesto = os.path.join(directorio, f'.{MANIFIESTO}')
+        with open(temporal_manifiesto, 'w') as archivo:
+            json.dump(manifiesto, archivo)
+        os.replace(temporal_manifiesto, os.path.join(directorio, MANIFIESTO))
+        _borrar_antiguos(directorio)
+        return manifiesto
+
+
+def _borrar_antiguos(directorio):
+    snapshots = sorted(
+        nombre for nombre in os.listdir(directorio)
+        if not nombre.startswith('.') and os.path.isdir(os.path.join(directorio, nombre))
+    )
+    for nombre in snapshots[:-SNAPSHOTS_GUARDADOS]:
+        shutil.rmtree(os.path.join(directorio, nombre), ignore_errors=True)
+
+
+# ---- Consultas sobre el snapshot ----
+
+# Pagos del snapshot (con la columna Ano de la partición), leyendo solo las columnas y años pedidos
+def leer_pagos(ruta, columnas, anios=None):
+    filtros = [('Ano', 'in', list(anios))] if anios else None
+    particiones = ds.partitioning(pa.schema([('Ano', pa.int64())]), flavor='hive')
+    return pq.read_table(os.path.join(ruta, 'pagos'), columns=columnas, filters=filtros,
+                         partitioning=particiones, memory_map=True)
+
+
+def leer_clientes(ruta, columnas):
+    return pq.read_table(os.path.join(ruta, 'clientes.parquet'), columns=columnas, memory_map=True)
+
+
+def leer_catalogo(ruta, nombre):
+    tabla = pq.read_table(os.path.join(ruta, f'{nombre}.parquet'), memory_map=True)
+    return dict(zip(tabla['ID'].to_pylist(), tabla['Nombre'].to_pylist()))
+
+
+def _periodos(tabla):
+    anios = tabla['Ano'].to_numpy()
+    meses = tabla['Mes'].to_numpy()
+    return [f'{anio}-{mes:02d}' for anio, mes in zip(anios.tolist(), meses.tolist())]
+
+
+# Ingresos por periodo (filas, AAAA-MM) y tipo de servicio (columnas)
+def ingresos_por_tipo_servicio(ruta, anios=None):
+    pagos = leer_pagos(ruta, ['ClienteID', 'Mes', 'Monto', 'Ano'], anios)
+    pagos = pagos.filter(pc.and_(pc.greater_equal(pagos['Mes'], 1), pc.less_equal(pagos['Mes'], 12)))
+    clientes = leer_clientes(ruta, ['ID', 'TipoServicioID'])
+    unidos = pagos.join(clientes, keys='ClienteID', right_keys='ID')
+    totales = unidos.group_by(['Ano', 'Mes', 'TipoServicioID']).aggregate([('Monto', 'sum')]).sort_by([('Ano', 'ascending'), ('Mes', 'ascending')])
+
+    tipos = leer_catalogo(ruta, 'tipos_servicio')
+    df = totales.to_pandas()
+    df['Periodo'] = _periodos(totales)
+    df['Tipo de Servicio'] = df['TipoServicioID'].map(tipos).fillna('Sin tipo')
+    return df.pivot_table(index='Periodo', columns='Tipo de Servicio', values='Monto_sum', aggfunc='sum', fill_value=0.0)
+
+
+# Ingreso promedio por cliente que pagó (ARPU) en cada periodo
+def arpu_mensual(ruta, anios=None):
+    pagos = leer_pagos(ruta, ['ClienteID', 'Mes', 'Monto', 'Ano'], anios)
+    pagos = pagos.filter(pc.and_(pc.greater_equal(pagos['Mes'], 1), pc.less_equal(pagos['Mes'], 12)))
+    totales = pagos.group_by(['Ano', 'Mes']).aggregate([('Monto', 'sum'), ('ClienteID', 'count_distinct')])
+    totales = totales.sort_by([('Ano', 'ascending'), ('Mes', 'ascending')])
+    ingresos = totales['Monto_sum'].to_numpy()
+    clientes = totales['ClienteID_count_distinct'].to_numpy()
+    return pd.DataFrame({
+        'Ingresos': ingresos,
+        'Clientes que pagaron': clientes,
+        'ARPU': ingresos / clientes
+    }, index=pd.Index(_periodos(totales), name='Periodo'))
+
+
+# Bajas (clientes retirados) por mes de instalación: cantidad instalada, retirados y tasa de bajas
+def bajas_por_mes_instalacion(ruta, estado_baja='retirado'):
+    clientes = leer_clientes(ruta, ['ID', 'FechaInstalacion', 'EstadoID'])
+    clientes = clientes.filter(pc.is_valid(clientes['FechaInstalacion']))
+    estados_baja = [estado_id for estado_id, nombre in leer_catalogo(ruta, 'estados').items() if (nombre or '').lower() == estado_baja]
+    clientes = clientes.append_column('Ano', pc.year(clientes['FechaInstalacion']))
+    clientes = clientes.append_column('Mes', pc.month(clientes['FechaInstalacion']))
+    clientes = clientes.append_column('Baja', pc.cast(pc.is_in(clientes['EstadoID'], pa.array(estados_baja, type=pa.int64())), pa.int64()))
+    totales = clientes.group_by(['Ano', 'Mes']).aggregate([('ID', 'count'), ('Baja', 'sum')])
+    totales = totales.sort_by([('Ano', 'ascending'), ('Mes', 'ascending')])
+    instalados = totales['ID_count'].to_numpy()
+    bajas = totales['Baja_sum'].to_numpy()
+    return pd.DataFrame({
+        'Instalados': instalados,
+        'Bajas': bajas,
+        'Tasa de bajas': bajas / instalados
+    }, index=pd.Index(_periodos(totales), name='Instalación'))
+
+
+_hilo = None
+_lock = threading.Lock()
+
+
+# Exportar cada intervalo segundos, salvo que el snapshot vigente sea más reciente que eso
+# (p. ej. si lo exportó otro proceso o un cron)
+def _exportar_periodicamente(intervalo, directorio):
+    while True:
+        try:
+            manifiesto = leer_manifiesto(directorio)
+            if manifiesto is None or (datetime.now() - datetime.fromisoformat(manifiesto['creado'])).total_seconds() >= intervalo:
+                with session_scope() as session:
+                    exportar_snapshot(session, directorio)
+        except Exception:
+            traceback.print_exc()
+        time.sleep(intervalo)
+
+
+# Sin pyarrow no se puede exportar ni leer el snapshot
+def disponible():
+    return pa is not None
+
+
+# Hilo único por proceso que mantiene el snapshot de analítica al día (sin pyarrow no hace nada)
+def iniciar_exportacion_periodica(intervalo=INTERVALO, directorio=DIRECTORIO):
+    global _hilo
+    if pa is None or intervalo <= 0:
+        return
+    with _lock:
+        if _hilo is None or not _hilo.is_alive():
+            _hilo = threading.Thread(target=_exportar_periodicamente, args=(intervalo, directorio), name='analitica', daemon=True)
+            _hilo.start()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Exportar el snapshot columnar de analítica (Parquet).')
+    parser.add_argument('--directorio', default=DIRECTORIO)
+    parser.add_argument('--completo', action='store_true', help='Reescribir todos los años')
+    parser.add_argument('--cada', type=int, default=None, help='Repetir cada N segundos (en lugar de usar cron)')
+    args = parser.parse_args()
+
+    with session_scope() as session:
+        manifiesto = exportar_snapshot(session, args.directorio, args.completo)
+    print(f"Snapshot {manifiesto['snapshot']}: {manifiesto['clientes']} clientes, {manifiesto['pagos']} pagos, "
+          f"años reescritos {manifiesto['anios_reescritos']} ({manifiesto['segundos']:.1f} s)")
+    if args.cada:
+        _exportar_periodicamente(args.cada, args.directorio)
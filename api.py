@@ -0,0 +1,280 @@
+import asyncio
+import base64
+import gzip
+import hashlib
+import hmac
+import json
+import os
+import re
+from datetime import date, datetime
+from urllib.parse import parse_qs
+import numpy as np
+import pandas as pd
+from db_config import session_scope
+from instrumentacion import medir_pagina, texto_prometheus
+from cache import cache
+import servicios
+
+# API HTTP de solo lectura con los datos del Dashboard (clientes, pagos por cliente, morosos e
+# ingresos mensuales) para las herramientas internas, sin pasar por las páginas de Streamlit.
+# Usa las mismas funciones de servicios.py que las páginas y una sesión por petición.
+# Es una aplicación ASGI sin dependencias extra; se sirve con cualquier servidor ASGI:
+#
+#   API_TOKEN=... uvicorn api:app --host 0.0.0.0 --port 8000
+#
+# Todas las respuestas son JSON con ETag (se responde 304 si coincide con If-None-Match) y se
+# comprimen con gzip si el cliente lo acepta. Se exige "Authorization: Bearer <API_TOKEN>";
+# sin API_TOKEN la aplicación no arranca, salvo con python api.py escuchando solo en la máquina
+# local (API_HOST 127.0.0.1, localhost o ::1).
+
+API_TOKEN = os.environ.get('API_TOKEN')
+HOSTS_LOCALES = ('127.0.0.1', 'localhost', '::1')
+MAX_AGE = int(os.environ.get('API_MAX_AGE', 60))  # Segundos que el cliente puede reutilizar la respuesta
+TAMANO_DEFECTO = 100
+TAMANO_MAXIMO = 1000
+MINIMO_GZIP = 1024  # Las respuestas más chicas no se comprimen
+
+
+# Error con código HTTP que se devuelve como {"error": mensaje}
+class ErrorAPI(Exception):
+    def __init__(self, estado, mensaje):
+        super().__init__(mensaje)
+        self.estado = estado
+        self.mensaje = mensaje
+
+
+# ---- Parámetros ----
+
+def _entero(parametros, nombre, defecto=None, minimo=None, maximo=None):
+    valor = parametros.get(nombre)
+    if valor is None or valor == '':
+        return defecto
+    try:
+        valor = int(valor)
+    except ValueError:
+        raise ErrorAPI(400, f'{nombre} debe ser un número entero')
+    if (minimo is not None and valor < minimo) or (maximo is not None and valor > maximo):
+        raise ErrorAPI(400, f'{nombre} fuera de rango')
+    return valor
+
+
+def _tamano(parametros):
+    return _entero(parametros, 'tamano', TAMANO_DEFECTO, 1, TAMANO_MAXIMO)
+
+
+# El cursor de la paginación por clave (valor de orden, ID) viaja como texto base64
+def codificar_cursor(clave):
+    if clave is None:
+        return None
+    return base64.urlsafe_b64encode(json.dumps(list(clave)).encode()).decode().rstrip('=')
+
+
+def decodificar_cursor(texto):
+    if not texto:
+        return None
+    try:
+        valor, ultimo_id = json.loads(base64.urlsafe_b64decode(texto + '=' * (-len(texto) % 4)))
+        return valor, int(ultimo_id)
+    except (ValueError, TypeError):
+        raise ErrorAPI(400, 'cursor inválido')
+
+
+# Página de un DataFrame ya calculado (numeración desde 1)
+def _pagina_df(df, parametros):
+    pagina = _entero(parametros, 'pagina', 1, 1)
+    tamano = _tamano(parametros)
+    inicio = (pagina - 1) * tamano
+    return {
+        'datos': registros(df.iloc[inicio:inicio + tamano]),
+        'pagina': pagina,
+        'tamano': tamano,
+        'total': len(df)
+    }
+
+
+# ---- Serialización ----
+
+def _valor_json(valor):
+    if isinstance(valor, (datetime, date, pd.Timestamp)):
+        return valor.isoformat()
+    if isinstance(valor, np.generic):
+        return valor.item()
+    raise TypeError(f'{type(valor).__name__} no se puede convertir a JSON')
+
+
+# Filas de un DataFrame como lista de diccionarios (NaN y NaT como null)
+def registros(df):
+    return df.astype(object).where(df.notna(), None).to_dict(orient='records')
+
+
+def a_json(datos):
+    return json.dumps(datos, default=_valor_json, ensure_ascii=False, separators=(',', ':')).encode()
+
+
+# ---- Endpoints ----
+
+def listar_clientes(session, parametros):
+    orden = parametros.get('orden', 'ID')
+    if orden not in ('ID', 'Nombre'):
+        raise ErrorAPI(400, 'orden debe ser ID o Nombre')
+    df, siguiente, total = servicios.listar_clientes(
+        session,
+        _entero(parametros, 'estado_id'),
+        _entero(parametros, 'tipo_servicio_id'),
+        orden,
+        decodificar_cursor(parametros.get('despues')),
+        _tamano(parametros)
+    )
+    return {'datos': registros(df), 'siguiente': codificar_cursor(siguiente), 'total': total}
+
+
+def ver_cliente(session, parametros, cliente_id):
+    cliente = servicios.obtener_cliente(session, cliente_id)
+    if cliente is None:
+        raise ErrorAPI(404, 'cliente no encontrado')
+    return cliente
+
+
+def pagos_cliente(session, parametros, cliente_id):
+    if servicios.obtener_cliente(session, cliente_id) is None:
+        raise ErrorAPI(404, 'cliente no encontrado')
+    return _pagina_df(servicios.pagos_de_cliente(session, cliente_id), parametros)
+
+
+# El reporte de morosos se recorre por páginas: se guarda en la caché (grupo 'ingresos', que se
+# invalida al registrar pagos) para no recalcularlo en cada página del mismo día
+def morosos(session, parametros):
+    minimo = _entero(parametros, 'minimo', 3, 1)
+    df_morosos, avisos = cache.obtener_o_calcular(
+        'ingresos', ('morosos_api', minimo, date.today()), lambda: servicios.reporte_morosos(session, minimo)
+    )
+    return {**_pagina_df(df_morosos, parametros), 'avisos': avisos}
+
+
+def ingresos(session, parametros):
+    try:
+        anios = [int(anio) for anio in parametros['anios'].split(',') if anio] if parametros.get('anios') else None
+    except ValueError:
+        raise ErrorAPI(400, 'anios debe ser una lista de años separados por comas')
+    ingresos_anio, actualizado = servicios.ingresos_por_anio(session, anios)
+    return {
+        'ingresos': {str(anio): ingresos_anio[anio].to_dict() for anio in ingresos_anio.columns},
+        'actualizado': actualizado
+    }
+
+
+# Rutas: (patrón, nombre para la instrumentación, función). Los grupos del patrón se pasan
+# a la función como enteros.
+RUTAS = [
+    (re.compile(r'/clientes/?'), '/clientes', listar_clientes),
+    (re.compile(r'/clientes/(\d+)/?'), '/clientes/{id}', ver_cliente),
+    (re.compile(r'/clientes/(\d+)/pagos/?'), '/clientes/{id}/pagos', pagos_cliente),
+    (re.compile(r'/morosos/?'), '/morosos', morosos),
+    (re.compile(r'/ingresos/?'), '/ingresos', ingresos)
+]
+
+
+# Resolver una petición GET a (estado, cuerpo JSON) dentro de una sesión propia.
+# Las consultas quedan medidas en el panel de instrumentación como "API <ruta>".
+def responder(ruta, parametros):
+    for patron, nombre, funcion in RUTAS:
+        coincidencia = patron.fullmatch(ruta)
+        if coincidencia:
+            with medir_pagina(f'API {nombre}'):
+                with session_scope() as session:
+                    return 200, a_json(funcion(session, parametros, *map(int, coincidencia.groups())))
+    raise ErrorAPI(404, 'ruta no encontrada')
+
+
+# ---- Aplicación ASGI ----
+
+def etag(cuerpo):
+    return 'W/"' + hashlib.sha256(cuerpo).hexdigest()[:32] + '"'
+
+
+def _coincide_etag(valor_etag, if_none_match):
+    if not if_none_match:
+        return False
+    etiquetas = [etiqueta.strip() for etiqueta in if_none_match.split(',')]
+    # La comparación es débil: se ignora el prefijo W/
+    return '*' in etiquetas or valor_etag[2:] in [etiqueta.removeprefix('W/') for etiqueta in etiquetas]
+
+
+_sin_token_local = False  # Lo activa python api.py al escuchar solo en la máquina local sin API_TOKEN
+
+
+# Se comparan bytes: compare_digest no acepta textos con caracteres fuera de ASCII
+def _autorizado(encabezados):
+    if not API_TOKEN:
+        return _sin_token_local
+    return hmac.compare_digest(encabezados.get('authorization', '').encode(), f'Bearer {API_TOKEN}'.encode())
+
+
+# Estado, encabezados y cuerpo de la respuesta a una petición
+def procesar(metodo, ruta, consulta, encabezados):
+    parametros = {nombre: valores[-1] for nombre, valores in parse_qs(consulta).items()}
+    try:
+        if metodo not in ('GET', 'HEAD'):
+            raise ErrorAPI(405, 'solo se permiten GET y HEAD')
+        if not _autorizado(encabezados):
+            raise ErrorAPI(401, 'token inválido')
+        if ruta == '/metricas':
+            return 200, [('content-type', 'text/plain; version=0.0.4; charset=utf-8')], texto_prometheus().encode()
+        estado, cuerpo = responder(ruta, parametros)
+    except ErrorAPI as error:
+        estado, cuerpo = error.estado, a_json({'error': error.mensaje})
+
+    respuesta = [('content-type', 'application/json; charset=utf-8'), ('vary', 'Accept-Encoding')]
+    if estado != 200:
+        return estado, respuesta, cuerpo
+
+    valor_etag = etag(cuerpo)
+    respuesta += [('etag', valor_etag), ('cache-control', f'private, max-age={MAX_AGE}')]
+    if _coincide_etag(valor_etag, encabezados.get('if-none-match')):
+        return 304, respuesta, b''
+    if len(cuerpo) >= MINIMO_GZIP and 'gzip' in encabezados.get('accept-encoding', ''):
+        cuerpo = gzip.compress(cuerpo, compresslevel=6)
+        respuesta.append(('content-encoding', 'gzip'))
+    return 200, respuesta, cuerpo
+
+
+# Punto de entrada ASGI. Las consultas son síncronas, así que cada petición corre en un hilo
+# aparte para no bloquear el bucle de eventos del servidor.
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        while True:
+            mensaje = await receive()
+            if mensaje['type'] == 'lifespan.startup':
+                if not API_TOKEN and not _sin_token_local:
+                    await send({'type': 'lifespan.startup.failed', 'message': 'Definir API_TOKEN para servir la API'})
+                    return
+                await send({'type': 'lifespan.startup.complete'})
+            elif mensaje['type'] == 'lifespan.shutdown':
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+    if scope['type'] != 'http':
+        return
+
+    encabezados = {nombre.decode('latin-1').lower(): valor.decode('latin-1') for nombre, valor in scope['headers']}
+    estado, respuesta, cuerpo = await asyncio.to_thread(
+        procesar, scope['method'], scope['path'], scope.get('query_string', b'').decode('latin-1'), encabezados
+    )
+    respuesta.append(('content-length', str(len(cuerpo))))
+    await send({
+        'type': 'http.response.start',
+        'status': estado,
+        'headers': [(nombre.encode('latin-1'), valor.encode('latin-1')) for nombre, valor in respuesta]
+    })
+    await send({'type': 'http.response.body', 'body': b'' if scope['method'] == 'HEAD' else cuerpo})
+
+
+if __name__ == '__main__':
+    import sys
+    import uvicorn
+
+    host = os.environ.get('API_HOST', '127.0.0.1')
+    if not API_TOKEN:
+        if host not in HOSTS_LOCALES:
+            sys.exit(f'Definir API_TOKEN para servir la API en {host}')
+        _sin_token_local = True
+    uvicorn.run(app, host=host, port=int(os.environ.get('API_PUERTO', 8000)))
@@ -0,0 +1,108 @@
+import csv
+import io
+import re
+import unicodedata
+from datetime import date, datetime
+
+try:
+    import openpyxl  # Opcional: solo para leer archivos .xlsx
+except ImportError:
+    openpyxl = None
+
+# Lectura de planillas (CSV o XLSX) para las importaciones masivas de pagos y clientes
+
+FORMATOS_FECHA = ['%Y-%m-%d', '%d/%m/%Y', '%d-%m-%Y', '%Y/%m/%d']
+
+# Parte entera con separador de miles: primer grupo de 1 a 3 dígitos (sin cero a la izquierda) y grupos de 3
+_MILES = {separador: re.compile(rf'[1-9]\d{{0,2}}(?:{re.escape(separador)}\d{{3}})+') for separador in '.,'}
+
+
+def sin_tildes(texto):
+    return ''.join(c for c in unicodedata.normalize('NFKD', texto) if not unicodedata.combining(c))
+
+
+# Leer las filas una por una como diccionarios {campo interno: valor}.
+# encabezados traduce el encabezado de la planilla (sin tildes, en minúsculas) al campo interno;
+# las columnas que no aparecen en encabezados se ignoran.
+def leer_filas(archivo, nombre_archivo, encabezados):
+    if nombre_archivo.lower().endswith('.xlsx'):
+        if openpyxl is None:
+            raise RuntimeError("Para leer archivos .xlsx se necesita el paquete openpyxl.")
+        libro = openpyxl.load_workbook(archivo, read_only=True, data_only=True)
+        filas = libro.active.iter_rows(values_only=True)
+    else:
+        texto = io.TextIOWrapper(archivo, encoding='utf-8-sig', newline='')
+        muestra = texto.read(4096)
+        texto.seek(0)
+        try:
+            dialecto = csv.Sniffer().sniff(muestra, delimiters=',;\t')
+        except csv.Error:
+            dialecto = csv.excel
+        filas = csv.reader(texto, dialecto)
+
+    campos = [encabezados.get(sin_tildes(str(encabezado or '')).lower().strip()) for encabezado in next(filas, [])]
+    for fila in filas:
+        if any(valor not in (None, '') for valor in fila):
+            yield {campo: valor for campo, valor in zip(campos, fila) if campo}
+
+
+# Cédulas y teléfonos se comparan solo por sus dígitos
+def clave_documento(valor):
+    if valor is None:
+        return ''
+    if isinstance(valor, float) and valor.is_integer():
+        valor = int(valor)
+    return ''.join(c for c in str(valor) if c.isdigit())
+
+
+def parsear_fecha(valor):
+    if isinstance(valor, datetime):
+        return valor.date()
+    if isinstance(valor, date):
+        return valor
+    for formato in FORMATOS_FECHA:
+        try:
+            return datetime.strptime(str(valor).strip(), formato).date()
+        except ValueError:
+            continue
+    return None
+
+
+# Número escrito a mano o en un extracto: "45000", "45.000", "45,000.50", "1.234.567,89", "$ 60.000".
+# El separador decimal se decide por la forma del número, sin adivinar:
+#   - con punto y coma, el último es el decimal y el otro separa miles (en grupos de 3);
+#   - un separador repetido separa miles;
+#   - un solo separador seguido de exactamente 3 dígitos separa miles; seguido de 1 o 2, es el decimal.
+# Lo que no encaja (por ejemplo "1.2345", "0.500" o "1.23.4") es ambiguo y se devuelve None.
+def parsear_numero(valor):
+    if isinstance(valor, (int, float)):
+        return valor
+    texto = str(valor or '').strip().replace('$', '').replace(' ', '').replace('\xa0', '')
+    signo = -1.0 if texto.startswith('-') else 1.0
+    texto = texto.removeprefix('-').removeprefix('+')
+
+    separadores = [c for c in texto if c in '.,']
+    if not separadores:
+        entero, decimales = texto, ''
+    elif len(set(separadores)) == 2:
+        decimal = separadores[-1]
+        if separadores.count(decimal) > 1 or texto.endswith(decimal):
+            return None
+        entero, decimales = texto.split(decimal)
+        if not _MILES[separadores[0]].fullmatch(entero):
+            return None
+    elif len(separadores) > 1:
+        entero, decimales = texto, ''
+        if not _MILES[separadores[0]].fullmatch(entero):
+            return None
+    else:
+        entero, decimales = texto.split(separadores[0])
+        if len(decimales) == 3 and _MILES[separadores[0]].fullmatch(texto):
+            entero, decimales = texto, ''
+        elif len(decimales) not in (1, 2):
+            return None
+
+    entero = entero.replace('.', '').replace(',', '')
+    if not entero.isdigit() or (decimales and not decimales.isdigit()):
+        return None
+    return signo * float(f'{entero}.{decimales or 0}')
@@ -0,0 +1,196 @@
+import base64
+import hashlib
+import hmac
+import os
+import re
+import secrets
+import threading
+import time
+from collections import deque
+from cache import CacheMemoria, CacheRedis, redis
+
+# Contraseñas, sesiones y límite de intentos de inicio de sesión.
+# Las contraseñas se guardan con scrypt (sal aleatoria y costo ajustable):
+#   scrypt$<n>$<r>$<p>$<sal base64>$<hash base64>
+# Si OpenSSL no trae scrypt se usa PBKDF2-SHA256 (pbkdf2_sha256$<iteraciones>$<sal>$<hash>).
+# Los hashes SHA-256 sin sal de versiones anteriores se siguen aceptando y se reemplazan
+# por el formato nuevo en el siguiente inicio de sesión correcto (ver necesita_rehash).
+
+SCRYPT_N = int(os.environ.get('AUTH_SCRYPT_N', 2 ** 14))
+SCRYPT_R = int(os.environ.get('AUTH_SCRYPT_R', 8))
+SCRYPT_P = int(os.environ.get('AUTH_SCRYPT_P', 1))
+PBKDF2_ITERACIONES = int(os.environ.get('AUTH_PBKDF2_ITERACIONES', 600000))
+TAMANO_SAL = 16
+
+# Intentos fallidos permitidos por usuario y por IP dentro de la ventana (segundos)
+MAX_INTENTOS_USUARIO = int(os.environ.get('AUTH_MAX_INTENTOS_USUARIO', 5))
+MAX_INTENTOS_IP = int(os.environ.get('AUTH_MAX_INTENTOS_IP', 20))
+VENTANA_INTENTOS = int(os.environ.get('AUTH_VENTANA_INTENTOS', 300))
+MAX_CLAVES_INTENTOS = 10000  # Al superarlo se limpian las claves sin fallos recientes
+
+# Duración de una sesión iniciada (segundos) y cantidad máxima de sesiones en memoria
+DURACION_SESION = int(os.environ.get('AUTH_DURACION_SESION', 8 * 3600))
+MAX_SESIONES = int(os.environ.get('AUTH_MAX_SESIONES', 10000))
+
+_SHA256_ANTIGUO = re.compile(r'[0-9a-f]{64}')
+
+try:
+    hashlib.scrypt(b'', salt=b'0' * TAMANO_SAL, n=2, r=1, p=1)
+    ALGORITMO = 'scrypt'
+except (AttributeError, ValueError):
+    ALGORITMO = 'pbkdf2_sha256'
+
+
+def _b64(datos):
+    return base64.b64encode(datos).decode()
+
+
+def _derivar(algoritmo, parametros, password, sal):
+    if algoritmo == 'scrypt' and len(parametros) == 3:
+        n, r, p = parametros
+        return hashlib.scrypt(password.encode(), salt=sal, n=n, r=r, p=p, maxmem=256 * n * r + 2 ** 20, dklen=32)
+    if algoritmo == 'pbkdf2_sha256' and len(parametros) == 1:
+        return hashlib.pbkdf2_hmac('sha256', password.encode(), sal, parametros[0])
+    raise ValueError(f'Formato de hash desconocido: {algoritmo}')
+
+
+def _parametros_actuales():
+    return (SCRYPT_N, SCRYPT_R, SCRYPT_P) if ALGORITMO == 'scrypt' else (PBKDF2_ITERACIONES,)
+
+
+def hash_password(password):
+    sal = secrets.token_bytes(TAMANO_SAL)
+    parametros = _parametros_actuales()
+    hash_ = _derivar(ALGORITMO, parametros, password, sal)
+    return '$'.join([ALGORITMO, *map(str, parametros), _b64(sal), _b64(hash_)])
+
+
+# Comparar la contraseña con el hash guardado (formato nuevo o SHA-256 antiguo) en tiempo constante
+def verificar_password(stored_password, provided_password):
+    if not stored_password:
+        return False
+    if _SHA256_ANTIGUO.fullmatch(stored_password):
+        return hmac.compare_digest(stored_password, hashlib.sha256(provided_password.encode()).hexdigest())
+    try:
+        algoritmo, *parametros, sal, hash_ = stored_password.split('$')
+        esperado = base64.b64decode(hash_)
+        calculado = _derivar(algoritmo, tuple(map(int, parametros)), provided_password, base64.b64decode(sal))
+    except (ValueError, TypeError):
+        return False
+    return hmac.compare_digest(calculado, esperado)
+
+
+# El hash es SHA-256 antiguo o usa un algoritmo o costo distinto del configurado
+def necesita_rehash(stored_password):
+    prefijo = '$'.join([ALGORITMO, *map(str, _parametros_actuales())]) + '$'
+    return not (stored_password or '').startswith(prefijo)
+
+
+# Hash para comparar cuando el usuario no existe: la respuesta tarda lo mismo que con un
+# usuario real y no revela qué nombres de usuario existen
+_HASH_FICTICIO = hash_password(secrets.token_hex(16))
+
+
+def verificacion_ficticia(password):
+    verificar_password(_HASH_FICTICIO, password)
+
+
+# ---- Límite de intentos ----
+
+# Se rechazó el intento sin verificar la contraseña; segundos es la espera hasta poder reintentar
+class IntentosExcedidos(Exception):
+    def __init__(self, segundos):
+        super().__init__(f'Demasiados intentos fallidos. Intenta de nuevo en {segundos} segundos.')
+        self.segundos = segundos
+
+
+# Intentos fallidos recientes por clave (usuario o IP) en una ventana deslizante, en memoria del proceso
+class LimiteIntentos:
+    def __init__(self, ventana=VENTANA_INTENTOS):
+        self.ventana = ventana
+        self._fallos = {}
+        self._lock = threading.Lock()
+
+    def _recientes(self, clave, ahora):
+        fallos = self._fallos.get(clave)
+        while fallos and fallos[0] <= ahora - self.ventana:
+            fallos.popleft()
+        if fallos is not None and not fallos:
+            del self._fallos[clave]
+            return None
+        return fallos
+
+    # Segundos de espera si la clave ya alcanzó el máximo de fallos; 0 si puede intentar
+    def espera(self, clave, maximo):
+        ahora = time.monotonic()
+        with self._lock:
+            fallos = self._recientes(clave, ahora)
+            if fallos is None or len(fallos) < maximo:
+                return 0
+            return int(fallos[-maximo] + self.ventana - ahora) + 1
+
+    def registrar_fallo(self, clave):
+        ahora = time.monotonic()
+        with self._lock:
+            self._fallos.setdefault(clave, deque()).append(ahora)
+            if len(self._fallos) > MAX_CLAVES_INTENTOS:
+                for otra in list(self._fallos):
+                    self._recientes(otra, ahora)
+
+    def reiniciar(self, clave):
+        with self._lock:
+            self._fallos.pop(clave, None)
+
+
+limite_intentos = LimiteIntentos()
+
+
+# Lanzar IntentosExcedidos si el usuario o la IP superaron los fallos permitidos
+def comprobar_intentos(username, ip=None):
+    espera = limite_intentos.espera(('usuario', username.lower()), MAX_INTENTOS_USUARIO)
+    if ip:
+        espera = max(espera, limite_intentos.espera(('ip', ip), MAX_INTENTOS_IP))
+    if espera:
+        raise IntentosExcedidos(espera)
+
+
+def registrar_intento(username, ip, correcto):
+    if correcto:
+        limite_intentos.reiniciar(('usuario', username.lower()))
+        return
+    limite_intentos.registrar_fallo(('usuario', username.lower()))
+    if ip:
+        limite_intentos.registrar_fallo(('ip', ip))
+
+
+# ---- Sesiones ----
+
+# Datos del usuario por token de sesión, para no consultar master_users en cada ejecución del script.
+# Con CACHE_REDIS_URL las sesiones se comparten entre procesos.
+def _crear_almacen():
+    url = os.environ.get('CACHE_REDIS_URL')
+    if url and redis is not None:
+        return CacheRedis(url)
+    return CacheMemoria(MAX_SESIONES)
+
+
+_sesiones = _crear_almacen()
+
+
+def crear_sesion(usuario):
+    token = secrets.token_urlsafe(32)
+    _sesiones.escribir(f'sesion:{token}', usuario, DURACION_SESION)
+    return token
+
+
+# Usuario de la sesión, o None si el token no existe o expiró
+def usuario_de_sesion(token):
+    if not token:
+        return None
+    encontrado = _sesiones.leer(f'sesion:{token}')
+    return encontrado[0] if encontrado else None
+
+
+def cerrar_sesion(token):
+    if token:
+        _sesiones.borrar(f'sesion:{token}')
@@ -0,0 +1,149 @@
+import argparse
+import json
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from carga import DASHBOARD, USUARIO_CARGA, PASSWORD_CARGA, sembrar  # noqa: E402
+
+# Consultas y ejecuciones del script por interacción en Editar Cliente, Buscar Cliente y Agregar Pago,
+# según los contadores por página de instrumentacion.py. Una sesión de Streamlit sin navegador
+# (AppTest) inicia sesión y hace un recorrido fijo en cada página: entrar, escribir en los campos y
+# pulsar los botones.
+#
+# Escribir en un campo que está dentro de un st.form no vuelve a ejecutar el script en el navegador:
+# esas interacciones se cuentan con 0 ejecuciones y 0 consultas, y el valor viaja con el botón del
+# formulario. AppTest ejecuta el script completo aunque el widget esté en un fragmento, así que las
+# cifras de las páginas con fragmentos son una cota superior de lo que ocurre en el navegador.
+#
+# Uso:
+#   python benchmarks/consultas_paginas.py --clientes 1000
+#   python benchmarks/consultas_paginas.py --clientes 1000 --salida consultas.json
+
+# Recorridos: (acción, tipo de widget, clave o etiqueta, valor)
+RECORRIDOS = {
+    'Editar Cliente': [
+        ('ir', None, None, None),
+        ('escribir', 'text_input', 'Nombre del Cliente', 'cliente editado'),
+        ('escribir', 'text_input', 'Telefono', '3001234567'),
+        ('escribir', 'number_input', 'Tarifa', 50000.0),
+        ('pulsar', 'button', 'Guardar Cambios', None)
+    ],
+    'Buscar Cliente': [
+        ('ir', None, None, None),
+        ('escribir', 'selectbox', 'buscar_por', 'Nombre'),
+        ('escribir', 'text_input', 'buscar_valor', 'an'),
+        ('pulsar', 'button', 'Buscar', None),
+        ('escribir', 'number_input', 'pagina_busqueda', 2)
+    ],
+    'Agregar Pago': [
+        ('ir', None, None, None),
+        ('escribir', 'selectbox', 'buscar_pago_por', 'Cedula'),
+        ('escribir', 'text_input', 'buscar_pago_valor', '10000001'),
+        ('pulsar', 'button', 'Buscar Cliente', None),
+        ('escribir', 'selectbox', 'mes_pago', 'MARZO'),
+        ('escribir', 'number_input', 'monto_pago', 60000.0),
+        ('pulsar', 'button', 'Agregar Pago', None)
+    ]
+}
+
+
+# Widget por clave o, si no hay, por etiqueta (las claves de algunos campos llevan el ID del cliente)
+def _widget(app, tipo, nombre):
+    widgets = list(getattr(app, tipo))
+    for widget in widgets:
+        if widget.key == nombre:
+            return widget
+    for widget in widgets:
+        if widget.label == nombre:
+            return widget
+    raise LookupError(f'No se encontró el widget {tipo} {nombre!r}')
+
+
+def _en_formulario(widget):
+    return bool(getattr(widget.proto, 'form_id', ''))
+
+
+# Ejecutar una interacción y devolver las ejecuciones medidas por instrumentacion durante ella
+def _interactuar(app, pagina, accion, tipo, nombre, valor):
+    from instrumentacion import ejecuciones_recientes, reiniciar_metricas
+
+    reiniciar_metricas()
+    if accion == 'ir':
+        app.sidebar.radio[0].set_value(pagina).run()
+    else:
+        widget = _widget(app, tipo, nombre)
+        if accion == 'pulsar':
+            widget.click().run()
+        else:
+            widget.set_value(valor)
+            if not _en_formulario(widget):
+                app.run()
+    if app.exception:
+        raise RuntimeError(f'{pagina} / {nombre}: {app.exception[0].message}')
+    ejecuciones = ejecuciones_recientes()
+    return {
+        'paso': pagina if accion == 'ir' else f'{accion} {nombre}',
+        'ejecuciones': len(ejecuciones),
+        'consultas': sum(ejecucion['consultas'] for ejecucion in ejecuciones),
+        'paginas': sorted({ejecucion['pagina'] for ejecucion in ejecuciones})
+    }
+
+
+def medir(usuario, password, timeout):
+    from streamlit.testing.v1 import AppTest
+
+    app = AppTest.from_file(DASHBOARD, default_timeout=timeout)
+    app.run()
+    app.text_input[0].input(usuario)
+    app.text_input[1].input(password)
+    next(boton for boton in app.button if boton.label == 'Iniciar Sesión').click().run()
+    if not app.session_state['logged_in']:
+        raise RuntimeError('No se pudo iniciar sesión')
+    app.run()
+
+    resultados = {}
+    for pagina, recorrido in RECORRIDOS.items():
+        pasos = [_interactuar(app, pagina, *paso) for paso in recorrido]
+        resultados[pagina] = {
+            'pasos': pasos,
+            'ejecuciones': sum(paso['ejecuciones'] for paso in pasos),
+            'consultas': sum(paso['consultas'] for paso in pasos)
+        }
+    return resultados
+
+
+def imprimir(resultados):
+    for pagina, resultado in resultados.items():
+        print(f"{pagina}: {resultado['consultas']} consultas en {resultado['ejecuciones']} ejecuciones", file=sys.stderr)
+        for paso in resultado['pasos']:
+            print(f"  {paso['paso']:32} {paso['ejecuciones']:3} ejecuciones {paso['consultas']:4} consultas", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Consultas por interacción en Editar Cliente, Buscar Cliente y Agregar Pago.')
+    parser.add_argument('--url', default=None, help='Base de prueba (se BORRA salvo con --sin-sembrar); por defecto un SQLite temporal')
+    parser.add_argument('--clientes', type=int, default=1000, help='Clientes sintéticos a cargar')
+    parser.add_argument('--semilla', type=int, default=42)
+    parser.add_argument('--sin-sembrar', action='store_true', help='Usar los datos que ya tiene la base')
+    parser.add_argument('--usuario', default=USUARIO_CARGA)
+    parser.add_argument('--password', default=PASSWORD_CARGA)
+    parser.add_argument('--timeout', type=float, default=120, help='Tiempo máximo de una ejecución del script')
+    parser.add_argument('--salida', default=None, help='Archivo JSON del reporte (por defecto se imprime)')
+    args = parser.parse_args()
+
+    # db_config lee DB_URL al importarse: se define antes de importar la aplicación
+    url = args.url or f"sqlite:///{os.path.join(tempfile.gettempdir(), f'vozip_consultas_{args.clientes}.db')}"
+    os.environ['DB_URL'] = url
+    if not args.sin_sembrar:
+        sembrar(url, args.clientes, 6, args.semilla)
+
+    resultados = medir(args.usuario, args.password, args.timeout)
+    imprimir(resultados)
+    if args.salida:
+        with open(args.salida, 'w') as archivo:
+            json.dump(resultados, archivo, indent=2)
+    else:
+        print(json.dumps(resultados, indent=2))
@@ -0,0 +1,125 @@
+import argparse
+import os
+import sys
+from datetime import date
+import numpy as np
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import Base, Cliente, TipoServicio, Pago, Estado, MetodoDePago  # noqa: E402
+from libro_pagos import reconstruir_resumen  # noqa: E402
+
+# Generador de datos sintéticos para los benchmarks: catálogos, clientes y pagos.
+# Con la misma semilla y cantidades siempre produce exactamente los mismos datos.
+#
+# Uso: python benchmarks/datos_sinteticos.py sqlite:////tmp/vozip_bench.db --clientes 100000
+
+ESTADOS = ['activo', 'retirado', 'suspendido']
+PROBABILIDAD_ESTADOS = [0.8, 0.12, 0.08]
+TIPOS_SERVICIO = ['Fibra', 'Radio', 'Satelital']
+METODOS_PAGO = ['Efectivo', 'Transferencia', 'Nequi']
+NOMBRES = ['juan', 'maria', 'jose', 'ana', 'luis', 'carmen', 'carlos', 'sofia', 'pedro', 'laura',
+           'andres', 'diana', 'jorge', 'paula', 'miguel', 'sandra', 'oscar', 'natalia', 'diego', 'camila']
+APELLIDOS = ['gomez', 'rodriguez', 'martinez', 'garcia', 'lopez', 'hernandez', 'gonzalez', 'perez',
+             'sanchez', 'ramirez', 'torres', 'diaz', 'vargas', 'castro', 'rojas', 'moreno']
+UBICACIONES = ['centro', 'norte', 'sur', 'vereda el placer', 'vereda la esperanza', 'barrio obrero']
+PLANES = ['5', '10', '20', '50', '100']
+TARIFAS = [45000.0, 60000.0, 80000.0, 120000.0, 0.0]
+ANOS_PAGO = [2024, 2025]
+
+TAMANO_LOTE = 20000
+
+
+def _fechas(rng, desde, hasta, cantidad):
+    ordinales = rng.integers(desde.toordinal(), hasta.toordinal() + 1, cantidad)
+    return [date.fromordinal(ordinal) for ordinal in ordinales.tolist()]
+
+
+def generar_clientes(rng, primer_id, cantidad):
+    ids = np.arange(primer_id, primer_id + cantidad)
+    nombres = rng.choice(NOMBRES, cantidad)
+    apellidos = rng.choice(APELLIDOS, cantidad)
+    telefonos = rng.integers(3000000000, 3250000000, cantidad)
+    estados = rng.choice(np.arange(1, len(ESTADOS) + 1), cantidad, p=PROBABILIDAD_ESTADOS)
+    return [
+        {
+            'ID': cliente_id,
+            'NombreCliente': f'{nombre} {apellido} {cliente_id}',
+            'PlanMB': plan,
+            'FechaInstalacion': fecha,
+            'TipoServicioID': tipo,
+            'Tarifa': tarifa,
+            'IPAddress': f'10.{(cliente_id >> 16) & 255}.{(cliente_id >> 8) & 255}.{cliente_id & 255}',
+            'Telefono': str(telefono),
+            'Ubicacion': ubicacion,
+            'Cedula': str(10000000 + cliente_id),
+            'CedulaClave': str(10000000 + cliente_id),
+            'EstadoID': estado
+        }
+        for cliente_id, nombre, apellido, plan, fecha, tipo, tarifa, telefono, ubicacion, estado in zip(
+            ids.tolist(), nombres.tolist(), apellidos.tolist(), rng.choice(PLANES, cantidad).tolist(),
+            _fechas(rng, date(2020, 1, 1), date(2025, 6, 30), cantidad),
+            rng.integers(1, len(TIPOS_SERVICIO) + 1, cantidad).tolist(), rng.choice(TARIFAS, cantidad).tolist(),
+            telefonos.tolist(), rng.choice(UBICACIONES, cantidad).tolist(), estados.tolist()
+        )
+    ]
+
+
+def generar_pagos(rng, cantidad_clientes, cantidad):
+    return [
+        {
+            'ClienteID': cliente_id,
+            'FechaPago': fecha,
+            'Mes': mes,
+            'Ano': ano,
+            'Monto': monto,
+            'Metodo_de_PagoID': metodo
+        }
+        for cliente_id, fecha, mes, ano, monto, metodo in zip(
+            rng.integers(1, cantidad_clientes + 1, cantidad).tolist(),
+            _fechas(rng, date(ANOS_PAGO[0], 1, 1), date(ANOS_PAGO[-1], 12, 31), cantidad),
+            rng.integers(1, 13, cantidad).tolist(), rng.choice(ANOS_PAGO, cantidad).tolist(),
+            rng.choice(TARIFAS[:-1], cantidad).tolist(), rng.integers(1, len(METODOS_PAGO) + 1, cantidad).tolist()
+        )
+    ]
+
+
+# Crear las tablas desde cero y cargar los datos (en lotes, sin pasar por el ORM).
+# Al final se reconstruye el resumen de pagos, igual que después de una migración.
+def cargar_datos(engine, clientes, pagos_por_cliente=6, semilla=42):
+    rng = np.random.default_rng(semilla)
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+
+    with engine.begin() as conexion:
+        conexion.execute(insert(Estado), [{'ID': i, 'Estado': nombre} for i, nombre in enumerate(ESTADOS, start=1)])
+        conexion.execute(insert(TipoServicio), [{'ID': i, 'Tipo': tipo} for i, tipo in enumerate(TIPOS_SERVICIO, start=1)])
+        conexion.execute(insert(MetodoDePago), [{'ID': i, 'Metodo': metodo} for i, metodo in enumerate(METODOS_PAGO, start=1)])
+
+        for inicio in range(0, clientes, TAMANO_LOTE):
+            conexion.execute(insert(Cliente), generar_clientes(rng, inicio + 1, min(TAMANO_LOTE, clientes - inicio)))
+
+        total_pagos = clientes * pagos_por_cliente
+        for inicio in range(0, total_pagos, TAMANO_LOTE):
+            conexion.execute(insert(Pago), generar_pagos(rng, clientes, min(TAMANO_LOTE, total_pagos - inicio)))
+
+    with Session(engine) as session:
+        reconstruir_resumen(session)
+        session.commit()
+    return clientes, total_pagos
+
+
+if __name__ == '__main__':
+    from db_config import crear_engine
+
+    parser = argparse.ArgumentParser(description='Cargar datos sintéticos (BORRA las tablas de la base indicada).')
+    parser.add_argument('url', help='URL de SQLAlchemy de una base de prueba')
+    parser.add_argument('--clientes', type=int, default=10000)
+    parser.add_argument('--pagos-por-cliente', type=int, default=6)
+    parser.add_argument('--semilla', type=int, default=42)
+    args = parser.parse_args()
+
+    clientes, pagos = cargar_datos(crear_engine(args.url), args.clientes, args.pagos_por_cliente, args.semilla)
+    print(f'{clientes} clientes y {pagos} pagos cargados en {args.url}')
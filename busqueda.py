@@ -0,0 +1,148 @@
+import threading
+import time
+import numpy as np
+from models import Cliente
+
+# Campos indexados (nombre de columna en df_clientes -> columna del modelo)
+CAMPOS = {
+    'Nombre': Cliente.NombreCliente,
+    'Cedula': Cliente.Cedula,
+    'Telefono': Cliente.Telefono,
+    'IP Address': Cliente.IPAddress
+}
+
+# Cada cuánto se reconstruye el índice para recoger cambios hechos desde otros procesos
+TTL_INDICE = 600
+# Cantidad de filas modificadas a partir de la cual conviene reconstruir en lugar de acumular cambios
+MAX_CAMBIOS = 5000
+
+
+def normalizar(valor):
+    return str(valor).lower().strip() if valor is not None else ''
+
+
+def trigramas(texto):
+    return {texto[i:i + 3] for i in range(len(texto) - 2)}
+
+
+# Índice de trigramas en memoria sobre nombre, cédula, teléfono e IP.
+# Las listas de filas de cada trigrama se guardan como arreglos de NumPy; las altas y ediciones
+# posteriores se acumulan en un diccionario aparte hasta la siguiente reconstrucción.
+class IndiceClientes:
+    def __init__(self, filas):
+        self.ids = []
+        self.valores = {campo: [] for campo in CAMPOS}
+        self.fila_por_id = {}
+        self.borradas = set()
+        self.cambios = {campo: {} for campo in CAMPOS}
+        self.construido = time.monotonic()
+        self._lock = threading.Lock()
+
+        listas = {campo: {} for campo in CAMPOS}
+        for fila in filas:
+            posicion = len(self.ids)
+            self.ids.append(fila[0])
+            self.fila_por_id[fila[0]] = posicion
+            for campo, valor in zip(CAMPOS, fila[1:]):
+                texto = normalizar(valor)
+                self.valores[campo].append(texto)
+                for trigrama in trigramas(texto):
+                    listas[campo].setdefault(trigrama, []).append(posicion)
+
+        self.filas_base = len(self.ids)
+        self.postings = {
+            campo: {trigrama: np.array(posiciones, dtype=np.int32) for trigrama, posiciones in listas[campo].items()}
+            for campo in CAMPOS
+        }
+
+    # Registrar un cliente nuevo o editado (la fila anterior queda marcada como borrada)
+    def actualizar(self, cliente_id, valores):
+        with self._lock:
+            anterior = self.fila_por_id.get(cliente_id)
+            if anterior is not None:
+                self.borradas.add(anterior)
+            posicion = len(self.ids)
+            self.ids.append(cliente_id)
+            self.fila_por_id[cliente_id] = posicion
+            for campo in CAMPOS:
+                texto = normalizar(valores.get(campo))
+                self.valores[campo].append(texto)
+                for trigrama in trigramas(texto):
+                    self.cambios[campo].setdefault(trigrama, set()).add(posicion)
+
+    # Filas agregadas desde la última reconstrucción
+    def cantidad_cambios(self):
+        return len(self.ids) - self.filas_base
+
+    def _candidatos(self, campo, texto):
+        valores = self.valores[campo]
+        if len(texto) < 3:
+            # Términos cortos: recorrido directo (no hay trigramas que intersectar)
+            return [posicion for posicion, valor in enumerate(valores) if texto in valor]
+
+        base = None
+        for trigrama in sorted(trigramas(texto), key=lambda t: len(self.postings[campo].get(t, ()))):
+            posiciones = self.postings[campo].get(trigrama, np.empty(0, dtype=np.int32))
+            base = posiciones if base is None else np.intersect1d(base, posiciones, assume_unique=True)
+            if not len(base):
+                break
+        candidatos = set(base.tolist())
+
+        extra = None
+        for trigrama in trigramas(texto):
+            posiciones = self.cambios[campo].get(trigrama, set())
+            extra = set(posiciones) if extra is None else extra & posiciones
+        candidatos |= extra or set()
+
+        # Los trigramas no garantizan el orden: se confirma la subcadena completa
+        return [posicion for posicion in candidatos if texto in valores[posicion]]
+
+    # Valor normalizado de un campo del cliente (para mostrar las coincidencias)
+    def valor(self, cliente_id, campo):
+        return self.valores[campo][self.fila_por_id[cliente_id]]
+
+    # Buscar clientes cuyo campo contenga el texto; devuelve una página de IDs y el total de coincidencias
+    # (con por_pagina=None se devuelven todos los IDs)
+    def buscar(self, texto, campos=None, pagina=0, por_pagina=20):
+        texto = normalizar(texto)
+        with self._lock:
+            posiciones = set()
+            for campo in campos or CAMPOS:
+                posiciones.update(self._candidatos(campo, texto))
+            ids = sorted(self.ids[posicion] for posicion in posiciones - self.borradas)
+        if por_pagina is None:
+            return ids, len(ids)
+        inicio = pagina * por_pagina
+        return ids[inicio:inicio + por_pagina], len(ids)
+
+
+_indice = None
+_lock = threading.Lock()
+
+
+def construir_indice(session):
+    consulta = session.query(Cliente.ID, *CAMPOS.values()).order_by(Cliente.ID)
+    return IndiceClientes(consulta.yield_per(5000))
+
+
+# Índice compartido por el proceso: se construye al primer uso y se renueva cada TTL_INDICE segundos
+def obtener_indice(session):
+    global _indice
+    with _lock:
+        if (_indice is None or time.monotonic() - _indice.construido > TTL_INDICE
+                or _indice.cantidad_cambios() > MAX_CAMBIOS):
+            _indice = construir_indice(session)
+        return _indice
+
+
+# Mantener el índice al día tras agregar o editar un cliente
+def actualizar_indice(cliente):
+    if _indice is not None:
+        _indice.actualizar(cliente.ID, {campo: getattr(cliente, columna.key) for campo, columna in CAMPOS.items()})
+
+
+# Descartar el índice (p. ej. tras una importación masiva); se reconstruye en la próxima búsqueda
+def invalidar_indice():
+    global _indice
+    with _lock:
+        _indice = None
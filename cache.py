@@ -0,0 +1,169 @@
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    import redis  # Opcional: backend compartido entre procesos
+except ImportError:
+    redis = None
+
+# Tiempo de vida por defecto (segundos) de cada grupo de entradas
+TTL_POR_GRUPO = {
+    'catalogos': 3600,
+    'clientes': 300,
+    'ingresos': 300,
+    'analitica': 3600  # Las claves incluyen el snapshot: un snapshot nuevo no reutiliza resultados viejos
+}
+TTL_DEFECTO = 300
+TTL_MAXIMO = 3600  # Ninguna entrada dura más que esto
+# Una versión de grupo se olvida si el grupo no se invalida en este tiempo: para entonces ya no queda
+# ninguna entrada de versiones anteriores (el doble del TTL máximo, por las consultas que estaban en curso)
+DURACION_VERSION = 2 * TTL_MAXIMO
+MAX_ENTRADAS = int(os.environ.get('CACHE_MAX_ENTRADAS', 256))
+
+
+# Backend en memoria del proceso: TTL por entrada y desalojo LRU al superar el tamaño máximo
+class CacheMemoria:
+    def __init__(self, max_entradas=MAX_ENTRADAS):
+        self.max_entradas = max_entradas
+        self._datos = OrderedDict()
+        self._versiones = OrderedDict()  # grupo -> (versión, hasta cuándo se recuerda), en orden de invalidación
+        self._ultima_version = 0
+        self.desalojos = 0
+        self._lock = threading.Lock()
+
+    def leer(self, clave):
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada is None:
+                return None
+            expira, valor = entrada
+            if expira < time.monotonic():
+                del self._datos[clave]
+                return None
+            self._datos.move_to_end(clave)
+            return (valor,)
+
+    def escribir(self, clave, valor, ttl):
+        with self._lock:
+            self._datos[clave] = (time.monotonic() + ttl, valor)
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.max_entradas:
+                self._datos.popitem(last=False)
+                self.desalojos += 1
+
+    def borrar(self, clave):
+        with self._lock:
+            self._datos.pop(clave, None)
+
+    def version(self, grupo):
+        with self._lock:
+            registro = self._versiones.get(grupo)
+            return registro[0] if registro else 0
+
+    # Las versiones salen de un contador único, así que un grupo olvidado que vuelve a la versión 0
+    # y se invalida otra vez nunca repite una versión anterior. Los grupos por cliente (pagos_cliente:<id>)
+    # no se acumulan: solo se recuerdan los invalidados en el último DURACION_VERSION.
+    def incrementar_version(self, grupo):
+        with self._lock:
+            ahora = time.monotonic()
+            self._ultima_version += 1
+            self._versiones[grupo] = (self._ultima_version, ahora + DURACION_VERSION)
+            self._versiones.move_to_end(grupo)
+            while next(iter(self._versiones.values()))[1] < ahora:
+                self._versiones.popitem(last=False)
+            # Las entradas del grupo anterior ya no se pueden leer; se liberan de inmediato
+            for clave in [c for c in self._datos if c.startswith(f'{grupo}:')]:
+                del self._datos[clave]
+
+    def __len__(self):
+        with self._lock:
+            return len(self._datos)
+
+
+# Backend Redis (o compatible): los valores se guardan serializados con pickle y expiran con SETEX.
+# El tamaño se limita con la política maxmemory del servidor (allkeys-lru).
+class CacheRedis:
+    def __init__(self, url):
+        self._cliente = redis.Redis.from_url(url)
+
+    def leer(self, clave):
+        valor = self._cliente.get(f'vozip:{clave}')
+        if valor is None:
+            return None
+        return (pickle.loads(valor),)
+
+    def escribir(self, clave, valor, ttl):
+        self._cliente.setex(f'vozip:{clave}', ttl, pickle.dumps(valor))
+
+    def borrar(self, clave):
+        self._cliente.delete(f'vozip:{clave}')
+
+    def version(self, grupo):
+        return int(self._cliente.get(f'vozip:version:{grupo}') or 0)
+
+    # Igual que en memoria: versiones de un contador único y claves de versión que expiran
+    def incrementar_version(self, grupo):
+        version = self._cliente.incr('vozip:ultima_version')
+        self._cliente.setex(f'vozip:version:{grupo}', DURACION_VERSION, version)
+
+    def __len__(self):
+        return self._cliente.dbsize()
+
+
+# Caché con grupos invalidables y contadores de aciertos/fallos.
+# La comparten los hilos de Streamlit y los de la API: los contadores se actualizan con el lock.
+class Cache:
+    def __init__(self, backend):
+        self.backend = backend
+        self.aciertos = 0
+        self.fallos = 0
+        self._lock = threading.Lock()
+
+    # Las claves incluyen la versión del grupo: invalidar un grupo es incrementar su versión
+    def _clave(self, grupo, clave):
+        return f'{grupo}:{self.backend.version(grupo)}:{clave}'
+
+    def obtener_o_calcular(self, grupo, clave, calcular, ttl=None):
+        clave_completa = self._clave(grupo, clave)
+        encontrado = self.backend.leer(clave_completa)
+        if encontrado is not None:
+            with self._lock:
+                self.aciertos += 1
+            return encontrado[0]
+
+        with self._lock:
+            self.fallos += 1
+        valor = calcular()
+        self.backend.escribir(clave_completa, valor, min(ttl or TTL_POR_GRUPO.get(grupo, TTL_DEFECTO), TTL_MAXIMO))
+        return valor
+
+    def invalidar(self, *grupos):
+        for grupo in grupos:
+            self.backend.incrementar_version(grupo)
+
+    def estadisticas(self):
+        with self._lock:
+            aciertos, fallos = self.aciertos, self.fallos
+        total = aciertos + fallos
+        return {
+            'aciertos': aciertos,
+            'fallos': fallos,
+            'tasa_aciertos': aciertos / total if total else 0.0,
+            # Solo el backend en memoria desaloja entradas (en Redis lo hace el servidor)
+            'desalojos': getattr(self.backend, 'desalojos', None),
+            'entradas': len(self.backend)
+        }
+
+
+# Crear la caché: Redis si se configura CACHE_REDIS_URL y el paquete está instalado, si no en memoria
+def crear_cache():
+    url = os.environ.get('CACHE_REDIS_URL')
+    if url and redis is not None:
+        return Cache(CacheRedis(url))
+    return Cache(CacheMemoria())
+
+
+cache = crear_cache()
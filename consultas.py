@@ -0,0 +1,120 @@
+import pandas as pd
+from sqlalchemy import func, or_, and_
+from models import Cliente, TipoServicio, Estado, MetodoDePago, Pago, nombres_meses
+
+
+# Cargar las tablas de catálogo (pequeñas) como diccionarios ID -> nombre
+def cargar_catalogos(session):
+    return {
+        'estados': dict(session.query(Estado.ID, Estado.Estado).all()),
+        'tipos_servicio': dict(session.query(TipoServicio.ID, TipoServicio.Tipo).all()),
+        'metodos_pago': dict(session.query(MetodoDePago.ID, MetodoDePago.Metodo).all())
+    }
+
+
+# Columnas de la tabla de clientes que se muestran en la aplicación
+COLUMNAS_CLIENTE = [
+    Cliente.ID,
+    Cliente.NombreCliente,
+    Cliente.PlanMB,
+    Cliente.FechaInstalacion,
+    Cliente.TipoServicioID,
+    Cliente.Tarifa,
+    Cliente.IPAddress,
+    Cliente.Telefono,
+    Cliente.Ubicacion,
+    Cliente.Cedula,
+    Cliente.EstadoID
+]
+
+# Criterios de orden del listado paginado (siempre desempatados por ID)
+ORDENES = {
+    'ID': Cliente.ID,
+    'Nombre': func.coalesce(Cliente.NombreCliente, '')
+}
+
+
+# Dar a las filas de clientes el formato de df_clientes, resolviendo los catálogos en memoria
+def formatear_clientes(clientes, catalogos):
+    return pd.DataFrame({
+        'ID': clientes['ID'],
+        'Nombre': clientes['NombreCliente'],
+        'Plan': clientes['PlanMB'],
+        'Fecha Instalacion': clientes['FechaInstalacion'],
+        'Tipo de Servicio': clientes['TipoServicioID'].map(catalogos['tipos_servicio']),
+        'Tarifa': clientes['Tarifa'],
+        'IP Address': clientes['IPAddress'],
+        'Telefono': clientes['Telefono'],
+        'Ubicacion': clientes['Ubicacion'],
+        'Cedula': clientes['Cedula'],
+        'Estado': clientes['EstadoID'].map(catalogos['estados'])
+    })
+
+
+# Construir el DataFrame de clientes en una sola consulta, resolviendo los catálogos en memoria
+def construir_df_clientes(session, catalogos=None):
+    catalogos = catalogos or cargar_catalogos(session)
+    consulta = session.query(*COLUMNAS_CLIENTE)
+    clientes = pd.read_sql(consulta.statement, session.connection())
+    return formatear_clientes(clientes, catalogos)
+
+
+def _filtrar_clientes(consulta, estado_id=None, tipo_servicio_id=None):
+    if estado_id is not None:
+        consulta = consulta.filter(Cliente.EstadoID == estado_id)
+    if tipo_servicio_id is not None:
+        consulta = consulta.filter(Cliente.TipoServicioID == tipo_servicio_id)
+    return consulta
+
+
+# Contar los clientes que cumplen los filtros del listado
+def contar_clientes(session, estado_id=None, tipo_servicio_id=None):
+    return _filtrar_clientes(session.query(func.count(Cliente.ID)), estado_id, tipo_servicio_id).scalar()
+
+
+# Leer una página de clientes con paginación por clave (keyset): en lugar de OFFSET se continúa
+# desde la última clave (valor de orden, ID) de la página anterior.
+# Devuelve la página con el formato de df_clientes y la clave para pedir la siguiente (None si no hay más).
+def pagina_clientes(session, catalogos, estado_id=None, tipo_servicio_id=None, orden='ID', despues_de=None, tamano=50):
+    columna_orden = ORDENES[orden]
+    consulta = _filtrar_clientes(
+        session.query(*COLUMNAS_CLIENTE, columna_orden.label('clave_orden')), estado_id, tipo_servicio_id
+    )
+    if despues_de is not None:
+        valor, ultimo_id = despues_de
+        if orden == 'ID':
+            consulta = consulta.filter(Cliente.ID > ultimo_id)
+        else:
+            consulta = consulta.filter(or_(
+                columna_orden > valor,
+                and_(columna_orden == valor, Cliente.ID > ultimo_id)
+            ))
+    consulta = consulta.order_by(columna_orden, Cliente.ID).limit(tamano + 1)
+
+    filas = pd.read_sql(consulta.statement, session.connection())
+    siguiente = None
+    if len(filas) > tamano:
+        filas = filas.iloc[:tamano]
+        ultima = filas.iloc[-1]
+        # Convertir los escalares de NumPy a tipos de Python para usarlos como parámetros
+        siguiente = tuple(getattr(valor, 'item', lambda: valor)() for valor in (ultima['clave_orden'], ultima['ID']))
+    return formatear_clientes(filas, catalogos), siguiente
+
+
+# Pagos de un cliente con el método de pago por nombre, en una sola consulta (los más recientes primero)
+def consultar_pagos_cliente(session, cliente_id):
+    consulta = (
+        session.query(Pago.ID, Pago.FechaPago, Pago.Mes, Pago.Ano, Pago.Monto, MetodoDePago.Metodo)
+        .outerjoin(MetodoDePago, MetodoDePago.ID == Pago.Metodo_de_PagoID)
+        .filter(Pago.ClienteID == cliente_id)
+        .order_by(Pago.Ano.desc(), Pago.Mes.desc(), Pago.ID.desc())
+    )
+    pagos = pd.read_sql(consulta.statement, session.connection())
+    return pd.DataFrame({
+        'ID': pagos['ID'],
+        'Fecha de Pago': pagos['FechaPago'],
+        'Mes': pagos['Mes'].map(nombres_meses).fillna('Desconocido'),
+        'Año': pagos['Ano'],
+        'Monto': pagos['Monto'],
+        'Método de Pago': pagos['Metodo'].fillna('Desconocido')
+    })
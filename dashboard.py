@@ -1,99 +1,61 @@
 import streamlit as st
 import pandas as pd
-from sqlalchemy.orm import sessionmaker
-from sqlalchemy import create_engine, Column, Integer, String, Date, Float, ForeignKey
-from sqlalchemy.exc import IntegrityError
-from sqlalchemy.orm import relationship, declarative_base
-from datetime import date, timedelta, datetime
-import hashlib
-import time
-import io  # Para trabajar con la creación del archivo Excel en memoria
-from db_config import get_engine
-import xlsxwriter  # Para escribir archivos Excel
-import pywhatkit as kit  # Para enviar mensajes por WhatsApp
-from calendar import monthrange
-
-# Conexión a Redis para usar caché
-Base = declarative_base()
-
-# Definir el mapeo de los meses a números
-meses_map = {
-    "ENERO": 1,
-    "FEBRERO": 2,
-    "MARZO": 3,
-    "ABRIL": 4,
-    "MAYO": 5,
-    "JUNIO": 6,
-    "JULIO": 7,
-    "AGOSTO": 8,
-    "SEPTIEMBRE": 9,
-    "OCTUBRE": 10,
-    "NOVIEMBRE": 11,
-    "DICIEMBRE": 12
-}
-
-# Definir la tabla master_users para el manejo de usuarios
-class MasterUser(Base):
-    __tablename__ = 'master_users'
-    ID = Column(Integer, primary_key=True, autoincrement=True)
-    Cedula = Column(String)
-    Telefono = Column(String)
-    Nombre = Column(String)
-    User = Column(String)
-    Password = Column(String)
-    Funcion = Column(String)
-
-class Cliente(Base):
-    __tablename__ = 'clientes'
-    ID = Column(Integer, primary_key=True)
-    NombreCliente = Column(String)
-    PlanMB = Column(String)
-    FechaInstalacion = Column(Date)
-    TipoServicioID = Column(Integer, ForeignKey('tipo_servicio.ID'))
-    Tarifa = Column(Float)
-    IPAddress = Column(String)
-    Telefono = Column(String)
-    Ubicacion = Column(String)
-    Cedula = Column(String)
-    EstadoID = Column(Integer, ForeignKey('Estados.ID'))
-    pagos = relationship('Pago', backref='cliente')
-
-class TipoServicio(Base):
-    __tablename__ = 'tipo_servicio'
-    ID = Column(Integer, primary_key=True, autoincrement=True)
-    Tipo = Column(String)
-
-class Pago(Base):
-    __tablename__ = 'pagos'
-    ID = Column(Integer, primary_key=True, autoincrement=True)
-    ClienteID = Column(Integer, ForeignKey('clientes.ID'))
-    FechaPago = Column(Date)
-    Mes = Column(String)
-    Ano = Column(Integer)
-    Monto = Column(Float)
-    Metodo_de_PagoID = Column(Integer, ForeignKey('Metodo_de_Pago.ID'))
-
-class Estado(Base):
-    __tablename__ = 'Estados'
-    ID = Column(Integer, primary_key=True)
-    Estado = Column(String)
-
-class MetodoDePago(Base):
-    __tablename__ = 'Metodo_de_Pago'
-    ID = Column(Integer, primary_key=True)
-    Metodo = Column(String)
-
-engine = get_engine()
-Session = sessionmaker(bind=engine)
-session = Session()
-
-# Función para hashear la contraseña
-def hash_password(password):
-    return hashlib.sha256(password.encode()).hexdigest()
-
-# Función para verificar la contraseña
-def verificar_password(stored_password, provided_password):
-    return stored_password == hash_password(provided_password)
+from datetime import date
+import functools
+import io
+import os
+from contextlib import nullcontext
+from db_config import session_scope, metricas_pool
+from models import meses_map
+from libro_pagos import ANO_MAXIMO
+from consultas import ORDENES
+from snapshot_dashboard import iniciar_actualizacion_periodica
+from analitica import iniciar_exportacion_periodica
+from exportacion import FORMATOS, COLUMNAS_CLIENTES, lotes_dataframe, exportar, borrar_exportacion
+from busqueda import CAMPOS
+from instrumentacion import medir_pagina, medicion_actual, resumen_paginas, ejecuciones_recientes, log_json, texto_prometheus, reiniciar_metricas
+from cache import cache  # Caché en memoria o en Redis (CACHE_REDIS_URL)
+from autenticacion import IntentosExcedidos
+import servicios  # Consultas y escrituras en la base (las páginas no usan el ORM directamente)
+
+# La sesión se abre por cada ejecución del script (ver el final del archivo)
+session = None
+
+# Funciones de usuario (MasterUser.Funcion) que ven el panel de instrumentación
+FUNCIONES_ADMIN = [funcion.strip().lower() for funcion in os.environ.get('ADMIN_FUNCIONES', 'admin,administrador').split(',')]
+# Funciones que un administrador puede asignar al crear un usuario (solo los administradores crean usuarios)
+FUNCIONES_USUARIO = [funcion.strip().lower() for funcion in os.environ.get('FUNCIONES_USUARIO', 'operador,cobrador,administrador').split(',')]
+
+# Si la aplicación está detrás de un proxy, la IP del navegador viene en X-Forwarded-For
+PROXY_CONFIABLE = os.environ.get('AUTH_PROXY_CONFIABLE', '0') == '1'
+
+# Fragmentos (st.fragment): al usar sus widgets solo se vuelve a ejecutar la función, no toda la página.
+# En esa reejecución la sesión de la página ya está cerrada, así que el fragmento abre la suya
+# y mide sus consultas aparte. En versiones de Streamlit sin fragmentos la función se ejecuta normal.
+_decorador_fragmento = getattr(st, 'fragment', None) or getattr(st, 'experimental_fragment', None)
+
+def fragmento(funcion):
+    @functools.wraps(funcion)
+    def ejecutar(*args, **kwargs):
+        global session
+        sesion_pagina = session
+        medicion = nullcontext() if medicion_actual() else medir_pagina(f'Fragmento {funcion.__name__}')
+        try:
+            with medicion, session_scope() as session:
+                return funcion(*args, **kwargs)
+        finally:
+            session = sesion_pagina
+    return _decorador_fragmento(ejecutar) if _decorador_fragmento else ejecutar
+
+# Catálogos (estados, tipos de servicio, métodos de pago) desde la caché
+def obtener_catalogos():
+    return servicios.obtener_catalogos(session)
+
+# IP del navegador, para limitar los intentos de inicio de sesión por IP
+def ip_cliente():
+    if PROXY_CONFIABLE and st.context.headers.get('X-Forwarded-For'):
+        return st.context.headers['X-Forwarded-For'].split(',')[0].strip()
+    return getattr(st.context, 'ip_address', None)
 
 # Función de inicio de sesión
 def login():
@@ -104,108 +66,74 @@ def login():
     
     if st.button("Iniciar Sesión"):
         if username and password:
-            # Buscar el usuario en la base de datos
-            usuario = session.query(MasterUser).filter_by(User=username).first()
-            if usuario and verificar_password(usuario.Password, password):
-                st.success(f"Bienvenido {usuario.Nombre}")
+            # Verificar el usuario (con límite de intentos fallidos por usuario y por IP)
+            try:
+                resultado = servicios.autenticar(session, username, password, ip_cliente())
+            except IntentosExcedidos as error:
+                st.error(str(error))
+                return
+            if resultado:
+                token, usuario = resultado
+                st.success(f"Bienvenido {usuario['Nombre']}")
                 st.session_state.logged_in = True
+                st.session_state.token = token
                 st.session_state.usuario = usuario
-                st.experimental_rerun()  # Recargar la página después de iniciar sesión
+                st.session_state.es_admin = (usuario['Funcion'] or '').lower().strip() in FUNCIONES_ADMIN
+                st.rerun()  # Recargar la página después de iniciar sesión
             else:
                 st.error("Nombre de usuario o contraseña incorrectos.")
         else:
             st.error("Por favor, ingresa el nombre de usuario y la contraseña.")
 
-# Formulario para crear un nuevo usuario
+# Formulario para crear un nuevo usuario (solo administradores; la función se elige de FUNCIONES_USUARIO)
 def crear_usuario():
     st.subheader("Crear Nuevo Usuario")
+    if not st.session_state.get('es_admin'):
+        st.error("Solo un administrador puede crear usuarios.")
+        return
 
     nombre = st.text_input("Nombre Completo")
     cedula = st.text_input("Cédula")
     telefono = st.text_input("Teléfono")
-    funcion = st.text_input("Función")
+    funcion = st.selectbox("Función", FUNCIONES_USUARIO)
     username = st.text_input("Nombre de Usuario")
     password = st.text_input("Contraseña", type="password")
 
     if st.button("Crear Usuario"):
         if nombre and cedula and telefono and funcion and username and password:
-            # Hashear la contraseña
-            password_hash = hash_password(password)
-
-            # Crear el nuevo usuario en la base de datos
-            nuevo_usuario = MasterUser(
-                Cedula=cedula,
-                Telefono=telefono,
-                Nombre=nombre,
-                User=username,
-                Password=password_hash,
-                Funcion=funcion
-            )
-            try:
-                session.add(nuevo_usuario)
-                session.commit()
+            # Crear el nuevo usuario en la base de datos (la contraseña se guarda hasheada)
+            if servicios.crear_usuario(session, nombre, cedula, telefono, funcion, username, password):
                 st.success(f"Usuario '{username}' creado exitosamente.")
-            except IntegrityError:
-                session.rollback()
+            else:
                 st.error("Error al crear el usuario. Es posible que el nombre de usuario ya exista.")
         else:
             st.error("Por favor, completa todos los campos.")
 
-# Función para obtener estadísticas de clientes y pagos
-def obtener_estadisticas(anio_seleccionado=None):
-    # Contar clientes por estado (sin filtro de año)
-    total_clientes = session.query(Cliente).count()
-    clientes_activos = session.query(Cliente).filter(Cliente.EstadoID == 1).count()  # EstadoID=1 es 'activo'
-    clientes_retirados = session.query(Cliente).filter(Cliente.EstadoID == 2).count()  # EstadoID=2 es 'retirado'
-    clientes_suspendidos = session.query(Cliente).filter(Cliente.EstadoID == 3).count()  # EstadoID=3 es 'suspendido'
-
-    # Calcular ingresos mensuales (filtro de año si se selecciona)
-    ingresos_por_mes = {}
-    if anio_seleccionado:
-        for mes_num in range(1, 13):
-            pagos_mes = session.query(Pago).filter(
-                Pago.Ano == anio_seleccionado,
-                Pago.Mes == list(meses_map.keys())[mes_num - 1]  # Usamos el mapeo de meses a texto
-            ).all()
-            
-            total_mes = sum([pago.Monto for pago in pagos_mes])
-            ingresos_por_mes[list(meses_map.keys())[mes_num - 1].capitalize()] = total_mes
-    else:
-        # Si no se selecciona un año, inicializamos ingresos en 0
-        ingresos_por_mes = {list(meses_map.keys())[mes_num - 1].capitalize(): 0 for mes_num in range(1, 13)}
-
-    return {
-        'total_clientes': total_clientes,
-        'clientes_activos': clientes_activos,
-        'clientes_retirados': clientes_retirados,
-        'clientes_suspendidos': clientes_suspendidos,
-        'ingresos_por_mes': ingresos_por_mes
-    }
-
-# Función para exportar los clientes a Excel con Ubicación
-def exportar_clientes_excel():
-    # Obtener todos los clientes con sus datos relevantes
-    clientes = session.query(Cliente).all()
-    cliente_data = [
-        {
-            'Nombre': cliente.NombreCliente,
-            'Cédula': cliente.Cedula,
-            'Fecha de Instalación': cliente.FechaInstalacion,
-            'Tarifa': cliente.Tarifa,
-            'Ubicación': cliente.Ubicacion,
-            'Estado': session.query(Estado).filter_by(ID=cliente.EstadoID).first().Estado
-        } for cliente in clientes
-    ]
-
-    df_clientes = pd.DataFrame(cliente_data)
-
-    # Crear un archivo Excel en memoria
-    output = io.BytesIO()
-    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-        df_clientes.to_excel(writer, index=False, sheet_name='Clientes')
-
-    output.seek(0)  # Reposicionar el cursor al principio del archivo en memoria
-    return output
+# Función para generar una exportación solo cuando el usuario la pide y ofrecer su descarga
+def descargar_exportacion(clave, nombre_archivo, generar_lotes, columnas, hoja):
+    formato = st.selectbox('Formato', list(FORMATOS), key=f'formato_{clave}')
+    if st.button('Generar archivo', key=f'generar_{clave}'):
+        # Cada sesión guarda una sola exportación: la anterior se borra aunque sea de otra página
+        anterior = st.session_state.pop('exportacion', None)
+        if anterior:
+            borrar_exportacion(anterior[1])
+        try:
+            st.session_state['exportacion'] = (clave, exportar(generar_lotes(), columnas, formato, hoja), formato)
+        except RuntimeError as error:
+            st.error(str(error))
+
+    exportacion = st.session_state.get('exportacion')
+    if exportacion and exportacion[0] == clave and os.path.exists(exportacion[1]):
+        _, ruta, formato_generado = exportacion
+        extension, mime = FORMATOS[formato_generado]
+        with open(ruta, 'rb') as archivo:
+            st.download_button(
+                label=f"Descargar {nombre_archivo}.{extension}",
+                data=archivo,
+                file_name=f'{nombre_archivo}.{extension}',
+                mime=mime,
+                key=f'descargar_{clave}'
+            )
 
 # Función para mostrar las estadísticas en el Dashboard y generar el Excel
 def dashboard():
@@ -219,8 +147,13 @@ def dashboard():
         index=(hoy.year - 2024)
     )
 
-    # Obtener estadísticas con el año seleccionado
-    stats = obtener_estadisticas(anio_seleccionado)
+    # Obtener estadísticas con el año seleccionado (y todos los años para el comparativo)
+    stats = servicios.obtener_estadisticas(session, anio_seleccionado, range(2024, hoy.year + 1))
+    col_fecha, col_boton = st.columns([3, 1])
+    col_fecha.caption(f"Datos actualizados: {stats['actualizado']:%Y-%m-%d %H:%M:%S}")
+    if col_boton.button('Actualizar ahora'):
+        servicios.actualizar_estadisticas(session)
+        st.rerun()
 
     # Mostrar el total de clientes y su distribución (sin depender del año)
     st.header("Estadísticas Generales de Clientes")
@@ -235,138 +168,195 @@ def dashboard():
     st.bar_chart(ingresos_df.set_index('Mes'))
     st.table(ingresos_df)
 
-    # Exportar clientes a Excel
-    st.header("Exportar Clientes a Excel")
-    output = exportar_clientes_excel()
-    st.download_button(
-        label="Descargar Excel de Clientes",
-        data=output,
-        file_name='clientes.xlsx',
-        mime='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-    )
+    # Comparar los ingresos mensuales de todos los años
+    st.header("Comparativo de Ingresos por Año")
+    st.line_chart(stats['ingresos_por_anio'].rename(columns=str))
+
+    # Cierres de fin de mes: lo facturado frente a lo recaudado y los morosos de cada mes cerrado
+    st.header("Cierres Mensuales")
+    cierres = servicios.cierres_mensuales(session)
+    if cierres.empty:
+        st.write("Todavía no hay cierres mensuales: se calculan en segundo plano al cerrar cada mes.")
+    else:
+        st.line_chart(cierres.set_index('Fecha')[['Facturado', 'Recaudado']])
+        st.dataframe(cierres, hide_index=True)
+
+    # Exportar clientes (se genera por lotes solo al pedirlo)
+    st.header("Exportar Clientes")
+    descargar_exportacion('export_clientes', 'clientes', lambda: servicios.lotes_exportacion_clientes(session), COLUMNAS_CLIENTES, 'Clientes')
+
+FILAS_POR_PAGINA = 50
 
 # Función para mostrar los clientes en la tabla (paginación)
 def mostrar_clientes(df, page, rows_per_page):
     start = page * rows_per_page
     end = start + rows_per_page
     df_page = df.iloc[start:end]
-    st.write(df_page.to_html(escape=False), unsafe_allow_html=True)
+    # to_html escapa los valores: un nombre o una dirección con HTML se muestra como texto
+    st.write(df_page.to_html(), unsafe_allow_html=True)
     total_pages = (len(df) + rows_per_page - 1) // rows_per_page
     return total_pages
 
+# Listado de clientes paginado en la base de datos: solo se lee la página que se muestra
+def ver_clientes():
+    st.subheader('Listado de Clientes')
+    catalogos = obtener_catalogos()
+    estado_id = st.selectbox('Estado', [None] + list(catalogos['estados']), format_func=lambda x: 'Todos' if x is None else catalogos['estados'][x], key='listado_estado')
+    tipo_servicio_id = st.selectbox('Tipo de Servicio', [None] + list(catalogos['tipos_servicio']), format_func=lambda x: 'Todos' if x is None else catalogos['tipos_servicio'][x], key='listado_tipo_servicio')
+    orden = st.selectbox('Ordenar por', list(ORDENES), key='listado_orden')
+
+    # Si cambian los filtros o el orden se vuelve a la primera página
+    filtros = (estado_id, tipo_servicio_id, orden)
+    if st.session_state.get('listado_filtros') != filtros:
+        st.session_state.listado_filtros = filtros
+        st.session_state.listado_cursores = [None]
+    cursores = st.session_state.listado_cursores
+
+    df_pagina, siguiente, total = servicios.listar_clientes(session, estado_id, tipo_servicio_id, orden, cursores[-1], FILAS_POR_PAGINA)
+    total_paginas = max(1, (total + FILAS_POR_PAGINA - 1) // FILAS_POR_PAGINA)
+
+    st.write(df_pagina.to_html(), unsafe_allow_html=True)  # Valores escapados
+    st.caption(f'Página {len(cursores)} de {total_paginas} ({total} clientes)')
+
+    col_anterior, col_siguiente = st.columns(2)
+    if col_anterior.button('Anterior', disabled=len(cursores) == 1, key='listado_anterior'):
+        cursores.pop()
+        st.rerun()
+    if col_siguiente.button('Siguiente', disabled=siguiente is None, key='listado_siguiente'):
+        cursores.append(siguiente)
+        st.rerun()
+
+# Alta de cliente en un formulario: escribir en los campos no vuelve a ejecutar la página, solo el botón
 def agregar_cliente():
     st.subheader('Agregar nuevo Cliente')
-    nombre_cliente = st.text_input('Nombre del Cliente', key='nuevo_nombre').lower()
-    plan_mb = st.text_input('Plan MB', key='nuevo_plan').lower()
-    fecha_instalacion = st.date_input('Fecha de Instalación', key='nuevo_fecha')
-    estado = st.selectbox('Estado', session.query(Estado).all(), format_func=lambda x: x.Estado, key='nuevo_estado')
-    tarifa = st.number_input('Tarifa', key='nuevo_tarifa', min_value=0.0, disabled=(estado.Estado in ['retirado', 'suspendido']))
-    ip_address = st.text_input('IP Address', key='nuevo_ip').lower()
-    telefono = st.text_input('Telefono', key='nuevo_telefono').lower()
-    ubicacion = st.text_input('Ubicacion', key='nuevo_ubicacion').lower()
-    cedula = st.text_input('Cedula', key='nuevo_cedula').lower()
-    tipo_servicio = st.selectbox('Tipo de Servicio', session.query(TipoServicio).all(), format_func=lambda x: x.Tipo, key='nuevo_tipo_servicio')
-
-    if st.button('Agregar Cliente'):
-        id = session.query(Cliente).count() + 1
-        while True:
-            try:
-                if estado.Estado in ['retirado', 'suspendido']:
-                    tarifa = 0.0  # Asigna tarifa a 0 si el estado es retirado o suspendido
-                nuevo_cliente = Cliente(
-                    ID=id,
-                    NombreCliente=nombre_cliente,
-                    PlanMB=plan_mb,
-                    FechaInstalacion=fecha_instalacion,
-                    TipoServicioID=tipo_servicio.ID,
-                    Tarifa=tarifa,
-                    IPAddress=ip_address,
-                    Telefono=telefono,
-                    Ubicacion=ubicacion,
-                    Cedula=cedula,
-                    EstadoID=estado.ID
-                )
-                session.add(nuevo_cliente)
-                session.commit()
-                st.success('Cliente agregado exitosamente')
-                st.experimental_rerun()
-                break
-            except IntegrityError:
-                session.rollback()
-                id += 1
+    catalogos = obtener_catalogos()
+    with st.form('form_agregar_cliente', clear_on_submit=True):
+        nombre_cliente = st.text_input('Nombre del Cliente', key='nuevo_nombre').lower()
+        plan_mb = st.text_input('Plan MB', key='nuevo_plan').lower()
+        fecha_instalacion = st.date_input('Fecha de Instalación', key='nuevo_fecha')
+        estado_id = st.selectbox('Estado', list(catalogos['estados']), format_func=lambda x: catalogos['estados'][x], key='nuevo_estado')
+        tarifa = st.number_input('Tarifa', key='nuevo_tarifa', min_value=0.0, help='Se guarda en 0 si el estado es retirado o suspendido')
+        ip_address = st.text_input('IP Address', key='nuevo_ip').lower()
+        telefono = st.text_input('Telefono', key='nuevo_telefono').lower()
+        ubicacion = st.text_input('Ubicacion', key='nuevo_ubicacion').lower()
+        cedula = st.text_input('Cedula', key='nuevo_cedula').lower()
+        tipo_servicio_id = st.selectbox('Tipo de Servicio', list(catalogos['tipos_servicio']), format_func=lambda x: catalogos['tipos_servicio'][x], key='nuevo_tipo_servicio')
+        enviado = st.form_submit_button('Agregar Cliente')
+
+    if enviado:
+        # El ID lo asigna la base (AUTO_INCREMENT); la tarifa queda en 0 si el estado es retirado o suspendido
+        cliente_id = servicios.crear_cliente(session, {
+            'NombreCliente': nombre_cliente,
+            'PlanMB': plan_mb,
+            'FechaInstalacion': fecha_instalacion,
+            'TipoServicioID': tipo_servicio_id,
+            'Tarifa': tarifa,
+            'IPAddress': ip_address,
+            'Telefono': telefono,
+            'Ubicacion': ubicacion,
+            'Cedula': cedula,
+            'EstadoID': estado_id
+        })
+        if cliente_id is None:
+            st.error('Ya existe un cliente con esa cédula.')
+        else:
+            st.success(f'Cliente agregado exitosamente (ID {cliente_id})')
+
+# Cliente a editar: se consulta solo cuando cambia el ID, no en cada ejecución de la página
+def cliente_para_editar(cliente_id):
+    if st.session_state.get('edit_cliente_id') != cliente_id:
+        st.session_state.edit_cliente = servicios.obtener_cliente(session, cliente_id)
+        st.session_state.edit_cliente_id = cliente_id
+    return st.session_state.edit_cliente
 
+@fragmento
 def editar_cliente():
     st.subheader('Editar Cliente')
     cliente_id = st.number_input('ID del Cliente', key='edit_id', min_value=1)
-    cliente = session.query(Cliente).filter_by(ID=cliente_id).first()
-    if cliente:
-        nombre_cliente = st.text_input('Nombre del Cliente', cliente.NombreCliente or '', key='edit_nombre')
-        nombre_cliente = nombre_cliente.lower() if nombre_cliente else ''
-        
-        plan_mb = st.text_input('Plan MB', cliente.PlanMB or '', key='edit_plan')
-        plan_mb = plan_mb.lower() if plan_mb else ''
-        
-        fecha_instalacion = st.date_input('Fecha de Instalación', cliente.FechaInstalacion, key='edit_fecha')
-        
-        estado = st.selectbox('Estado', session.query(Estado).all(), index=cliente.EstadoID - 1, format_func=lambda x: x.Estado, key='edit_estado')
-        
-        tarifa = st.number_input('Tarifa', value=cliente.Tarifa or 0.0, key='edit_tarifa', min_value=0.0, disabled=(estado.Estado in ['retirado', 'suspendido']))
-        
-        ip_address = st.text_input('IP Address', cliente.IPAddress or '', key='edit_ip')
-        ip_address = ip_address.lower() if ip_address else ''
-        
-        telefono = st.text_input('Telefono', cliente.Telefono or '', key='edit_telefono')
-        telefono = telefono.lower() if telefono else ''
-        
-        ubicacion = st.text_input('Ubicacion', cliente.Ubicacion or '', key='edit_ubicacion')
-        ubicacion = ubicacion.lower() if ubicacion else ''
-        
-        cedula = st.text_input('Cedula', cliente.Cedula or '', key='edit_cedula')
-        cedula = cedula.lower() if cedula else ''
-        
-        tipo_servicio = st.selectbox('Tipo de Servicio', session.query(TipoServicio).all(), index=cliente.TipoServicioID - 1, format_func=lambda x: x.Tipo, key='edit_tipo_servicio')
-
-        if st.button('Guardar Cambios'):
-            cliente.NombreCliente = nombre_cliente
-            cliente.PlanMB = plan_mb
-            cliente.FechaInstalacion = fecha_instalacion
-            cliente.TipoServicioID = tipo_servicio.ID
-            cliente.EstadoID = estado.ID
-            if estado.Estado in ['retirado', 'suspendido']:
-                cliente.Tarifa = 0.0  # Establece la tarifa a 0 si el estado es retirado o suspendido
-            else:
-                cliente.Tarifa = tarifa
-            cliente.IPAddress = ip_address
-            cliente.Telefono = telefono
-            cliente.Ubicacion = ubicacion
-            cliente.Cedula = cedula
-            session.commit()
-            st.success('Cliente editado exitosamente')
-            st.experimental_rerun()
-    else:
+    cliente = cliente_para_editar(cliente_id)
+    if not cliente:
         st.warning('Cliente no encontrado')
+        return
+
+    # Las claves llevan el ID para que al cambiar de cliente los campos tomen sus valores
+    catalogos = obtener_catalogos()
+    with st.form(f'form_editar_cliente_{cliente_id}'):
+        nombre_cliente = st.text_input('Nombre del Cliente', cliente['NombreCliente'] or '', key=f'edit_nombre_{cliente_id}').lower()
+        plan_mb = st.text_input('Plan MB', cliente['PlanMB'] or '', key=f'edit_plan_{cliente_id}').lower()
+        fecha_instalacion = st.date_input('Fecha de Instalación', cliente['FechaInstalacion'], key=f'edit_fecha_{cliente_id}')
+
+        estados_ids = list(catalogos['estados'])
+        estado_id = st.selectbox('Estado', estados_ids, index=estados_ids.index(cliente['EstadoID']), format_func=lambda x: catalogos['estados'][x], key=f'edit_estado_{cliente_id}')
+        tarifa = st.number_input('Tarifa', value=cliente['Tarifa'] or 0.0, key=f'edit_tarifa_{cliente_id}', min_value=0.0, help='Se guarda en 0 si el estado es retirado o suspendido')
+
+        ip_address = st.text_input('IP Address', cliente['IPAddress'] or '', key=f'edit_ip_{cliente_id}').lower()
+        telefono = st.text_input('Telefono', cliente['Telefono'] or '', key=f'edit_telefono_{cliente_id}').lower()
+        ubicacion = st.text_input('Ubicacion', cliente['Ubicacion'] or '', key=f'edit_ubicacion_{cliente_id}').lower()
+        cedula = st.text_input('Cedula', cliente['Cedula'] or '', key=f'edit_cedula_{cliente_id}').lower()
+
+        tipos_ids = list(catalogos['tipos_servicio'])
+        tipo_servicio_id = st.selectbox('Tipo de Servicio', tipos_ids, index=tipos_ids.index(cliente['TipoServicioID']), format_func=lambda x: catalogos['tipos_servicio'][x], key=f'edit_tipo_servicio_{cliente_id}')
+        enviado = st.form_submit_button('Guardar Cambios')
+
+    if enviado:
+        datos = {
+            'NombreCliente': nombre_cliente,
+            'PlanMB': plan_mb,
+            'FechaInstalacion': fecha_instalacion,
+            'TipoServicioID': tipo_servicio_id,
+            'EstadoID': estado_id,
+            'Tarifa': tarifa,
+            'IPAddress': ip_address,
+            'Telefono': telefono,
+            'Ubicacion': ubicacion,
+            'Cedula': cedula
+        }
+        # La tarifa queda en 0 si el estado es retirado o suspendido
+        if servicios.actualizar_cliente(session, cliente_id, datos) is None:
+            st.error('La cédula ya pertenece a otro cliente.')
+        else:
+            st.session_state.edit_cliente_id = None  # Se vuelve a leer con los valores guardados
+            st.success('Cliente editado exitosamente')
 
-def buscar_cliente(df):
+# Búsqueda en un fragmento: buscar o cambiar de página solo vuelve a ejecutar esta función,
+# y el criterio se escribe en un formulario (no se ejecuta nada hasta pulsar Buscar)
+@fragmento
+def buscar_cliente():
     st.subheader('Buscar Cliente')
-    
-    # Agregamos "Tipo de Servicio" a las opciones de búsqueda
-    opciones_busqueda = df.columns.tolist() + ['Tipo de Servicio']
-    buscar_por = st.selectbox('Buscar por', opciones_busqueda, key='buscar_por')
-    
-    buscar_valor = st.text_input(f'Valor para buscar en {buscar_por}', key='buscar_valor').lower()
-    
-    if st.button('Buscar'):
+    # El DataFrame de clientes sale de la caché y solo se pide en esta página
+    df = servicios.obtener_df_clientes(session)
+
+    with st.form('form_buscar_cliente'):
+        # Agregamos "Tipo de Servicio" a las opciones de búsqueda
+        opciones_busqueda = df.columns.tolist() + ['Tipo de Servicio']
+        buscar_por = st.selectbox('Buscar por', opciones_busqueda, key='buscar_por')
+        buscar_valor = st.text_input('Valor para buscar', key='buscar_valor').lower()
+        buscar = st.form_submit_button('Buscar')
+
+    if buscar:
         if buscar_por == 'Tipo de Servicio':
-            tipo_servicio = session.query(TipoServicio).filter(TipoServicio.Tipo.ilike(f"%{buscar_valor}%")).first()
+            tipo_servicio = servicios.buscar_tipo_servicio(session, buscar_valor)
             if tipo_servicio:
-                df_busqueda = df[df['Tipo de Servicio'].str.lower() == tipo_servicio.Tipo.lower()]
+                df_busqueda = df[df['Tipo de Servicio'].str.lower() == tipo_servicio.lower()]
             else:
                 df_busqueda = pd.DataFrame()  # No se encontró el tipo de servicio
+        elif buscar_por in CAMPOS:
+            # Nombre, cédula, teléfono e IP se resuelven con el índice en memoria
+            ids, _ = servicios.buscar_clientes(session, buscar_valor, [buscar_por], por_pagina=None)
+            df_busqueda = df[df['ID'].isin(ids)].sort_values('ID')
         else:
             df_busqueda = df[df[buscar_por].astype(str).str.lower().str.contains(buscar_valor, na=False)]
-        
+
+        # Guardamos los IDs encontrados para poder paginar los resultados en las siguientes ejecuciones
+        st.session_state.resultados_busqueda = df_busqueda['ID'].tolist() if not df_busqueda.empty else []
+
+    if 'resultados_busqueda' in st.session_state:
+        df_busqueda = df[df['ID'].isin(st.session_state.resultados_busqueda)]
         if not df_busqueda.empty:
-            mostrar_clientes(df_busqueda, 0, len(df_busqueda))
+            total_paginas = (len(df_busqueda) + FILAS_POR_PAGINA - 1) // FILAS_POR_PAGINA
+            pagina = st.number_input('Página', min_value=1, max_value=total_paginas, value=1, key='pagina_busqueda')
+            mostrar_clientes(df_busqueda, pagina - 1, FILAS_POR_PAGINA)
+            st.caption(f'{len(df_busqueda)} resultado(s), página {pagina} de {total_paginas}')
         else:
             st.warning('No se encontraron resultados')
 
@@ -383,241 +373,341 @@ def mostrar_morosos():
     # Convertimos la selección a un número entero
     meses_deuda_minima = int(meses_deuda_minima.split()[0])
 
-    clientes_morosos = []
+    # Fecha de corte: hoy, o una fecha pasada para ver quiénes estaban en mora en ese momento
     hoy = date.today()
+    fecha_corte = st.date_input('Fecha de corte', value=hoy, min_value=date(2024, 1, 1), max_value=hoy)
 
-    for cliente in clientes:
-        # Omitimos clientes con tarifa nula
-        if cliente.Tarifa is None or cliente.Tarifa == 0.0:
-            continue
-
-        # Verificamos el estado del cliente
-        if cliente.EstadoID in [2, 3]:  # Suspendido o retirado
-            continue
-
-        # Fecha de corte personalizada basada en la instalación
-        dia_corte = cliente.FechaInstalacion.day
-
-        # Tomar el último pago registrado del cliente
-        pagos = session.query(Pago).filter(Pago.ClienteID == cliente.ID).order_by(Pago.Ano.desc(), Pago.Mes.desc()).all()
-        if pagos:
-            # Validar el mes del último pago
-            ultimo_pago = pagos[0]
-            mes_upper = ultimo_pago.Mes.upper().strip()  # Normalizamos el mes
-            if mes_upper not in meses_map:
-                st.warning(f"El mes '{ultimo_pago.Mes}' del cliente {cliente.NombreCliente} no es válido. Ignorando cliente.")
-                continue
-
-            # Validar el día de corte ajustándolo al último día del mes si es necesario
-            ano = ultimo_pago.Ano
-            mes = meses_map[mes_upper]
-            ultimo_dia_del_mes = monthrange(ano, mes)[1]  # Obtiene el último día del mes
-            dia_ajustado = min(dia_corte, ultimo_dia_del_mes)  # Ajusta el día si excede el máximo permitido
-
-            try:
-                fecha_ultimo_pago = date(ano, mes, dia_ajustado)
-            except Exception as e:
-                st.error(f"Error al calcular la fecha del último pago para el cliente {cliente.NombreCliente}: {e}")
-                continue
+    if fecha_corte < hoy:
+        # Solo con los pagos recibidos hasta la fecha de corte (ver historico.py)
+        df_morosos, avisos = servicios.reporte_morosos_a_fecha(session, meses_deuda_minima, fecha_corte)
+    else:
+        # Cargar clientes y el resumen de pagos (una fila por cliente) y calcular la deuda sobre toda la tabla
+        df_morosos, avisos = servicios.reporte_morosos(session, meses_deuda_minima)
+    for nivel, mensaje in avisos:
+        if nivel == 'warning':
+            st.warning(mensaje)
         else:
-            # Si no hay pagos, usamos la fecha de instalación o el inicio de 2024
-            fecha_instalacion_ajustada = min(
-                cliente.FechaInstalacion.day,
-                monthrange(cliente.FechaInstalacion.year, cliente.FechaInstalacion.month)[1]
-            )
-            fecha_ultimo_pago = max(date(2024, 1, 1), cliente.FechaInstalacion.replace(day=fecha_instalacion_ajustada))
-
-        # Crear un conjunto de los meses desde el último pago hasta hoy
-        meses_totales = set()
-        for ano in range(fecha_ultimo_pago.year, hoy.year + 1):
-            for mes in range(1, 13):
-                if (ano == fecha_ultimo_pago.year and mes < fecha_ultimo_pago.month) or (ano == hoy.year and mes > hoy.month):
-                    continue
-                meses_totales.add((ano, mes))
-
-        # Crear un conjunto de los meses que ya han sido pagados
-        meses_pagados = set()
-        for pago in pagos:
-            mes_pago = pago.Mes.upper().strip()  # Normalizamos el mes
-            if mes_pago in meses_map:
-                ano_pago = pago.Ano
-                meses_pagados.add((ano_pago, meses_map[mes_pago]))
-
-        # Identificar los meses de deuda (diferencia entre los meses totales y los pagados)
-        meses_deuda = meses_totales - meses_pagados
-
-        # Asegurarse de contar solo los meses vencidos con respecto al día de corte
-        meses_deuda_filtrados = {
-            (ano, mes) for (ano, mes) in meses_deuda if (ano < hoy.year or (ano == hoy.year and mes < hoy.month) or (ano == hoy.year and mes == hoy.month and hoy.day >= dia_corte))
-        }
-
-        # Si el cliente debe más meses de los seleccionados, calcular la deuda
-        if len(meses_deuda_filtrados) >= meses_deuda_minima:
-            total_deuda = len(meses_deuda_filtrados) * cliente.Tarifa
-            tipo_servicio = session.query(TipoServicio).filter_by(ID=cliente.TipoServicioID).first().Tipo
-            clientes_morosos.append({
-                'ID': cliente.ID,
-                'Nombre': cliente.NombreCliente,
-                'Telefono': cliente.Telefono,
-                'Ubicacion': cliente.Ubicacion,
-                'Fecha de Instalación': cliente.FechaInstalacion,
-                'Meses Deuda': len(meses_deuda_filtrados),
-                'Monto Deuda': total_deuda,
-                'Tipo de Servicio': tipo_servicio
-            })
+            st.error(mensaje)
 
     # Mostrar los resultados
-    if clientes_morosos:
-        df_morosos = pd.DataFrame(clientes_morosos)
-
+    if not df_morosos.empty:
         # Mostrar la tabla con la fecha de instalación y tipo de servicio incluidos
-        st.write(df_morosos.to_html(escape=False), unsafe_allow_html=True)
+        st.write(df_morosos.to_html(), unsafe_allow_html=True)  # Valores escapados
 
         # Descargar solo la tabla mostrada
-        output = io.BytesIO()
-        with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-            df_morosos.to_excel(writer, index=False, sheet_name='Morosos')
-        output.seek(0)
-
-        st.download_button(
-            label="Descargar morosos en Excel",
-            data=output,
-            file_name='clientes_morosos.xlsx',
-            mime='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-            key='download_morosos'
+        descargar_exportacion(
+            f'export_morosos_{meses_deuda_minima}_{fecha_corte}',
+            'clientes_morosos',
+            lambda: lotes_dataframe(df_morosos),
+            list(df_morosos.columns),
+            'Morosos'
         )
+
+        # Los recordatorios se encolan y los envía el despachador en segundo plano (ver recordatorios.py).
+        # Solo para la deuda de hoy.
+        if fecha_corte == hoy and st.button('Enviar recordatorio por WhatsApp a los morosos mostrados'):
+            try:
+                encolados, omitidos = servicios.enviar_recordatorios(session, df_morosos)
+            except RuntimeError as error:
+                st.error(str(error))
+            else:
+                st.success(f'{encolados} recordatorios encolados')
+                if omitidos:
+                    st.warning(f'{len(omitidos)} clientes omitidos')
+                    st.dataframe(pd.DataFrame(omitidos))
     else:
         st.write(f"No hay clientes con deuda de {meses_deuda_minima} mes(es) o más.")
 
+    with st.expander('Recordatorios por WhatsApp'):
+        st.json(servicios.estado_recordatorios(session))
+
+PAGOS_POR_PAGINA = 12
+
+# Historial de pagos del cliente por páginas (una consulta con el método de pago, cacheada por cliente).
+# Es un fragmento: cambiar de página no vuelve a ejecutar el resto de Agregar Pago.
+@fragmento
+def historial_pagos(cliente_id):
+    df_pagos = servicios.pagos_de_cliente(session, cliente_id)
+    if df_pagos.empty:
+        st.write('No hay pagos registrados para este cliente.')
+        return
+    total_paginas = (len(df_pagos) + PAGOS_POR_PAGINA - 1) // PAGOS_POR_PAGINA
+    pagina = st.number_input('Página del historial', min_value=1, max_value=total_paginas, value=1, key=f'historial_pagina_{cliente_id}') if total_paginas > 1 else 1
+    inicio = (pagina - 1) * PAGOS_POR_PAGINA
+    st.dataframe(df_pagos.iloc[inicio:inicio + PAGOS_POR_PAGINA], hide_index=True)
+    st.caption(f'{len(df_pagos)} pago(s), página {pagina} de {total_paginas}')
+
 def agregar_pago():
     st.subheader('Agregar Pago')
     buscar_por = st.selectbox('Buscar cliente por', ['Nombre', 'Cedula'], key='buscar_pago_por')
     buscar_valor = st.text_input(f'Valor para buscar {buscar_por}', key='buscar_pago_valor').lower()
 
+    # Coincidencias mientras se escribe, desde el índice en memoria (primeras 20)
     cliente = None
+    coincidencias = []
+    if buscar_valor:
+        coincidencias, total = servicios.buscar_clientes(session, buscar_valor, [buscar_por], 0, 20)
+        if total > len(coincidencias):
+            st.caption(f'Mostrando {len(coincidencias)} de {total} coincidencias')
+    cliente_id = st.selectbox(
+        'Coincidencias',
+        coincidencias,
+        format_func=lambda x: f"{x} - {servicios.valor_indexado(session, x, 'Nombre')} ({servicios.valor_indexado(session, x, 'Cedula')})",
+        key='coincidencia_pago'
+    ) if coincidencias else None
+
     if st.button('Buscar Cliente'):
-        if buscar_por == 'Nombre':
-            cliente = session.query(Cliente).filter(Cliente.NombreCliente.contains(buscar_valor)).first()
-        else:
-            cliente = session.query(Cliente).filter(Cliente.Cedula.contains(buscar_valor)).first()
+        cliente = servicios.obtener_cliente(session, cliente_id) if cliente_id else None
 
         if cliente:
-            st.session_state.cliente_seleccionado = cliente.ID
-            st.success(f'Cliente encontrado: {cliente.NombreCliente}, ID: {cliente.ID}')
+            st.session_state.cliente_seleccionado = cliente
+            st.success(f"Cliente encontrado: {cliente['NombreCliente']}, ID: {cliente['ID']}")
         else:
             st.warning('Cliente no encontrado')
 
     if 'cliente_seleccionado' in st.session_state:
-        cliente_id = st.session_state.cliente_seleccionado
-        cliente = session.query(Cliente).filter_by(ID=cliente_id).first()
+        # El cliente se guarda al buscarlo: mientras se llena el formulario no se vuelve a consultar
+        cliente = st.session_state.cliente_seleccionado
         if cliente:
-            estado_cliente = session.query(Estado).filter_by(ID=cliente.EstadoID).first().Estado
-            st.write(f'Cliente seleccionado: {cliente.NombreCliente}, ID: {cliente.ID}')
-            st.write(f'Fecha de Instalación: {cliente.FechaInstalacion}')
+            catalogos = obtener_catalogos()
+            estado_cliente = catalogos['estados'].get(cliente['EstadoID'])
+            st.write(f"Cliente seleccionado: {cliente['NombreCliente']}, ID: {cliente['ID']}")
+            st.write(f"Fecha de Instalación: {cliente['FechaInstalacion']}")
             st.write(f'Estado: {estado_cliente}')
-            
-            pagos = session.query(Pago).filter_by(ClienteID=cliente.ID).all()
-            if pagos:
-                pagos_data = []
-                for pago in pagos:
-                    metodo_pago = session.query(MetodoDePago).filter_by(ID=pago.Metodo_de_PagoID).first()
-                    metodo_pago_nombre = metodo_pago.Metodo if metodo_pago else 'Desconocido'
-                    pagos_data.append({
-                        'ID': pago.ID,
-                        'Fecha de Pago': pago.FechaPago,
-                        'Mes': pago.Mes,
-                        'Año': pago.Ano,
-                        'Monto': pago.Monto,
-                        'Método de Pago': metodo_pago_nombre
-                    })
-                df_pagos = pd.DataFrame(pagos_data)
-                st.write(df_pagos.to_html(escape=False), unsafe_allow_html=True)
-            else:
-                st.write('No hay pagos registrados para este cliente.')
-
-            fecha_pago = st.date_input('Fecha de Pago', date.today(), key='fecha_pago')
-            mes_pago = st.selectbox('Mes de Pago', list(meses_map.keys()), key='mes_pago')
-            ano_pago = st.number_input('Año de Pago', min_value=2020, value=date.today().year, key='ano_pago')
-            monto_pago = st.number_input('Monto de Pago', min_value=0.0, key='monto_pago')
-            metodo_pago = st.selectbox('Método de Pago', session.query(MetodoDePago).all(), format_func=lambda x: x.Metodo, key='metodo_pago')
-
-            if st.button('Agregar Pago'):
-                nuevo_pago = Pago(
-                    ClienteID=cliente.ID,
-                    FechaPago=fecha_pago,
-                    Mes=mes_pago,
-                    Ano=ano_pago,
-                    Monto=monto_pago,
-                    Metodo_de_PagoID=metodo_pago.ID
-                )
-                session.add(nuevo_pago)
-                session.commit()
+
+            # Los campos del pago van en un formulario: llenarlos no vuelve a ejecutar la página
+            with st.form('form_agregar_pago', clear_on_submit=True):
+                fecha_pago = st.date_input('Fecha de Pago', date.today(), key='fecha_pago')
+                mes_pago = st.selectbox('Mes de Pago', list(meses_map.keys()), key='mes_pago')
+                ano_pago = st.number_input('Año de Pago', min_value=2020, max_value=ANO_MAXIMO, value=date.today().year, key='ano_pago')
+                monto_pago = st.number_input('Monto de Pago', min_value=0.0, key='monto_pago')
+                metodo_pago_id = st.selectbox('Método de Pago', list(catalogos['metodos_pago']), format_func=lambda x: catalogos['metodos_pago'][x], key='metodo_pago')
+                enviado = st.form_submit_button('Agregar Pago')
+
+            if enviado:
+                # El resumen de pagos se actualiza en la misma transacción; el historial del cliente
+                # se invalida, así que abajo ya aparece el pago nuevo sin volver a ejecutar la página
+                servicios.registrar_nuevo_pago(session, cliente['ID'], fecha_pago, meses_map[mes_pago], ano_pago, monto_pago, metodo_pago_id)
                 st.success('Pago agregado exitosamente')
-                del st.session_state.cliente_seleccionado
-                st.experimental_rerun()
+
+            historial_pagos(cliente['ID'])
+
+# Importar pagos en bloque desde un extracto bancario (CSV o XLSX)
+def importar_pagos_extracto():
+    st.subheader('Importar Pagos desde Extracto')
+    st.caption('Columnas: Cédula y/o Teléfono, Fecha de pago, Mes, Año, Valor y (opcional) Método.')
+    archivo = st.file_uploader('Extracto bancario', type=['csv', 'xlsx'], key='extracto_pagos')
+    catalogos = obtener_catalogos()
+    metodo_defecto_id = st.selectbox('Método de pago por defecto', list(catalogos['metodos_pago']), format_func=lambda x: catalogos['metodos_pago'][x], key='extracto_metodo')
+
+    if archivo is None:
+        return
+    col_validar, col_importar = st.columns(2)
+    simular = col_validar.button('Validar (sin guardar)', key='extracto_validar')
+    importar = col_importar.button('Importar pagos', key='extracto_importar')
+    if not (simular or importar):
+        return
+
+    try:
+        resultado = servicios.importar_pagos_archivo(session, io.BytesIO(archivo.getvalue()), archivo.name, metodo_defecto_id, simular)
+    except RuntimeError as error:
+        st.error(str(error))
+        return
+
+    accion = 'válidas' if simular else 'importadas'
+    st.success(f"{resultado['leidas']} filas leídas, {resultado['importadas']} {accion} "
+               f"({resultado['filas_por_segundo']:.0f} filas/s)")
+    if resultado['rechazadas']:
+        st.warning(f"{len(resultado['rechazadas'])} filas rechazadas")
+        st.dataframe(pd.DataFrame(resultado['rechazadas']))
+
+def importar_clientes_planilla():
+    st.subheader('Importar o Actualizar Clientes')
+    st.caption('Columnas: Nombre, Plan, Fecha de instalación, Tipo de servicio, Tarifa, IP, Teléfono, Ubicación, Cédula y Estado. '
+               'Si la cédula ya existe el cliente se actualiza; si no, se crea con un ID nuevo.')
+    archivo = st.file_uploader('Planilla de clientes', type=['csv', 'xlsx'], key='planilla_clientes')
+
+    if archivo is None:
+        return
+    col_validar, col_importar = st.columns(2)
+    simular = col_validar.button('Validar (sin guardar)', key='planilla_validar')
+    importar = col_importar.button('Importar clientes', key='planilla_importar')
+    if not (simular or importar):
+        return
+
+    try:
+        resultado = servicios.importar_clientes_archivo(session, io.BytesIO(archivo.getvalue()), archivo.name, simular)
+    except RuntimeError as error:
+        st.error(str(error))
+        return
+
+    accion = 'válidas' if simular else 'procesadas'
+    st.success(f"{resultado['leidas']} filas leídas, {resultado['nuevos'] + resultado['actualizados']} {accion}: "
+               f"{resultado['nuevos']} nuevos y {resultado['actualizados']} actualizados "
+               f"({resultado['filas_por_segundo']:.0f} filas/s)")
+    if resultado['rechazadas']:
+        st.warning(f"{len(resultado['rechazadas'])} filas rechazadas")
+        st.dataframe(pd.DataFrame(resultado['rechazadas']))
+
+# Panel de administración: consultas y tiempos por página medidos por instrumentacion.py
+def panel_instrumentacion():
+    st.subheader('Instrumentación de Páginas')
+    resumen = resumen_paginas()
+    if not resumen:
+        st.write('Todavía no hay páginas medidas.')
+        return
+
+    df_resumen = pd.DataFrame.from_dict(resumen, orient='index')
+    df_resumen['consultas_promedio'] = df_resumen['consultas'] / df_resumen['ejecuciones']
+    df_resumen['ms_promedio'] = 1000 * df_resumen['segundos'] / df_resumen['ejecuciones']
+    df_resumen['ms_db_promedio'] = 1000 * df_resumen['segundos_db'] / df_resumen['ejecuciones']
+    st.dataframe(df_resumen.sort_values('ms_promedio', ascending=False))
+
+    pagina = st.selectbox('Detalle de la página', list(resumen), key='instrumentacion_pagina')
+    recientes = ejecuciones_recientes(pagina)
+    if recientes:
+        ultima = recientes[-1]
+        st.write(f"Última ejecución: {ultima['consultas']} consultas, {1000 * ultima['segundos']:.0f} ms "
+                 f"({1000 * ultima['segundos_db']:.0f} ms en la base)")
+        st.write('Consultas más lentas')
+        st.dataframe(pd.DataFrame(ultima['lentas']))
+        if ultima['n_mas_1']:
+            st.warning('Posible N+1: la misma consulta se repite muchas veces')
+            st.dataframe(pd.DataFrame(ultima['n_mas_1']))
+
+    col_prometheus, col_json, col_reiniciar = st.columns(3)
+    col_prometheus.download_button('Métricas Prometheus', texto_prometheus(), file_name='metricas.txt', mime='text/plain')
+    col_json.download_button('Log JSON', log_json(), file_name='instrumentacion.jsonl', mime='application/json')
+    if col_reiniciar.button('Reiniciar contadores'):
+        reiniciar_metricas()
+        st.rerun()
+
+# Analítica histórica servida desde el snapshot Parquet (no consulta la base transaccional)
+def pagina_analitica():
+    st.subheader('Analítica')
+    disponible, en_segundo_plano = servicios.disponibilidad_analitica()
+    if not disponible:
+        st.error('La analítica necesita el paquete pyarrow, que no está instalado en el servidor.')
+        return
+    manifiesto = servicios.estado_analitica()
+    col_fecha, col_boton = st.columns([3, 1])
+    if manifiesto:
+        col_fecha.caption(f"Snapshot del {manifiesto['creado'].replace('T', ' ')}: {manifiesto['clientes']} clientes, {manifiesto['pagos']} pagos")
+    if col_boton.button('Actualizar snapshot'):
+        try:
+            servicios.actualizar_analitica(session)
+        except RuntimeError as error:
+            st.error(str(error))
+            return
+        st.rerun()
+    if manifiesto is None:
+        if en_segundo_plano:
+            st.info('Todavía no hay un snapshot de analítica. Se genera en segundo plano o con "Actualizar snapshot".')
+        else:
+            st.info('Todavía no hay un snapshot de analítica. Generarlo con "Actualizar snapshot".')
+        return
+
+    anios = st.multiselect('Años', manifiesto['anios'], default=manifiesto['anios'][-2:], key='analitica_anios')
+
+    st.header('Ingresos por Tipo de Servicio')
+    st.line_chart(servicios.ingresos_por_tipo_servicio(anios))
+
+    st.header('Ingreso Promedio por Cliente (ARPU)')
+    arpu = servicios.arpu_mensual(anios)
+    st.line_chart(arpu['ARPU'])
+    st.dataframe(arpu)
+
+    st.header('Bajas por Mes de Instalación')
+    bajas = servicios.bajas_por_mes_instalacion()
+    st.bar_chart(bajas['Tasa de bajas'])
+    st.dataframe(bajas)
 
 # Verificar si el usuario ya está autenticado
 if "logged_in" not in st.session_state:
     st.session_state.logged_in = False
 
+# Si la sesión expiró o se cerró se vuelve a pedir el inicio de sesión (se verifica sin consultar la base)
+if st.session_state.logged_in and servicios.usuario_sesion(st.session_state.get('token')) is None:
+    st.session_state.logged_in = False
+
 if st.session_state.logged_in:
-    st.sidebar.title("Navegación")
+    # Mantener el snapshot del Dashboard al día en segundo plano (un solo hilo por proceso)
+    iniciar_actualizacion_periodica()
+    # Y el snapshot Parquet de la página de Analítica (ANALITICA_INTERVALO; sin pyarrow no se exporta)
+    iniciar_exportacion_periodica()
+
+    # Una sesión de base de datos por ejecución del script, con commit/rollback y cierre garantizado
+    with session_scope() as session:
+        st.sidebar.title("Navegación")
     
-    # Agregar opción en la barra lateral para la prueba
-    opciones = st.sidebar.radio("Ir a", [
-        "Dashboard", 
-        "Crear Usuario", 
-        "Buscar Cliente", 
-        "Agregar Cliente", 
-        "Editar Cliente", 
-        "Mostrar Morosos", 
-        "Agregar Pago", 
-    ])
-
-    # Obtener datos de clientes
-    clientes = session.query(Cliente).all()
-    cliente_data = [
-        {
-            'ID': cliente.ID,
-            'Nombre': cliente.NombreCliente,
-            'Plan': cliente.PlanMB,
-            'Fecha Instalacion': cliente.FechaInstalacion,
-            'Tipo de Servicio': session.query(TipoServicio).filter_by(ID=cliente.TipoServicioID).first().Tipo,
-            'Tarifa': cliente.Tarifa,
-            'IP Address': cliente.IPAddress,
-            'Telefono': cliente.Telefono,
-            'Ubicacion': cliente.Ubicacion,
-            'Cedula': cliente.Cedula,
-            'Estado': session.query(Estado).filter_by(ID=cliente.EstadoID).first().Estado
-        } for cliente in clientes
-    ]
-
-    # Definir el DataFrame antes de usarlo
-    df_clientes = pd.DataFrame(cliente_data)
-
-    # Definir la acción según la opción seleccionada en la navegación
-    if opciones == "Dashboard":
-        dashboard()
+        # Agregar opción en la barra lateral para la prueba
+        paginas = [
+            "Dashboard", 
+            "Ver Clientes", 
+            "Buscar Cliente", 
+            "Agregar Cliente", 
+            "Editar Cliente", 
+            "Mostrar Morosos", 
+            "Agregar Pago", 
+            "Importar Pagos", 
+            "Importar Clientes", 
+            "Analítica",
+        ]
+        if st.session_state.get('es_admin'):
+            paginas.insert(1, "Crear Usuario")
+            paginas.append("Instrumentación")
+        opciones = st.sidebar.radio("Ir a", paginas)
+
+        # Medir las consultas de la página (cantidad, tiempo en la base, más lentas y N+1)
+        with medir_pagina(opciones):
+            # Definir la acción según la opción seleccionada en la navegación
+            if opciones == "Dashboard":
+                dashboard()
     
-    elif opciones == "Crear Usuario":
-        crear_usuario()
+            elif opciones == "Crear Usuario":
+                crear_usuario()
+
+            elif opciones == "Ver Clientes":
+                ver_clientes()
+
+            elif opciones == "Buscar Cliente":
+                buscar_cliente()
+
+            elif opciones == "Agregar Cliente":
+                agregar_cliente()
+
+            elif opciones == "Editar Cliente":
+                editar_cliente()
+
+            elif opciones == "Mostrar Morosos":
+                mostrar_morosos()
+
+            elif opciones == "Agregar Pago":
+                agregar_pago()
+
+            elif opciones == "Importar Pagos":
+                importar_pagos_extracto()
 
-    elif opciones == "Buscar Cliente":
-        # Asegúrate de que df_clientes está definida antes de usarla
-        buscar_cliente(df_clientes)
+            elif opciones == "Importar Clientes":
+                importar_clientes_planilla()
 
-    elif opciones == "Agregar Cliente":
-        agregar_cliente()
+            elif opciones == "Analítica":
+                pagina_analitica()
 
-    elif opciones == "Editar Cliente":
-        editar_cliente()
+            elif opciones == "Instrumentación" and st.session_state.get('es_admin'):
+                panel_instrumentacion()
 
-    elif opciones == "Mostrar Morosos":
-        mostrar_morosos()
+        # Contadores de la caché y del pool para verificar que están funcionando
+        with st.sidebar.expander("Caché"):
+            st.json(cache.estadisticas())
+        with st.sidebar.expander("Conexiones"):
+            st.json(metricas_pool())
 
-    elif opciones == "Agregar Pago":
-        agregar_pago()
+        if st.sidebar.button("Cerrar Sesión"):
+            servicios.terminar_sesion(st.session_state.token)
+            st.session_state.logged_in = False
+            st.rerun()
 
-    session.close()
 else:
-    login()
+    with session_scope() as session:
+        login()
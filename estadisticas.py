@@ -0,0 +1,41 @@
+import pandas as pd
+from sqlalchemy import func
+from models import Cliente, Pago, ResumenIngresoMensual, meses_map
+
+# Nombres de los meses en orden de calendario, como se muestran en el Dashboard
+MESES = [mes.capitalize() for mes in meses_map]
+
+
+# Contar clientes por EstadoID en una sola consulta (GROUP BY)
+def contar_clientes_por_estado(session):
+    filas = session.query(Cliente.EstadoID, func.count(Cliente.ID)).group_by(Cliente.EstadoID).all()
+    return {estado_id: total for estado_id, total in filas}
+
+
+# Sumar los ingresos por (Ano, Mes) para uno o varios años en una sola consulta.
+# Devuelve un DataFrame con los meses como índice y una columna por año (0 si no hubo pagos).
+def ingresos_mensuales(session, anios):
+    anios = list(anios)
+    filas = session.query(
+        Pago.Ano, Pago.Mes, func.sum(Pago.Monto)
+    ).filter(
+        Pago.Ano.in_(anios), Pago.Mes.between(1, 12)
+    ).group_by(Pago.Ano, Pago.Mes).all()
+
+    ingresos = pd.DataFrame(0.0, index=MESES, columns=anios)
+    for ano, mes, total in filas:
+        ingresos.at[MESES[mes - 1], ano] = float(total or 0.0)
+    return ingresos
+
+
+# Igual que ingresos_mensuales, pero leyendo el resumen mensual mantenido por libro_pagos.py
+def ingresos_mensuales_resumen(session, anios):
+    anios = list(anios)
+    filas = session.query(
+        ResumenIngresoMensual.Ano, ResumenIngresoMensual.Mes, ResumenIngresoMensual.Total
+    ).filter(ResumenIngresoMensual.Ano.in_(anios)).all()
+
+    ingresos = pd.DataFrame(0.0, index=MESES, columns=anios)
+    for ano, mes, total in filas:
+        ingresos.at[MESES[mes - 1], ano] = float(total or 0.0)
+    return ingresos
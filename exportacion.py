@@ -0,0 +1,130 @@
+import atexit
+import csv
+import os
+import tempfile
+import xlsxwriter
+from models import Cliente, Estado
+
+try:
+    import pyarrow as pa  # Opcional: solo se necesita para exportar a Parquet
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+TAMANO_LOTE = 5000
+
+# Formatos disponibles: extensión y tipo MIME para la descarga
+FORMATOS = {
+    'Excel': ('xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+    'CSV': ('csv', 'text/csv')
+}
+if pq is not None:
+    FORMATOS['Parquet'] = ('parquet', 'application/octet-stream')
+
+# Archivos temporales generados por este proceso que aún no se han borrado
+ARCHIVOS_GENERADOS = set()
+
+COLUMNAS_CLIENTES = ['Nombre', 'Cédula', 'Fecha de Instalación', 'Tarifa', 'Ubicación', 'Estado']
+
+
+# Leer los clientes por lotes con un cursor del lado del servidor (una sola consulta con el estado)
+def lotes_clientes(session, tamano_lote=TAMANO_LOTE):
+    consulta = session.query(
+        Cliente.NombreCliente,
+        Cliente.Cedula,
+        Cliente.FechaInstalacion,
+        Cliente.Tarifa,
+        Cliente.Ubicacion,
+        Estado.Estado
+    ).outerjoin(Estado, Estado.ID == Cliente.EstadoID).order_by(Cliente.ID)
+
+    conexion = session.connection().execution_options(stream_results=True, yield_per=tamano_lote)
+    for filas in conexion.execute(consulta.statement).partitions():
+        yield [tuple(fila) for fila in filas]
+
+
+# Partir un DataFrame ya calculado (p. ej. los morosos) en lotes de filas
+def lotes_dataframe(df, tamano_lote=TAMANO_LOTE):
+    for inicio in range(0, len(df), tamano_lote):
+        lote = df.iloc[inicio:inicio + tamano_lote]
+        yield list(lote.astype(object).where(lote.notna(), None).itertuples(index=False, name=None))
+
+
+# Escribir a Excel fila por fila: con constant_memory xlsxwriter vacía cada fila a disco al pasar a la siguiente
+def escribir_excel(lotes, columnas, destino, hoja):
+    libro = xlsxwriter.Workbook(destino, {'constant_memory': True, 'default_date_format': 'yyyy-mm-dd'})
+    try:
+        worksheet = libro.add_worksheet(hoja)
+        worksheet.write_row(0, 0, columnas)
+        fila_actual = 1
+        for lote in lotes:
+            for fila in lote:
+                worksheet.write_row(fila_actual, 0, fila)
+                fila_actual += 1
+    finally:
+        libro.close()
+
+
+def escribir_csv(lotes, columnas, destino):
+    with open(destino, 'w', newline='', encoding='utf-8') as archivo:
+        writer = csv.writer(archivo)
+        writer.writerow(columnas)
+        for lote in lotes:
+            writer.writerows(lote)
+
+
+# Escribir a Parquet un row group por lote
+def escribir_parquet(lotes, columnas, destino):
+    if pa is None:
+        raise RuntimeError("Para exportar a Parquet se necesita el paquete pyarrow.")
+    writer = None
+    try:
+        for lote in lotes:
+            tabla = pa.Table.from_pylist([dict(zip(columnas, fila)) for fila in lote])
+            if writer is None:
+                # Las columnas que llegan vacías en el primer lote se tratan como texto
+                esquema = pa.schema([
+                    campo.with_type(pa.string()) if pa.types.is_null(campo.type) else campo
+                    for campo in tabla.schema
+                ])
+                writer = pq.ParquetWriter(destino, esquema, compression='snappy')
+            writer.write_table(tabla.cast(esquema))
+    finally:
+        if writer is not None:
+            writer.close()
+    if writer is None:
+        pq.write_table(pa.table({columna: [] for columna in columnas}), destino)
+
+
+# Exportar los lotes al formato pedido en un archivo temporal y devolver su ruta
+def exportar(lotes, columnas, formato, hoja='Datos'):
+    extension = FORMATOS[formato][0]
+    descriptor, destino = tempfile.mkstemp(suffix=f'.{extension}')
+    os.close(descriptor)
+    try:
+        if formato == 'Excel':
+            escribir_excel(lotes, columnas, destino, hoja)
+        elif formato == 'CSV':
+            escribir_csv(lotes, columnas, destino)
+        else:
+            escribir_parquet(lotes, columnas, destino)
+    except Exception:
+        os.remove(destino)
+        raise
+    ARCHIVOS_GENERADOS.add(destino)
+    return destino
+
+
+# Borrar un archivo generado por exportar (si todavía existe)
+def borrar_exportacion(ruta):
+    ARCHIVOS_GENERADOS.discard(ruta)
+    if os.path.exists(ruta):
+        os.remove(ruta)
+
+
+# Al cerrar el proceso se borran las exportaciones de las sesiones que ya no las descargaron
+@atexit.register
+def borrar_exportaciones_pendientes():
+    for ruta in list(ARCHIVOS_GENERADOS):
+        borrar_exportacion(ruta)
@@ -0,0 +1,209 @@
+import argparse
+import calendar
+import json
+from datetime import date, datetime
+import numpy as np
+import pandas as pd
+from sqlalchemy import func
+from models import Pago, CierreMensual
+from morosidad import INICIO_COBRO, cargar_clientes, indice_mes, clientes_cobrables, armar_reporte
+
+# Reportes a una fecha de corte pasada: quiénes estaban en mora y cuánto se facturó y se recaudó.
+# Con una sola carga de clientes y pagos se calculan todas las fechas pedidas a la vez: para cada
+# cliente y fecha se toma el último periodo pagado con los pagos ya recibidos a esa fecha
+# (FechaPago; si falta, el primer día del periodo pagado) y la deuda se cuenta igual que en
+# morosidad.calcular_morosos_resumen con hoy = fecha de corte.
+# Los clientes no tienen historial de estado ni de tarifa: se usan los actuales, y antes de su
+# fecha de instalación un cliente no cuenta.
+#
+# Los cierres de fin de mes se guardan en cierres_mensuales una vez cerrado el mes (actualizar_cierres).
+
+MINIMOS_MOROSOS = [1, 2, 3, 4, 5]  # Meses de deuda mínimos que se cuentan en cada cierre
+_ORDINAL_EPOCH = date(1970, 1, 1).toordinal()
+
+
+def fin_de_mes(anio, mes):
+    return date(anio, mes, calendar.monthrange(anio, mes)[1])
+
+
+# Fines de mes desde el mes de desde hasta el último que no sea posterior a hasta
+def fines_de_mes(desde, hasta):
+    fechas = []
+    anio, mes = desde.year, desde.month
+    while fin_de_mes(anio, mes) <= hasta:
+        fechas.append(fin_de_mes(anio, mes))
+        anio, mes = (anio + 1, 1) if mes == 12 else (anio, mes + 1)
+    return fechas
+
+
+# Cargar todos los pagos con su fecha y monto en una sola consulta
+def cargar_pagos_fechados(session):
+    consulta = session.query(Pago.ClienteID, Pago.Ano, Pago.Mes, Pago.FechaPago, Pago.Monto)
+    return pd.read_sql(consulta.statement, session.connection())
+
+
+def _ordinales(fechas):
+    return pd.to_datetime(pd.Series(fechas)).to_numpy().astype('datetime64[D]').astype(np.int64) + _ORDINAL_EPOCH
+
+
+# Pagos con periodo válido y el día (ordinal) desde el que se conocen
+def _pagos_validos(df_pagos):
+    pagos = df_pagos[df_pagos['Ano'].notna() & df_pagos['Mes'].between(1, 12)]
+    ano = pagos['Ano'].astype(np.int64).to_numpy()
+    mes = pagos['Mes'].astype(np.int64).to_numpy()
+    inicio_periodo = pd.to_datetime(pd.DataFrame({'year': ano, 'month': mes, 'day': 1}))
+    conocido = pd.to_datetime(pagos['FechaPago']).to_numpy()
+    conocido = np.where(pd.isna(conocido), inicio_periodo.to_numpy(), conocido)
+    return pd.DataFrame({
+        'ClienteID': pagos['ClienteID'].to_numpy(),
+        'periodo': indice_mes(ano, mes),
+        'dia': conocido.astype('datetime64[D]').astype(np.int64) + _ORDINAL_EPOCH,
+        'Monto': pagos['Monto'].fillna(0.0).to_numpy()
+    })
+
+
+# Meses de deuda (clientes x fechas) de los clientes cobrables a cada fecha de corte, en una sola pasada.
+# Devuelve los clientes cobrables, la matriz de meses de deuda y la de clientes ya instalados.
+def deuda_a_fechas(df_clientes, df_pagos, fechas, avisos=None):
+    clientes, inicio_instalacion = clientes_cobrables(df_clientes, [] if avisos is None else avisos)
+    dias = _ordinales(fechas)
+    cantidad = len(clientes)
+
+    # Último periodo pagado conocido a cada fecha: cada pago cuenta desde la primera fecha de corte
+    # posterior a su recepción; el máximo por (cliente, fecha) se arrastra a las fechas siguientes
+    pagos = _pagos_validos(df_pagos)
+    fila = pd.Series(np.arange(cantidad), index=clientes['ID'].to_numpy()).reindex(pagos['ClienteID']).to_numpy()
+    columna = np.searchsorted(dias, pagos['dia'].to_numpy(), side='left')
+    validos = ~np.isnan(fila) & (columna < len(dias))
+    maximos = pd.DataFrame({
+        'fila': fila[validos].astype(np.int64), 'columna': columna[validos], 'periodo': pagos['periodo'].to_numpy()[validos]
+    }).groupby(['fila', 'columna'])['periodo'].max()
+    ultimo = np.full((cantidad, len(dias)), -1, dtype=np.int32)
+    ultimo[maximos.index.get_level_values('fila'), maximos.index.get_level_values('columna')] = maximos.to_numpy()
+    ultimo = np.maximum.accumulate(ultimo, axis=1)
+
+    con_pagos = ultimo >= 0
+    inicio_sin_pagos = np.maximum(inicio_instalacion, indice_mes(INICIO_COBRO.year, INICIO_COBRO.month))
+    inicio = np.where(con_pagos, ultimo, inicio_sin_pagos[:, None])
+    fechas_corte = pd.to_datetime(pd.Series(fechas))
+    mes_corte = indice_mes(fechas_corte.dt.year, fechas_corte.dt.month).to_numpy()
+    # El mes de corte solo cuenta si ya pasó el día de corte del cliente
+    fin = mes_corte[None, :] - (fechas_corte.dt.day.to_numpy()[None, :] < clientes['dia_corte'].to_numpy()[:, None])
+    meses_deuda = np.maximum(fin - inicio + 1 - con_pagos, 0)
+
+    instalado = _ordinales(clientes['FechaInstalacion'])[:, None] <= dias[None, :]
+    return clientes, np.where(instalado, meses_deuda, 0), instalado
+
+
+# Reporte de morosos (mismas columnas que la página) a una fecha de corte
+def morosos_a_fecha(df_clientes, df_pagos, fecha, meses_deuda_minima):
+    avisos = []
+    clientes, meses_deuda, _ = deuda_a_fechas(df_clientes, df_pagos, [fecha], avisos)
+    clientes['meses_deuda'] = meses_deuda[:, 0]
+    return armar_reporte(clientes, meses_deuda_minima), avisos
+
+
+# Indicadores de cada fecha de corte (una fila por fecha): clientes cobrables, facturado (tarifas de
+# los instalados), recaudado en el mes (por fecha de pago), pagado del periodo (por mes pagado),
+# morosos por meses de deuda mínimos y deuda total
+def indicadores_a_fechas(df_clientes, df_pagos, fechas):
+    clientes, meses_deuda, instalado = deuda_a_fechas(df_clientes, df_pagos, fechas)
+    tarifa = clientes['Tarifa'].fillna(0.0).to_numpy()
+
+    pagos = _pagos_validos(df_pagos)
+    dias = _ordinales(fechas)
+    inicios_mes = _ordinales([fecha.replace(day=1) for fecha in fechas])
+    dia_pago = np.sort(pagos['dia'].to_numpy())
+    acumulado = np.concatenate([[0.0], np.cumsum(pagos['Monto'].to_numpy()[np.argsort(pagos['dia'].to_numpy(), kind='stable')])])
+    recaudado = acumulado[np.searchsorted(dia_pago, dias, side='right')] - acumulado[np.searchsorted(dia_pago, inicios_mes, side='left')]
+    por_periodo = pagos.groupby('periodo')['Monto'].sum()
+    pagado_periodo = por_periodo.reindex([indice_mes(fecha.year, fecha.month) for fecha in fechas], fill_value=0.0).to_numpy()
+
+    return pd.DataFrame({
+        'Fecha': fechas,
+        'Clientes': instalado.sum(axis=0),
+        'Facturado': (tarifa[:, None] * instalado).sum(axis=0),
+        'Recaudado': recaudado,
+        'Pagado del Periodo': pagado_periodo,
+        **{f'Morosos {minimo}+': (meses_deuda >= minimo).sum(axis=0) for minimo in MINIMOS_MOROSOS},
+        'Meses Deuda': meses_deuda.sum(axis=0),
+        'Monto Deuda': (meses_deuda * tarifa[:, None]).sum(axis=0)
+    })
+
+
+# ---- Cierres mensuales guardados ----
+
+# Calcular y guardar los cierres de fin de mes que faltan (o todos con completo=True), desde
+# INICIO_COBRO hasta el último mes cerrado. Devuelve la cantidad de cierres calculados.
+def actualizar_cierres(session, hoy=None, completo=False):
+    hoy = hoy or date.today()
+    fechas = fines_de_mes(INICIO_COBRO, hoy - pd.Timedelta(days=1))
+    if completo:
+        session.query(CierreMensual).delete()
+        existentes = set()
+    else:
+        existentes = set(session.query(CierreMensual.Ano, CierreMensual.Mes).all())
+    faltantes = [fecha for fecha in fechas if (fecha.year, fecha.month) not in existentes]
+    if not faltantes:
+        return 0
+
+    indicadores = indicadores_a_fechas(cargar_clientes(session), cargar_pagos_fechados(session), faltantes)
+    calculado = datetime.now()
+    session.bulk_insert_mappings(CierreMensual, [
+        {
+            'Ano': fila['Fecha'].year,
+            'Mes': fila['Fecha'].month,
+            'Clientes': int(fila['Clientes']),
+            'Facturado': float(fila['Facturado']),
+            'Recaudado': float(fila['Recaudado']),
+            'PagadoPeriodo': float(fila['Pagado del Periodo']),
+            'MorososPorMeses': json.dumps({minimo: int(fila[f'Morosos {minimo}+']) for minimo in MINIMOS_MOROSOS}),
+            'MesesDeuda': int(fila['Meses Deuda']),
+            'MontoDeuda': float(fila['Monto Deuda']),
+            'Calculado': calculado
+        }
+        for fila in indicadores.to_dict(orient='records')
+    ])
+    return len(faltantes)
+
+
+# Cierres guardados como DataFrame (una fila por mes, en orden), con las mismas columnas que indicadores_a_fechas
+def leer_cierres(session):
+    cierres = session.query(CierreMensual).order_by(CierreMensual.Ano, CierreMensual.Mes).all()
+    return pd.DataFrame([
+        {
+            'Fecha': fin_de_mes(cierre.Ano, cierre.Mes),
+            'Clientes': cierre.Clientes,
+            'Facturado': cierre.Facturado,
+            'Recaudado': cierre.Recaudado,
+            'Pagado del Periodo': cierre.PagadoPeriodo,
+            **{f'Morosos {minimo}+': cantidad for minimo, cantidad in json.loads(cierre.MorososPorMeses).items()},
+            'Meses Deuda': cierre.MesesDeuda,
+            'Monto Deuda': cierre.MontoDeuda
+        }
+        for cierre in cierres
+    ])
+
+
+def ultimo_cierre(session):
+    return session.query(func.max(CierreMensual.Calculado)).scalar()
+
+
+if __name__ == '__main__':
+    import time
+    from db_config import session_scope
+
+    parser = argparse.ArgumentParser(description='Calcular los cierres de fin de mes (morosos, facturado y recaudado).')
+    parser.add_argument('--completo', action='store_true', help='Recalcular todos los cierres')
+    parser.add_argument('--fecha', type=date.fromisoformat, default=None, help='Mostrar los morosos a esta fecha (AAAA-MM-DD)')
+    parser.add_argument('--minimo', type=int, default=1, help='Meses de deuda mínimos para --fecha')
+    args = parser.parse_args()
+
+    with session_scope() as session:
+        if args.fecha:
+            morosos, _ = morosos_a_fecha(cargar_clientes(session), cargar_pagos_fechados(session), args.fecha, args.minimo)
+            print(morosos.to_string(index=False))
+        else:
+            inicio = time.perf_counter()
+            calculados = actualizar_cierres(session, completo=args.completo)
+            print(f'{calculados} cierres calculados en {time.perf_counter() - inicio:.2f} s')
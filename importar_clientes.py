@@ -0,0 +1,166 @@
+import argparse
+import time
+from models import Cliente, Estado, TipoServicio
+from archivos import leer_filas, clave_documento, parsear_fecha, parsear_numero
+
+TAMANO_LOTE = 1000
+
+# Encabezados aceptados en la planilla de clientes (sin tildes y en minúsculas) -> columna de Cliente
+ENCABEZADOS = {
+    'nombre': 'NombreCliente',
+    'nombre del cliente': 'NombreCliente',
+    'plan': 'PlanMB',
+    'plan mb': 'PlanMB',
+    'fecha de instalacion': 'FechaInstalacion',
+    'fecha instalacion': 'FechaInstalacion',
+    'tipo de servicio': 'TipoServicio',
+    'tarifa': 'Tarifa',
+    'ip': 'IPAddress',
+    'ip address': 'IPAddress',
+    'telefono': 'Telefono',
+    'ubicacion': 'Ubicacion',
+    'cedula': 'Cedula',
+    'estado': 'Estado'
+}
+
+# Columnas de texto que la aplicación guarda en minúsculas (igual que agregar_cliente)
+COLUMNAS_TEXTO = ['NombreCliente', 'PlanMB', 'IPAddress', 'Telefono', 'Ubicacion', 'Cedula']
+
+
+# Cédulas existentes -> ID del cliente (None si la cédula está repetida en la base)
+def indice_cedulas(session):
+    indice = {}
+    for cliente_id, cedula in session.query(Cliente.ID, Cliente.Cedula).yield_per(5000):
+        clave = clave_documento(cedula)
+        if clave:
+            indice[clave] = cliente_id if clave not in indice else None
+    return indice
+
+
+# Validar una fila y convertirla en las columnas de Cliente que trae la planilla;
+# devuelve (registro, motivo de rechazo)
+def validar_fila(fila, estados, tipos_servicio, es_nuevo):
+    registro = {}
+    for columna in COLUMNAS_TEXTO:
+        if fila.get(columna) not in (None, ''):
+            registro[columna] = str(fila[columna]).lower().strip()
+
+    if es_nuevo and not registro.get('NombreCliente'):
+        return None, 'Falta el nombre del cliente'
+
+    if fila.get('Estado') not in (None, ''):
+        estado = str(fila['Estado']).lower().strip()
+        if estado not in estados:
+            return None, f"Estado no válido: {fila['Estado']!r}"
+        registro['EstadoID'] = estados[estado]
+        # Tarifa en 0 si el estado es retirado o suspendido
+        if estado in ['retirado', 'suspendido']:
+            registro['Tarifa'] = 0.0
+    elif es_nuevo:
+        return None, 'Falta el estado'
+
+    if fila.get('TipoServicio') not in (None, ''):
+        tipo_id = tipos_servicio.get(str(fila['TipoServicio']).lower().strip())
+        if tipo_id is None:
+            return None, f"Tipo de servicio no válido: {fila['TipoServicio']!r}"
+        registro['TipoServicioID'] = tipo_id
+    elif es_nuevo:
+        return None, 'Falta el tipo de servicio'
+
+    if fila.get('FechaInstalacion') not in (None, ''):
+        fecha = parsear_fecha(fila['FechaInstalacion'])
+        if fecha is None:
+            return None, f"Fecha de instalación no válida: {fila['FechaInstalacion']!r}"
+        registro['FechaInstalacion'] = fecha
+    elif es_nuevo:
+        return None, 'Falta la fecha de instalación'
+
+    if fila.get('Tarifa') not in (None, '') and 'Tarifa' not in registro:
+        tarifa = parsear_numero(fila['Tarifa'])
+        if tarifa is None or tarifa < 0:
+            return None, f"Tarifa no válida: {fila['Tarifa']!r}"
+        registro['Tarifa'] = float(tarifa)
+
+    return registro, None
+
+
+# Importar (alta o actualización por cédula) una planilla de clientes.
+# Los clientes nuevos reciben el ID autoincremental de la base; los existentes se actualizan por ID.
+# Con simular=True solo se valida. El commit queda a cargo de quien llama.
+def importar_clientes(session, archivo, nombre_archivo, simular=False, tamano_lote=TAMANO_LOTE):
+    inicio = time.perf_counter()
+    cedulas = indice_cedulas(session)
+    estados = {nombre.lower().strip(): estado_id for estado_id, nombre in session.query(Estado.ID, Estado.Estado)}
+    tipos_servicio = {tipo.lower().strip(): tipo_id for tipo_id, tipo in session.query(TipoServicio.ID, TipoServicio.Tipo)}
+
+    leidas, nuevos, actualizados, rechazadas = 0, [], [], []
+    vistas = {}
+    totales = {'nuevos': 0, 'actualizados': 0}
+
+    def guardar(forzar=False):
+        if len(nuevos) >= tamano_lote or (forzar and nuevos):
+            if not simular:
+                session.bulk_insert_mappings(Cliente, nuevos)
+            totales['nuevos'] += len(nuevos)
+            nuevos.clear()
+        if len(actualizados) >= tamano_lote or (forzar and actualizados):
+            if not simular:
+                session.bulk_update_mappings(Cliente, actualizados)
+            totales['actualizados'] += len(actualizados)
+            actualizados.clear()
+
+    for numero, fila in enumerate(leer_filas(archivo, nombre_archivo, ENCABEZADOS), start=2):
+        leidas += 1
+        cedula = clave_documento(fila.get('Cedula'))
+        if not cedula:
+            rechazadas.append({'Fila': numero, 'Motivo': 'Falta la cédula', **fila})
+            continue
+        if cedula in vistas:
+            rechazadas.append({'Fila': numero, 'Motivo': f'Cédula repetida en el archivo (fila {vistas[cedula]})', **fila})
+            continue
+        vistas[cedula] = numero
+        if cedula in cedulas and cedulas[cedula] is None:
+            rechazadas.append({'Fila': numero, 'Motivo': 'La cédula pertenece a varios clientes', **fila})
+            continue
+
+        cliente_id = cedulas.get(cedula)
+        registro, motivo = validar_fila(fila, estados, tipos_servicio, es_nuevo=cliente_id is None)
+        if motivo:
+            rechazadas.append({'Fila': numero, 'Motivo': motivo, **fila})
+            continue
+        registro['CedulaClave'] = cedula
+
+        if cliente_id is None:
+            nuevos.append(registro)
+        else:
+            actualizados.append({'ID': cliente_id, **registro})
+        guardar()
+    guardar(forzar=True)
+
+    segundos = time.perf_counter() - inicio
+    return {
+        'leidas': leidas,
+        'nuevos': totales['nuevos'],
+        'actualizados': totales['actualizados'],
+        'rechazadas': rechazadas,
+        'simulacion': simular,
+        'segundos': segundos,
+        'filas_por_segundo': leidas / segundos if segundos else 0.0
+    }
+
+
+if __name__ == '__main__':
+    from db_config import session_scope
+
+    parser = argparse.ArgumentParser(description='Importar o actualizar clientes desde una planilla (CSV o XLSX).')
+    parser.add_argument('archivo')
+    parser.add_argument('--simular', action='store_true', help='Solo validar y mostrar el reporte')
+    args = parser.parse_args()
+
+    with open(args.archivo, 'rb') as archivo, session_scope() as session:
+        resultado = importar_clientes(session, archivo, args.archivo, args.simular)
+
+    for rechazo in resultado['rechazadas']:
+        print(f"Fila {rechazo['Fila']}: {rechazo['Motivo']}")
+    print(f"{resultado['leidas']} filas leídas, {resultado['nuevos']} nuevos, {resultado['actualizados']} actualizados, "
+          f"{len(resultado['rechazadas'])} rechazadas ({resultado['filas_por_segundo']:.0f} filas/s)")
@@ -0,0 +1,144 @@
+import argparse
+import time
+from datetime import date
+from models import Cliente, Pago, MetodoDePago, meses_map
+from libro_pagos import registrar_pagos_masivo, ANO_BASE, ANO_MAXIMO
+from archivos import leer_filas, clave_documento, parsear_fecha, parsear_numero
+
+TAMANO_LOTE = 1000
+
+# Encabezados aceptados en los extractos (sin tildes y en minúsculas) -> campo interno
+ENCABEZADOS = {
+    'cedula': 'cedula',
+    'documento': 'cedula',
+    'telefono': 'telefono',
+    'celular': 'telefono',
+    'fecha': 'fecha',
+    'fecha de pago': 'fecha',
+    'fechapago': 'fecha',
+    'mes': 'mes',
+    'ano': 'ano',
+    'anio': 'ano',
+    'monto': 'monto',
+    'valor': 'monto',
+    'metodo': 'metodo',
+    'metodo de pago': 'metodo'
+}
+
+
+def _parsear_mes(valor):
+    texto = str(valor or '').upper().strip()
+    if texto in meses_map:
+        return meses_map[texto]
+    if texto.isdigit() and 1 <= int(texto) <= 12:
+        return int(texto)
+    return None
+
+
+# Índices en memoria para encontrar el cliente por cédula o teléfono (una sola consulta)
+def indices_clientes(session):
+    por_cedula, por_telefono = {}, {}
+    for cliente_id, cedula, telefono in session.query(Cliente.ID, Cliente.Cedula, Cliente.Telefono).yield_per(5000):
+        for indice, clave in ((por_cedula, clave_documento(cedula)), (por_telefono, clave_documento(telefono))):
+            if clave:
+                # Si dos clientes comparten el dato se marca como ambiguo
+                indice[clave] = cliente_id if clave not in indice else None
+    return por_cedula, por_telefono
+
+
+# Validar una fila y convertirla al registro de Pago; devuelve (registro, motivo de rechazo)
+def validar_fila(fila, por_cedula, por_telefono, metodos, metodo_defecto_id):
+    cedula = clave_documento(fila.get('cedula'))
+    telefono = clave_documento(fila.get('telefono'))
+    cliente_id = por_cedula.get(cedula) if cedula else None
+    if cliente_id is None and telefono:
+        cliente_id = por_telefono.get(telefono)
+    if cliente_id is None:
+        if (cedula and cedula in por_cedula) or (telefono and telefono in por_telefono):
+            return None, 'Cliente ambiguo (cédula o teléfono repetido)'
+        return None, 'Cliente no encontrado'
+
+    mes = _parsear_mes(fila.get('mes'))
+    if mes is None:
+        return None, f"Mes no válido: {fila.get('mes')!r}"
+    ano = parsear_numero(fila.get('ano'))
+    if ano is None or not float(ano).is_integer() or not ANO_BASE <= ano <= ANO_MAXIMO:
+        return None, f"Año no válido: {fila.get('ano')!r}"
+    monto = parsear_numero(fila.get('monto'))
+    if monto is None or monto <= 0:
+        return None, f"Monto no válido: {fila.get('monto')!r}"
+    fecha = parsear_fecha(fila.get('fecha')) if fila.get('fecha') not in (None, '') else date.today()
+    if fecha is None:
+        return None, f"Fecha no válida: {fila.get('fecha')!r}"
+    metodo_id = metodos.get(str(fila.get('metodo') or '').lower().strip(), metodo_defecto_id)
+
+    return {
+        'ClienteID': cliente_id,
+        'FechaPago': fecha,
+        'Mes': mes,
+        'Ano': int(ano),
+        'Monto': float(monto),
+        'Metodo_de_PagoID': metodo_id
+    }, None
+
+
+# Importar un extracto completo. Con simular=True solo se valida y se reporta, sin insertar.
+# Los lotes se insertan con bulk_insert_mappings dentro de la transacción de la sesión:
+# el commit (o rollback) queda a cargo de quien llama, así el archivo entra completo o no entra.
+def importar_pagos(session, archivo, nombre_archivo, metodo_defecto_id=None, simular=False, tamano_lote=TAMANO_LOTE):
+    inicio = time.perf_counter()
+    por_cedula, por_telefono = indices_clientes(session)
+    metodos = {metodo.lower().strip(): metodo_id for metodo_id, metodo in session.query(MetodoDePago.ID, MetodoDePago.Metodo)}
+
+    leidas, importadas, rechazadas, lote = 0, 0, [], []
+    clientes = set()
+
+    def guardar(lote):
+        clientes.update(registro['ClienteID'] for registro in lote)
+        if not simular:
+            session.bulk_insert_mappings(Pago, lote)
+            registrar_pagos_masivo(session, lote)
+        return len(lote)
+
+    for numero, fila in enumerate(leer_filas(archivo, nombre_archivo, ENCABEZADOS), start=2):
+        leidas += 1
+        registro, motivo = validar_fila(fila, por_cedula, por_telefono, metodos, metodo_defecto_id)
+        if motivo:
+            rechazadas.append({'Fila': numero, 'Motivo': motivo, **fila})
+            continue
+        lote.append(registro)
+        if len(lote) >= tamano_lote:
+            importadas += guardar(lote)
+            lote = []
+    if lote:
+        importadas += guardar(lote)
+
+    segundos = time.perf_counter() - inicio
+    return {
+        'leidas': leidas,
+        'importadas': importadas,
+        'rechazadas': rechazadas,
+        'clientes': clientes,  # IDs de los clientes con pagos importados
+        'simulacion': simular,
+        'segundos': segundos,
+        'filas_por_segundo': leidas / segundos if segundos else 0.0
+    }
+
+
+if __name__ == '__main__':
+    from db_config import session_scope
+
+    parser = argparse.ArgumentParser(description='Importar pagos desde un extracto bancario (CSV o XLSX).')
+    parser.add_argument('archivo')
+    parser.add_argument('--metodo', type=int, default=None, help='ID del método de pago por defecto')
+    parser.add_argument('--simular', action='store_true', help='Solo validar y mostrar el reporte')
+    args = parser.parse_args()
+
+    with open(args.archivo, 'rb') as archivo, session_scope() as session:
+        resultado = importar_pagos(session, archivo, args.archivo, args.metodo, args.simular)
+
+    for rechazo in resultado['rechazadas']:
+        print(f"Fila {rechazo['Fila']}: {rechazo['Motivo']}")
+    accion = 'validadas' if resultado['simulacion'] else 'importadas'
+    print(f"{resultado['leidas']} filas leídas, {resultado['importadas']} {accion}, "
+          f"{len(resultado['rechazadas'])} rechazadas ({resultado['filas_por_segundo']:.0f} filas/s)")
@@ -0,0 +1,177 @@
+import json
+import os
+import re
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from datetime import datetime
+from sqlalchemy import event
+
+# Medición de consultas por página: cantidad, tiempo en la base, consultas más lentas
+# y patrones N+1 (la misma sentencia repetida muchas veces en una sola ejecución de la página).
+# Se engancha al engine con los eventos before/after_cursor_execute; cada ejecución del script
+# de Streamlit corre en su propio hilo, así que la medición en curso se guarda por hilo.
+
+UMBRAL_N_MAS_1 = int(os.environ.get('INSTRUMENTACION_UMBRAL_N_MAS_1', 10))
+CONSULTAS_LENTAS = 5  # Cantidad de consultas más lentas que se guardan por ejecución
+HISTORIAL = 200  # Ejecuciones recientes que se guardan para el panel y el log JSON
+ARCHIVO_LOG = os.environ.get('INSTRUMENTACION_LOG')  # Si se define, cada ejecución se agrega como una línea JSON
+
+_actual = threading.local()
+_lock = threading.Lock()
+_por_pagina = {}
+_recientes = deque(maxlen=HISTORIAL)
+
+
+# Sentencia sin espacios repetidos (los valores ya vienen como parámetros, así que dos
+# ejecuciones con distintos valores quedan iguales)
+def normalizar_sentencia(sentencia):
+    return re.sub(r'\s+', ' ', sentencia).strip()
+
+
+class Medicion:
+    def __init__(self, pagina):
+        self.pagina = pagina
+        self.inicio = time.perf_counter()
+        self.consultas = 0
+        self.segundos_db = 0.0
+        self.lentas = []
+        self.sentencias = Counter()
+
+    def registrar(self, sentencia, segundos):
+        self.consultas += 1
+        self.segundos_db += segundos
+        sentencia = normalizar_sentencia(sentencia)
+        self.sentencias[sentencia] += 1
+        self.lentas.append((segundos, sentencia))
+        if len(self.lentas) > CONSULTAS_LENTAS * 4:
+            self.lentas = sorted(self.lentas, reverse=True)[:CONSULTAS_LENTAS]
+
+    def resultado(self):
+        return {
+            'pagina': self.pagina,
+            'fecha': datetime.now().isoformat(timespec='seconds'),
+            'segundos': time.perf_counter() - self.inicio,
+            'consultas': self.consultas,
+            'segundos_db': self.segundos_db,
+            'lentas': [
+                {'segundos': segundos, 'sentencia': sentencia[:500]}
+                for segundos, sentencia in sorted(self.lentas, reverse=True)[:CONSULTAS_LENTAS]
+            ],
+            'n_mas_1': [
+                {'repeticiones': repeticiones, 'sentencia': sentencia[:500]}
+                for sentencia, repeticiones in self.sentencias.most_common()
+                if repeticiones >= UMBRAL_N_MAS_1
+            ]
+        }
+
+
+def _antes(conn, cursor, sentencia, parametros, contexto, executemany):
+    conn.info.setdefault('instrumentacion_inicio', []).append(time.perf_counter())
+
+
+def _despues(conn, cursor, sentencia, parametros, contexto, executemany):
+    inicio = conn.info['instrumentacion_inicio'].pop()
+    medicion = getattr(_actual, 'medicion', None)
+    if medicion is not None:
+        medicion.registrar(sentencia, time.perf_counter() - inicio)
+
+
+# Si la sentencia falla no hay after_cursor_execute: se descarta su hora de inicio
+def _error(contexto):
+    if contexto.connection is not None and contexto.connection.info.get('instrumentacion_inicio'):
+        contexto.connection.info['instrumentacion_inicio'].pop()
+
+
+# Registrar los eventos en el engine (una sola vez por engine)
+def instrumentar(engine):
+    if not event.contains(engine, 'before_cursor_execute', _antes):
+        event.listen(engine, 'before_cursor_execute', _antes)
+        event.listen(engine, 'after_cursor_execute', _despues)
+        event.listen(engine, 'handle_error', _error)
+    return engine
+
+
+# Medir las consultas de una página mientras dura el bloque; al terminar se acumulan por página
+@contextmanager
+def medir_pagina(pagina):
+    medicion = Medicion(pagina)
+    _actual.medicion = medicion
+    try:
+        yield medicion
+    finally:
+        _actual.medicion = None
+        _guardar(medicion.resultado())
+
+
+# Medición en curso en este hilo, o None fuera de medir_pagina
+def medicion_actual():
+    return getattr(_actual, 'medicion', None)
+
+
+def _guardar(resultado):
+    with _lock:
+        acumulado = _por_pagina.setdefault(resultado['pagina'], {
+            'ejecuciones': 0, 'consultas': 0, 'segundos': 0.0, 'segundos_db': 0.0,
+            'segundos_max': 0.0, 'consultas_max': 0, 'ejecuciones_n_mas_1': 0
+        })
+        acumulado['ejecuciones'] += 1
+        acumulado['consultas'] += resultado['consultas']
+        acumulado['segundos'] += resultado['segundos']
+        acumulado['segundos_db'] += resultado['segundos_db']
+        acumulado['segundos_max'] = max(acumulado['segundos_max'], resultado['segundos'])
+        acumulado['consultas_max'] = max(acumulado['consultas_max'], resultado['consultas'])
+        acumulado['ejecuciones_n_mas_1'] += bool(resultado['n_mas_1'])
+        _recientes.append(resultado)
+    if ARCHIVO_LOG:
+        with open(ARCHIVO_LOG, 'a') as archivo:
+            archivo.write(json.dumps(resultado) + '\n')
+
+
+# Totales por página desde que arrancó el proceso
+def resumen_paginas():
+    with _lock:
+        return {pagina: dict(acumulado) for pagina, acumulado in _por_pagina.items()}
+
+
+# Últimas ejecuciones medidas (la más reciente al final), con sus consultas lentas y N+1
+def ejecuciones_recientes(pagina=None):
+    with _lock:
+        return [resultado for resultado in _recientes if pagina is None or resultado['pagina'] == pagina]
+
+
+# Últimas ejecuciones como log JSON (una línea por ejecución)
+def log_json():
+    return '\n'.join(json.dumps(resultado) for resultado in ejecuciones_recientes())
+
+
+def _etiqueta(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"')
+
+
+# Totales por página en el formato de texto de Prometheus
+def texto_prometheus():
+    metricas = [
+        ('vozip_pagina_ejecuciones_total', 'counter', 'Ejecuciones de la página', 'ejecuciones'),
+        ('vozip_pagina_consultas_total', 'counter', 'Consultas SQL ejecutadas por la página', 'consultas'),
+        ('vozip_pagina_segundos_total', 'counter', 'Tiempo total de ejecución de la página', 'segundos'),
+        ('vozip_pagina_db_segundos_total', 'counter', 'Tiempo total en la base de datos', 'segundos_db'),
+        ('vozip_pagina_segundos_max', 'gauge', 'Ejecución más lenta de la página', 'segundos_max'),
+        ('vozip_pagina_consultas_max', 'gauge', 'Mayor cantidad de consultas en una ejecución', 'consultas_max'),
+        ('vozip_pagina_n_mas_1_total', 'counter', 'Ejecuciones con un patrón N+1', 'ejecuciones_n_mas_1')
+    ]
+    resumen = resumen_paginas()
+    lineas = []
+    for nombre, tipo, ayuda, clave in metricas:
+        lineas.append(f'# HELP {nombre} {ayuda}')
+        lineas.append(f'# TYPE {nombre} {tipo}')
+        for pagina, acumulado in sorted(resumen.items()):
+            lineas.append(f'{nombre}{{pagina="{_etiqueta(pagina)}"}} {acumulado[clave]}')
+    return '\n'.join(lineas) + '\n'
+
+
+def reiniciar_metricas():
+    with _lock:
+        _por_pagina.clear()
+        _recientes.clear()
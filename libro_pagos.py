@@ -0,0 +1,222 @@
+import argparse
+import pandas as pd
+from sqlalchemy import insert, tuple_
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from models import Pago, ResumenPagoCliente, ResumenIngresoMensual
+
+# Año desde el que se cuentan los bits del mapa de meses pagados (bit 0 = enero de ANO_BASE)
+ANO_BASE = 2000
+# Tamaño máximo del mapa (columna VARBINARY(255)) y último año que cabe en él
+BYTES_MAPA = 255
+ANO_MAXIMO = ANO_BASE + BYTES_MAPA * 8 // 12 - 1
+
+
+# Mes válido (1-12) o None si el pago no tiene un mes reconocido
+def normalizar_mes(mes):
+    return int(mes) if mes is not None and not pd.isna(mes) and 1 <= mes <= 12 else None
+
+
+def _bit(ano, mes):
+    return (ano - ANO_BASE) * 12 + (mes - 1)
+
+
+# Los pagos de años fuera del mapa se rechazan en lugar de perder el mes en silencio
+def validar_ano(ano):
+    if not ANO_BASE <= ano <= ANO_MAXIMO:
+        raise ValueError(f"Año de pago fuera de rango: {ano} (se admiten de {ANO_BASE} a {ANO_MAXIMO}).")
+
+
+# Marcar un mes como pagado en el mapa de bits (el mapa crece según se necesite)
+def marcar_mes(mapa, ano, mes):
+    validar_ano(ano)
+    bit = _bit(ano, mes)
+    datos = bytearray(mapa or b'')
+    if len(datos) <= bit // 8:
+        datos.extend(b'\x00' * (bit // 8 + 1 - len(datos)))
+    datos[bit // 8] |= 1 << (bit % 8)
+    return bytes(datos)
+
+
+def mes_pagado(mapa, ano, mes):
+    bit = _bit(ano, mes)
+    return bool(mapa) and 0 <= bit < len(mapa) * 8 and bool(mapa[bit // 8] & (1 << (bit % 8)))
+
+
+# Lista de (año, mes) pagados según el mapa de bits
+def meses_pagados(mapa):
+    return [
+        (ANO_BASE + bit // 12, bit % 12 + 1)
+        for bit in range(len(mapa or b'') * 8)
+        if mapa[bit // 8] & (1 << (bit % 8))
+    ]
+
+
+# Crear las filas de resumen que faltan (con los valores iniciales de filas) sin fallar si otra
+# transacción crea la misma fila al mismo tiempo: las que ya existen se dejan como están.
+# Después se leen bloqueadas y se actualizan igual que las demás.
+def _crear_filas_faltantes(session, modelo, filas):
+    if not filas:
+        return
+    claves = [columna.name for columna in modelo.__table__.primary_key]
+    dialecto = session.get_bind().dialect.name
+    if dialecto == 'mysql':
+        sentencia = mysql.insert(modelo).values(filas)
+        session.execute(sentencia.on_duplicate_key_update({claves[0]: sentencia.inserted[claves[0]]}))
+    elif dialecto in ('sqlite', 'postgresql'):
+        modulo = sqlite if dialecto == 'sqlite' else postgresql
+        session.execute(modulo.insert(modelo).values(filas).on_conflict_do_nothing(index_elements=claves))
+    else:
+        for fila in filas:
+            try:
+                with session.begin_nested():
+                    session.execute(insert(modelo).values(fila))
+            except IntegrityError:
+                pass
+
+
+# Actualizar los resúmenes con un pago nuevo (dentro de la misma transacción que lo inserta)
+def registrar_pago(session, pago):
+    registrar_pagos_masivo(session, [{
+        'ClienteID': pago.ClienteID,
+        'Ano': pago.Ano,
+        'Mes': pago.Mes,
+        'Monto': pago.Monto
+    }])
+
+
+# Actualizar los resúmenes con varios pagos a la vez (diccionarios con ClienteID, Ano, Mes y Monto).
+# Los cambios se agrupan por cliente y por mes, y las filas existentes se leen bloqueadas por bloques de IDs.
+def registrar_pagos_masivo(session, pagos, tamano_bloque=1000):
+    por_cliente = {}
+    por_mes = {}
+    for pago in pagos:
+        monto = pago['Monto'] or 0.0
+        total, cantidad, meses = por_cliente.get(pago['ClienteID'], (0.0, 0, set()))
+        mes = normalizar_mes(pago['Mes'])
+        # Los pagos con un mes no válido suman al total pagado pero no marcan meses ni ingresos mensuales
+        if mes is not None and pago['Ano'] is not None:
+            validar_ano(pago['Ano'])
+            meses.add((pago['Ano'], mes))
+            total_mes, cantidad_mes = por_mes.get((pago['Ano'], mes), (0.0, 0))
+            por_mes[(pago['Ano'], mes)] = (total_mes + monto, cantidad_mes + 1)
+        por_cliente[pago['ClienteID']] = (total + monto, cantidad + 1, meses)
+
+    existentes = _leer_resumenes(session, list(por_cliente), tamano_bloque)
+    faltantes = [cliente_id for cliente_id in por_cliente if cliente_id not in existentes]
+    _crear_filas_faltantes(session, ResumenPagoCliente, [
+        {'ClienteID': cliente_id, 'TotalPagado': 0.0, 'CantidadPagos': 0} for cliente_id in faltantes
+    ])
+    existentes.update(_leer_resumenes(session, faltantes, tamano_bloque))
+
+    for cliente_id, (total, cantidad, meses) in por_cliente.items():
+        resumen = existentes[cliente_id]
+        resumen.TotalPagado = (resumen.TotalPagado or 0.0) + total
+        resumen.CantidadPagos = (resumen.CantidadPagos or 0) + cantidad
+        for ano, mes in meses:
+            resumen.MesesPagados = marcar_mes(resumen.MesesPagados, ano, mes)
+            if resumen.UltimoAno is None or (ano, mes) > (resumen.UltimoAno, resumen.UltimoMes):
+                resumen.UltimoAno, resumen.UltimoMes = ano, mes
+
+    ingresos = _leer_ingresos(session, list(por_mes))
+    faltantes = [periodo for periodo in por_mes if periodo not in ingresos]
+    _crear_filas_faltantes(session, ResumenIngresoMensual, [
+        {'Ano': ano, 'Mes': mes, 'Total': 0.0, 'CantidadPagos': 0} for ano, mes in faltantes
+    ])
+    ingresos.update(_leer_ingresos(session, faltantes))
+
+    for (ano, mes), (total, cantidad) in por_mes.items():
+        ingreso = ingresos[(ano, mes)]
+        ingreso.Total = (ingreso.Total or 0.0) + total
+        ingreso.CantidadPagos = (ingreso.CantidadPagos or 0) + cantidad
+
+
+# Resúmenes por cliente existentes, leídos bloqueados por bloques de IDs
+def _leer_resumenes(session, ids, tamano_bloque):
+    existentes = {}
+    for inicio in range(0, len(ids), tamano_bloque):
+        consulta = session.query(ResumenPagoCliente).filter(
+            ResumenPagoCliente.ClienteID.in_(ids[inicio:inicio + tamano_bloque])
+        ).with_for_update()
+        existentes.update((resumen.ClienteID, resumen) for resumen in consulta)
+    return existentes
+
+
+# Ingresos mensuales existentes de los (año, mes) indicados, leídos bloqueados
+def _leer_ingresos(session, periodos):
+    if not periodos:
+        return {}
+    consulta = session.query(ResumenIngresoMensual).filter(
+        tuple_(ResumenIngresoMensual.Ano, ResumenIngresoMensual.Mes).in_(periodos)
+    ).with_for_update()
+    return {(ingreso.Ano, ingreso.Mes): ingreso for ingreso in consulta}
+
+
+# Reconstruir ambos resúmenes desde la tabla de pagos (carga inicial o corrección)
+def reconstruir_resumen(session):
+    consulta = session.query(Pago.ClienteID, Pago.Ano, Pago.Mes, Pago.Monto)
+    pagos = pd.read_sql(consulta.statement, session.connection())
+    pagos['Monto'] = pagos['Monto'].fillna(0.0)
+    pagos['mes_num'] = pagos['Mes'].map(normalizar_mes)
+    validos = pagos[pagos['mes_num'].notna() & pagos['Ano'].notna()].astype({'Ano': int, 'mes_num': int})
+    fuera_de_rango = validos[(validos['Ano'] < ANO_BASE) | (validos['Ano'] > ANO_MAXIMO)]
+    if len(fuera_de_rango):
+        raise ValueError(f"{len(fuera_de_rango)} pago(s) con el año fuera de rango (se admiten de {ANO_BASE} a "
+                         f"{ANO_MAXIMO}): corregirlos antes de reconstruir el resumen.")
+
+    totales = pagos.groupby('ClienteID').agg(TotalPagado=('Monto', 'sum'), CantidadPagos=('Monto', 'size'))
+    validos = validos.assign(periodo=validos['Ano'] * 12 + validos['mes_num'])
+    ultimos = validos.loc[validos.groupby('ClienteID')['periodo'].idxmax(), ['ClienteID', 'Ano', 'mes_num']].set_index('ClienteID')
+
+    mapas = {}
+    for cliente_id, ano, mes in validos[['ClienteID', 'Ano', 'mes_num']].drop_duplicates().itertuples(index=False):
+        mapas[cliente_id] = marcar_mes(mapas.get(cliente_id), ano, mes)
+
+    resumenes = [
+        {
+            'ClienteID': int(cliente_id),
+            'UltimoAno': int(ultimos.at[cliente_id, 'Ano']) if cliente_id in ultimos.index else None,
+            'UltimoMes': int(ultimos.at[cliente_id, 'mes_num']) if cliente_id in ultimos.index else None,
+            'MesesPagados': mapas.get(cliente_id),
+            'TotalPagado': float(fila.TotalPagado),
+            'CantidadPagos': int(fila.CantidadPagos)
+        }
+        for cliente_id, fila in zip(totales.index, totales.itertuples(index=False))
+    ]
+    ingresos = validos.groupby(['Ano', 'mes_num']).agg(Total=('Monto', 'sum'), CantidadPagos=('Monto', 'size'))
+    ingresos = [
+        {'Ano': int(ano), 'Mes': int(mes), 'Total': float(fila.Total), 'CantidadPagos': int(fila.CantidadPagos)}
+        for (ano, mes), fila in zip(ingresos.index, ingresos.itertuples(index=False))
+    ]
+
+    session.query(ResumenPagoCliente).delete()
+    session.query(ResumenIngresoMensual).delete()
+    session.bulk_insert_mappings(ResumenPagoCliente, resumenes)
+    session.bulk_insert_mappings(ResumenIngresoMensual, ingresos)
+    return len(resumenes), len(ingresos)
+
+
+# Leer el resumen por cliente (una fila por cliente con pagos)
+def cargar_resumen(session):
+    consulta = session.query(
+        ResumenPagoCliente.ClienteID,
+        ResumenPagoCliente.UltimoAno,
+        ResumenPagoCliente.UltimoMes,
+        ResumenPagoCliente.TotalPagado
+    )
+    return pd.read_sql(consulta.statement, session.connection())
+
+
+if __name__ == '__main__':
+    from db_config import session_scope
+
+    parser = argparse.ArgumentParser(description='Mantenimiento del resumen de pagos por cliente.')
+    parser.add_argument('--reconstruir', action='store_true', help='Reconstruir el resumen desde la tabla de pagos')
+    args = parser.parse_args()
+
+    if args.reconstruir:
+        with session_scope() as session:
+            clientes, meses = reconstruir_resumen(session)
+        print(f'Resumen reconstruido: {clientes} clientes, {meses} meses con ingresos.')
+    else:
+        parser.print_help()
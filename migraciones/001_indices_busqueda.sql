@@ -0,0 +1,12 @@
+-- Índices para las búsquedas de clientes (Buscar Cliente y Agregar Pago).
+-- Si alguna columna es TEXT en lugar de VARCHAR, usar un prefijo, p. ej. (NombreCliente(64)).
+
+CREATE INDEX idx_clientes_nombre ON clientes (NombreCliente);
+CREATE INDEX idx_clientes_cedula ON clientes (Cedula);
+CREATE INDEX idx_clientes_telefono ON clientes (Telefono);
+CREATE INDEX idx_clientes_ip ON clientes (IPAddress);
+
+-- Búsqueda por fragmentos del nombre con el parser ngram de InnoDB
+-- (requiere ngram_token_size = 3 en la configuración del servidor, igual que el índice en memoria).
+-- Uso: SELECT ID FROM clientes WHERE MATCH(NombreCliente) AGAINST ('texto' IN BOOLEAN MODE);
+CREATE FULLTEXT INDEX ft_clientes_nombre ON clientes (NombreCliente) WITH PARSER ngram;
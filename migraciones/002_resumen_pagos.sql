@@ -0,0 +1,20 @@
+-- Resumen de pagos por cliente y de ingresos por mes (ver libro_pagos.py).
+-- Después de crear las tablas, cargarlas con: python libro_pagos.py --reconstruir
+
+CREATE TABLE resumen_pagos (
+    ClienteID INT NOT NULL PRIMARY KEY,
+    UltimoAno INT NULL,
+    UltimoMes INT NULL,
+    MesesPagados VARBINARY(255) NULL,
+    TotalPagado DOUBLE NULL,
+    CantidadPagos INT NULL,
+    CONSTRAINT fk_resumen_pagos_cliente FOREIGN KEY (ClienteID) REFERENCES clientes (ID)
+);
+
+CREATE TABLE resumen_ingresos (
+    Ano INT NOT NULL,
+    Mes INT NOT NULL,
+    Total DOUBLE NULL,
+    CantidadPagos INT NULL,
+    PRIMARY KEY (Ano, Mes)
+);
@@ -0,0 +1,104 @@
+import argparse
+import os
+import sys
+from sqlalchemy import inspect, text
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db_config import get_engine  # noqa: E402
+from models import meses_map  # noqa: E402
+
+# Migración de pagos.Mes de texto ("ENERO", "enero ", ...) a número de mes (1-12).
+#
+#   1. Agrega la columna MesNumero.
+#   2. La completa por lotes de IDs (cada lote en su propia transacción, sin bloquear la tabla entera).
+#   3. Con la tabla bloqueada, completa los pagos que entraron durante el paso 2, renombra
+#      Mes -> MesTexto y MesNumero -> Mes, y crea el índice (ClienteID, Ano, Mes).
+#
+# Los pagos cuyo texto no corresponde a ningún mes quedan con Mes NULL (el texto original
+# se conserva en MesTexto) y se listan al final para corregirlos a mano.
+#
+# Uso: python migraciones/003_mes_numerico.py [--lote 10000] [--sin-finalizar]
+
+CASO_MES = 'CASE UPPER(TRIM(Mes)) ' + ' '.join(
+    f"WHEN '{nombre}' THEN {numero}" for nombre, numero in meses_map.items()
+) + ' END'
+COMPLETAR = f'UPDATE pagos SET MesNumero = {CASO_MES} WHERE MesNumero IS NULL'
+
+
+def columnas_pagos(conexion):
+    return {columna['name'] for columna in inspect(conexion).get_columns('pagos')}
+
+
+def agregar_columna(engine):
+    with engine.begin() as conexion:
+        if 'MesNumero' not in columnas_pagos(conexion):
+            conexion.execute(text('ALTER TABLE pagos ADD COLUMN MesNumero TINYINT NULL'))
+
+
+def completar_por_lotes(engine, tamano_lote):
+    with engine.connect() as conexion:
+        minimo, maximo = conexion.execute(text('SELECT MIN(ID), MAX(ID) FROM pagos')).one()
+    if minimo is None:
+        return 0
+
+    actualizados = 0
+    for inicio in range(minimo, maximo + 1, tamano_lote):
+        with engine.begin() as conexion:
+            resultado = conexion.execute(
+                text(f'{COMPLETAR} AND ID BETWEEN :inicio AND :fin'),
+                {'inicio': inicio, 'fin': inicio + tamano_lote - 1}
+            )
+            actualizados += resultado.rowcount
+        print(f'IDs {inicio}-{min(inicio + tamano_lote - 1, maximo)}: {actualizados} pagos actualizados')
+    return actualizados
+
+
+# Pagos sin mes reconocido (con su texto original), antes o después de renombrar las columnas
+def pagos_sin_mes(engine, finalizada=False):
+    consulta = 'SELECT ID, ClienteID, Ano, MesTexto FROM pagos WHERE Mes IS NULL' if finalizada else \
+        'SELECT ID, ClienteID, Ano, Mes FROM pagos WHERE MesNumero IS NULL'
+    with engine.connect() as conexion:
+        return conexion.execute(text(consulta)).all()
+
+
+# Los pagos que entraron mientras se completaba por lotes todavía no tienen MesNumero: se completan
+# con la tabla bloqueada para escritura, y con el mismo bloqueo se cambian las columnas (en MySQL
+# cada ALTER TABLE confirma la transacción, así que una transacción no alcanza para excluirlos).
+# Devuelve la cantidad de pagos completados en este paso.
+def finalizar(engine):
+    with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conexion:
+        conexion.execute(text('LOCK TABLES pagos WRITE'))
+        try:
+            completados = conexion.execute(text(COMPLETAR)).rowcount
+            conexion.execute(text('ALTER TABLE pagos RENAME COLUMN Mes TO MesTexto, RENAME COLUMN MesNumero TO Mes'))
+            conexion.execute(text('CREATE INDEX idx_pagos_cliente_periodo ON pagos (ClienteID, Ano, Mes)'))
+        finally:
+            conexion.execute(text('UNLOCK TABLES'))
+    return completados
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Convertir pagos.Mes a número de mes.')
+    parser.add_argument('--lote', type=int, default=10000, help='Cantidad de IDs por transacción')
+    parser.add_argument('--sin-finalizar', action='store_true', help='Solo completar MesNumero, sin renombrar columnas')
+    args = parser.parse_args()
+
+    engine = get_engine()
+    with engine.connect() as conexion:
+        if 'MesTexto' in columnas_pagos(conexion):
+            sys.exit('La migración ya fue aplicada (existe pagos.MesTexto).')
+
+    agregar_columna(engine)
+    completar_por_lotes(engine, args.lote)
+
+    if not args.sin_finalizar:
+        completados = finalizar(engine)
+        print(f'{completados} pagos nuevos completados; columnas renombradas e índice idx_pagos_cliente_periodo creado.')
+
+    invalidos = pagos_sin_mes(engine, finalizada=not args.sin_finalizar)
+    for pago_id, cliente_id, ano, mes in invalidos:
+        print(f'Pago {pago_id} (cliente {cliente_id}, año {ano}): mes no reconocido {mes!r}')
+
+    if not args.sin_finalizar:
+        print('Reconstruir el resumen de pagos: python libro_pagos.py --reconstruir')
@@ -0,0 +1,4 @@
+-- clientes.ID pasa a AUTO_INCREMENT: la base asigna los IDs de los clientes nuevos
+-- (agregar_cliente e importar_clientes.py ya no calculan el ID con COUNT(*) + 1).
+
+ALTER TABLE clientes MODIFY ID INT NOT NULL AUTO_INCREMENT;
@@ -0,0 +1,17 @@
+-- Cola de recordatorios por WhatsApp a clientes morosos (ver recordatorios.py).
+
+CREATE TABLE recordatorios (
+    ID INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+    ClienteID INT NULL,
+    Telefono VARCHAR(20) NULL,
+    Mensaje VARCHAR(500) NULL,
+    Estado VARCHAR(10) NULL,
+    Intentos INT NULL,
+    ProximoIntento DATETIME NULL,
+    UltimoError VARCHAR(500) NULL,
+    Creado DATETIME NULL,
+    Enviado DATETIME NULL,
+    CONSTRAINT fk_recordatorios_cliente FOREIGN KEY (ClienteID) REFERENCES clientes (ID)
+);
+
+CREATE INDEX idx_recordatorios_estado ON recordatorios (Estado, ProximoIntento);
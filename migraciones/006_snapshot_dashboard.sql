@@ -0,0 +1,14 @@
+-- Indicadores precalculados del Dashboard (ver snapshot_dashboard.py).
+-- clientes.Actualizado marca el último alta o cambio de cada cliente, para saber si hay que volver a contarlos.
+-- Después de aplicarla, cargar el snapshot con: python snapshot_dashboard.py
+
+ALTER TABLE clientes ADD COLUMN Actualizado DATETIME NULL;
+CREATE INDEX idx_clientes_actualizado ON clientes (Actualizado);
+
+CREATE TABLE snapshot_dashboard (
+    ID INT NOT NULL PRIMARY KEY,
+    ClientesPorEstado TEXT NULL,
+    IngresosMensuales TEXT NULL,
+    ClientesContados DATETIME NULL,
+    Actualizado DATETIME NULL
+);
@@ -0,0 +1,8 @@
+-- Contraseñas con scrypt/PBKDF2 y búsqueda del usuario por índice único (ver autenticacion.py).
+-- Los hashes SHA-256 existentes siguen funcionando y se reemplazan al iniciar sesión.
+-- Antes de aplicarla, revisar que no haya nombres de usuario repetidos:
+--   SELECT User, COUNT(*) FROM master_users GROUP BY User HAVING COUNT(*) > 1;
+
+ALTER TABLE master_users MODIFY User VARCHAR(100) NOT NULL;
+ALTER TABLE master_users MODIFY Password VARCHAR(255) NULL;
+CREATE UNIQUE INDEX idx_master_users_user ON master_users (User);
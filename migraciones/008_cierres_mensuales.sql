@@ -0,0 +1,16 @@
+-- Cierres de fin de mes: morosos, facturado y recaudado de cada mes cerrado (ver historico.py).
+-- Después de aplicarla, calcular los cierres anteriores con: python historico.py
+
+CREATE TABLE cierres_mensuales (
+    Ano INT NOT NULL,
+    Mes INT NOT NULL,
+    Clientes INT NULL,
+    Facturado DOUBLE NULL,
+    Recaudado DOUBLE NULL,
+    PagadoPeriodo DOUBLE NULL,
+    MorososPorMeses TEXT NULL,
+    MesesDeuda INT NULL,
+    MontoDeuda DOUBLE NULL,
+    Calculado DATETIME NULL,
+    PRIMARY KEY (Ano, Mes)
+);
@@ -0,0 +1,20 @@
+-- Una cédula por cliente: CedulaClave guarda solo los dígitos de la cédula (como archivos.clave_documento)
+-- y tiene un índice único, así dos importaciones o altas simultáneas no pueden duplicar un cliente.
+-- Requiere MySQL 8 (REGEXP_REPLACE).
+
+ALTER TABLE clientes ADD COLUMN CedulaClave VARCHAR(32) NULL;
+
+UPDATE clientes SET CedulaClave = NULLIF(REGEXP_REPLACE(Cedula, '[^0-9]', ''), '');
+
+-- Las cédulas que ya están repetidas quedan sin clave: la importación las rechaza como ambiguas
+-- y al editar uno de esos clientes se avisa que la cédula pertenece a otro.
+UPDATE clientes c
+JOIN (
+    SELECT CedulaClave FROM clientes WHERE CedulaClave IS NOT NULL GROUP BY CedulaClave HAVING COUNT(*) > 1
+) repetidas ON repetidas.CedulaClave = c.CedulaClave
+SET c.CedulaClave = NULL;
+
+CREATE UNIQUE INDEX idx_clientes_cedula_clave ON clientes (CedulaClave);
+
+-- Clientes con la cédula repetida, para corregirlos a mano:
+-- SELECT ID, NombreCliente, Cedula FROM clientes WHERE CedulaClave IS NULL AND REGEXP_REPLACE(Cedula, '[^0-9]', '') <> '';
@@ -0,0 +1,145 @@
+from datetime import datetime
+from sqlalchemy import Column, Integer, String, Text, Date, DateTime, Float, ForeignKey, LargeBinary, Index
+from sqlalchemy.orm import relationship, declarative_base
+
+Base = declarative_base()
+
+# Definir el mapeo de los meses a números
+meses_map = {
+    "ENERO": 1,
+    "FEBRERO": 2,
+    "MARZO": 3,
+    "ABRIL": 4,
+    "MAYO": 5,
+    "JUNIO": 6,
+    "JULIO": 7,
+    "AGOSTO": 8,
+    "SEPTIEMBRE": 9,
+    "OCTUBRE": 10,
+    "NOVIEMBRE": 11,
+    "DICIEMBRE": 12
+}
+
+# Mapeo inverso: número de mes -> nombre
+nombres_meses = {numero: nombre for nombre, numero in meses_map.items()}
+
+# Definir la tabla master_users para el manejo de usuarios
+class MasterUser(Base):
+    __tablename__ = 'master_users'
+    ID = Column(Integer, primary_key=True, autoincrement=True)
+    Cedula = Column(String)
+    Telefono = Column(String)
+    Nombre = Column(String)
+    User = Column(String(100))
+    Password = Column(String(255))  # scrypt o PBKDF2 con sal (ver autenticacion.py)
+    Funcion = Column(String)
+    __table_args__ = (
+        Index('idx_master_users_user', 'User', unique=True),
+    )
+
+class Cliente(Base):
+    __tablename__ = 'clientes'
+    ID = Column(Integer, primary_key=True, autoincrement=True)
+    NombreCliente = Column(String, index=True)
+    PlanMB = Column(String)
+    FechaInstalacion = Column(Date)
+    TipoServicioID = Column(Integer, ForeignKey('tipo_servicio.ID'))
+    Tarifa = Column(Float)
+    IPAddress = Column(String, index=True)
+    Telefono = Column(String, index=True)
+    Ubicacion = Column(String)
+    Cedula = Column(String, index=True)
+    CedulaClave = Column(String(32))  # Solo los dígitos de la cédula (NULL si no tiene); ver migraciones/009_cedula_unica.sql
+    EstadoID = Column(Integer, ForeignKey('Estados.ID'))
+    Actualizado = Column(DateTime, default=datetime.now, onupdate=datetime.now, index=True)  # Último alta o cambio
+    pagos = relationship('Pago', backref='cliente')
+    __table_args__ = (
+        Index('idx_clientes_cedula_clave', 'CedulaClave', unique=True),
+    )
+
+class TipoServicio(Base):
+    __tablename__ = 'tipo_servicio'
+    ID = Column(Integer, primary_key=True, autoincrement=True)
+    Tipo = Column(String)
+
+class Pago(Base):
+    __tablename__ = 'pagos'
+    ID = Column(Integer, primary_key=True, autoincrement=True)
+    ClienteID = Column(Integer, ForeignKey('clientes.ID'))
+    FechaPago = Column(Date)
+    Mes = Column(Integer)  # Número de mes (1-12); ver migraciones/003_mes_numerico.py
+    Ano = Column(Integer)
+    Monto = Column(Float)
+    Metodo_de_PagoID = Column(Integer, ForeignKey('Metodo_de_Pago.ID'))
+    __table_args__ = (
+        Index('idx_pagos_cliente_periodo', 'ClienteID', 'Ano', 'Mes'),
+    )
+
+class Estado(Base):
+    __tablename__ = 'Estados'
+    ID = Column(Integer, primary_key=True)
+    Estado = Column(String)
+
+class MetodoDePago(Base):
+    __tablename__ = 'Metodo_de_Pago'
+    ID = Column(Integer, primary_key=True)
+    Metodo = Column(String)
+
+# Resumen de pagos por cliente, mantenido de forma incremental al registrar cada pago
+class ResumenPagoCliente(Base):
+    __tablename__ = 'resumen_pagos'
+    ClienteID = Column(Integer, ForeignKey('clientes.ID'), primary_key=True)
+    UltimoAno = Column(Integer)
+    UltimoMes = Column(Integer)
+    MesesPagados = Column(LargeBinary)  # Un bit por mes desde enero del año base (ver libro_pagos.py)
+    TotalPagado = Column(Float)
+    CantidadPagos = Column(Integer)
+
+# Ingresos por mes, mantenidos junto con el resumen por cliente
+class ResumenIngresoMensual(Base):
+    __tablename__ = 'resumen_ingresos'
+    Ano = Column(Integer, primary_key=True)
+    Mes = Column(Integer, primary_key=True)
+    Total = Column(Float)
+    CantidadPagos = Column(Integer)
+
+# Cola de recordatorios por WhatsApp (ver recordatorios.py); el estado de cada envío queda guardado
+# para poder retomar el despacho si la aplicación se reinicia
+class EnvioRecordatorio(Base):
+    __tablename__ = 'recordatorios'
+    ID = Column(Integer, primary_key=True, autoincrement=True)
+    ClienteID = Column(Integer, ForeignKey('clientes.ID'))
+    Telefono = Column(String(20))
+    Mensaje = Column(String(500))
+    Estado = Column(String(10))  # pendiente, enviando, enviado o fallido
+    Intentos = Column(Integer)
+    ProximoIntento = Column(DateTime)
+    UltimoError = Column(String(500))
+    Creado = Column(DateTime)
+    Enviado = Column(DateTime)
+    __table_args__ = (
+        Index('idx_recordatorios_estado', 'Estado', 'ProximoIntento'),
+    )
+
+# Indicadores del Dashboard precalculados (una sola fila, ver snapshot_dashboard.py)
+class SnapshotDashboard(Base):
+    __tablename__ = 'snapshot_dashboard'
+    ID = Column(Integer, primary_key=True)
+    ClientesPorEstado = Column(Text)  # JSON {EstadoID: cantidad}
+    IngresosMensuales = Column(Text)  # JSON {año: [total de enero, ..., total de diciembre]}
+    ClientesContados = Column(DateTime)  # Momento del último conteo de clientes
+    Actualizado = Column(DateTime)
+
+# Cierres de fin de mes (ver historico.py): se calculan una vez cerrado el mes y no se recalculan
+class CierreMensual(Base):
+    __tablename__ = 'cierres_mensuales'
+    Ano = Column(Integer, primary_key=True)
+    Mes = Column(Integer, primary_key=True)
+    Clientes = Column(Integer)  # Clientes cobrables ya instalados al cierre
+    Facturado = Column(Float)  # Suma de las tarifas de esos clientes
+    Recaudado = Column(Float)  # Pagos recibidos en el mes (por fecha de pago)
+    PagadoPeriodo = Column(Float)  # Pagos que corresponden al mes (por mes pagado)
+    MorososPorMeses = Column(Text)  # JSON {meses de deuda mínimos: cantidad de morosos}
+    MesesDeuda = Column(Integer)
+    MontoDeuda = Column(Float)
+    Calculado = Column(DateTime)
@@ -0,0 +1,142 @@
+import pandas as pd
+import numpy as np
+from datetime import date
+from models import Cliente, TipoServicio, Pago
+
+# Columnas del reporte de morosos (mismo orden que se muestra en la página)
+COLUMNAS_MOROSOS = [
+    'ID',
+    'Nombre',
+    'Telefono',
+    'Ubicacion',
+    'Fecha de Instalación',
+    'Meses Deuda',
+    'Monto Deuda',
+    'Tipo de Servicio'
+]
+
+# Inicio por defecto del cálculo para clientes sin pagos registrados
+INICIO_COBRO = date(2024, 1, 1)
+
+
+# Convertir (año, mes) a un índice lineal de meses para poder restar periodos
+def indice_mes(ano, mes):
+    return ano * 12 + (mes - 1)
+
+
+# Cargar todos los clientes (o los que cumplen el filtro) con su tipo de servicio en una sola consulta
+def cargar_clientes(session, filtro=None):
+    consulta = session.query(
+        Cliente.ID,
+        Cliente.NombreCliente,
+        Cliente.Telefono,
+        Cliente.Ubicacion,
+        Cliente.FechaInstalacion,
+        Cliente.Tarifa,
+        Cliente.EstadoID,
+        Cliente.TipoServicioID,
+        TipoServicio.Tipo
+    ).outerjoin(TipoServicio, TipoServicio.ID == Cliente.TipoServicioID).order_by(Cliente.ID)
+    if filtro is not None:
+        consulta = consulta.filter(filtro)
+    return pd.read_sql(consulta.statement, session.connection())
+
+
+# Cargar todos los pagos en una sola consulta (solo las columnas que usa el cálculo)
+def cargar_pagos(session):
+    consulta = session.query(Pago.ClienteID, Pago.Ano, Pago.Mes)
+    return pd.read_sql(consulta.statement, session.connection())
+
+
+# Calcular los clientes morosos sobre toda la tabla de clientes a la vez a partir de los pagos.
+# Devuelve el DataFrame de morosos y una lista de avisos (nivel, mensaje) para la página.
+def calcular_morosos(df_clientes, df_pagos, meses_deuda_minima, hoy=None):
+    hoy = hoy or date.today()
+    avisos = []
+    clientes, inicio_instalacion = clientes_cobrables(df_clientes, avisos)
+
+    # Los pagos sin año o con un mes fuera de 1-12 no cuentan como meses pagados
+    pagos = df_pagos[
+        df_pagos['ClienteID'].isin(clientes['ID']) & df_pagos['Ano'].notna() & df_pagos['Mes'].between(1, 12)
+    ]
+    pagados = pd.DataFrame({
+        'ID': pagos['ClienteID'].to_numpy(),
+        'periodo': indice_mes(pagos['Ano'].astype(int), pagos['Mes'].astype(int)).to_numpy()
+    }).drop_duplicates()
+
+    # Último pago por cliente (ORDER BY Ano DESC, Mes DESC)
+    ultimo_periodo = clientes['ID'].map(pagados.groupby('ID')['periodo'].max()).to_numpy(dtype=float)
+    inicio = _primer_mes_a_cobrar(ultimo_periodo, inicio_instalacion)
+    fin = _ultimo_mes_vencido(clientes, hoy)
+    meses_totales = np.maximum(fin - inicio + 1, 0)
+
+    # Meses pagados (sin repetir) dentro del rango [inicio, fin] de cada cliente
+    rangos = pd.DataFrame({'ID': clientes['ID'].to_numpy(), 'inicio': inicio, 'fin': fin})
+    pagados = pagados.merge(rangos, on='ID')
+    en_rango = pagados[(pagados['periodo'] >= pagados['inicio']) & (pagados['periodo'] <= pagados['fin'])]
+    meses_pagados = clientes['ID'].map(en_rango.groupby('ID').size()).fillna(0).astype(np.int64).to_numpy()
+
+    clientes['meses_deuda'] = meses_totales - meses_pagados
+    return armar_reporte(clientes, meses_deuda_minima), avisos
+
+
+# Calcular los clientes morosos a partir del resumen de pagos (libro_pagos.py): una fila por cliente.
+# El último pago es el último mes del calendario; los meses posteriores a él no pueden estar pagados,
+# así que la deuda es la cantidad de meses vencidos después del último pago.
+def calcular_morosos_resumen(df_clientes, df_resumen, meses_deuda_minima, hoy=None):
+    hoy = hoy or date.today()
+    avisos = []
+    clientes, inicio_instalacion = clientes_cobrables(df_clientes, avisos)
+
+    resumen = df_resumen.set_index('ClienteID')
+    ultimo_periodo = clientes['ID'].map(indice_mes(resumen['UltimoAno'], resumen['UltimoMes'])).to_numpy(dtype=float)
+    con_pagos = ~np.isnan(ultimo_periodo)
+
+    inicio = _primer_mes_a_cobrar(ultimo_periodo, inicio_instalacion)
+    fin = _ultimo_mes_vencido(clientes, hoy)
+    # El mes del último pago está pagado; si no hay pagos se cobra desde el primer mes
+    clientes['meses_deuda'] = np.maximum(fin - inicio + 1 - con_pagos.astype(np.int64), 0)
+    return armar_reporte(clientes, meses_deuda_minima), avisos
+
+
+# Omitir clientes con tarifa nula, suspendidos, retirados o sin fecha de instalación (también lo usa historico.py).
+# Devuelve los clientes a revisar (con su día de corte) y el índice del mes de instalación.
+def clientes_cobrables(df_clientes, avisos):
+    clientes = df_clientes[
+        (df_clientes['Tarifa'].fillna(0.0) != 0.0) & (~df_clientes['EstadoID'].isin([2, 3]))
+    ].copy()
+
+    sin_fecha = clientes['FechaInstalacion'].isna()
+    for nombre in clientes.loc[sin_fecha, 'NombreCliente']:
+        avisos.append(('error', f"El cliente {nombre} no tiene fecha de instalación. Ignorando cliente."))
+    clientes = clientes[~sin_fecha]
+
+    fecha_instalacion = pd.to_datetime(clientes['FechaInstalacion'])
+    clientes['dia_corte'] = fecha_instalacion.dt.day.to_numpy()
+    return clientes, indice_mes(fecha_instalacion.dt.year, fecha_instalacion.dt.month).to_numpy()
+
+
+# Primer mes a cobrar: el del último pago (NaN si no hay) o, si no hay pagos, la instalación (no antes de 2024)
+def _primer_mes_a_cobrar(ultimo_periodo, inicio_instalacion):
+    inicio_sin_pagos = np.maximum(inicio_instalacion, indice_mes(INICIO_COBRO.year, INICIO_COBRO.month))
+    return np.where(np.isnan(ultimo_periodo), inicio_sin_pagos, np.nan_to_num(ultimo_periodo)).astype(np.int64)
+
+
+# Último mes vencido: el mes actual solo cuenta si ya pasó el día de corte
+def _ultimo_mes_vencido(clientes, hoy):
+    return indice_mes(hoy.year, hoy.month) - (hoy.day < clientes['dia_corte'].to_numpy()).astype(np.int64)
+
+
+# Reporte de morosos (columnas COLUMNAS_MOROSOS) a partir de los clientes con su columna meses_deuda
+def armar_reporte(clientes, meses_deuda_minima):
+    morosos = clientes[clientes['meses_deuda'] >= meses_deuda_minima].sort_values('ID')
+    return pd.DataFrame({
+        'ID': morosos['ID'],
+        'Nombre': morosos['NombreCliente'],
+        'Telefono': morosos['Telefono'],
+        'Ubicacion': morosos['Ubicacion'],
+        'Fecha de Instalación': morosos['FechaInstalacion'],
+        'Meses Deuda': morosos['meses_deuda'].astype(int),
+        'Monto Deuda': morosos['meses_deuda'] * morosos['Tarifa'],
+        'Tipo de Servicio': morosos['Tipo']
+    }, columns=COLUMNAS_MOROSOS).reset_index(drop=True)
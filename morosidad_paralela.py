@@ -0,0 +1,161 @@
+import argparse
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+import numpy as np
+import pandas as pd
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from models import Cliente, Pago, ResumenPagoCliente
+from morosidad import COLUMNAS_MOROSOS, cargar_clientes, calcular_morosos_resumen, indice_mes
+
+# Cálculo de morosos por particiones de clientes (rangos de ID o tipo de servicio) en un pool de procesos.
+# Cada proceso abre su propia conexión, carga solo los clientes de su partición, lee los pagos
+# (o el resumen) con un cursor del lado del servidor por lotes y calcula su parte; al final se unen
+# los resultados. Con menos de MINIMO_PARALELO clientes o con un solo trabajador se calcula en el
+# mismo proceso, con la sesión de la página.
+
+TRABAJADORES = int(os.environ.get('MOROSOS_TRABAJADORES', os.cpu_count() or 1))
+MINIMO_PARALELO = int(os.environ.get('MOROSOS_MINIMO_PARALELO', 50000))
+PARTICIONES_POR_TRABAJADOR = 4
+TAMANO_LOTE = 50000
+
+
+# Rangos de ID de clientes (tuplas ('ID', desde, hasta)) de tamaño parecido
+def particiones_por_id(session, cantidad):
+    minimo, maximo = session.query(func.min(Cliente.ID), func.max(Cliente.ID)).one()
+    if minimo is None:
+        return []
+    limites = np.linspace(minimo, maximo + 1, max(1, cantidad) + 1).astype(np.int64)
+    return [('ID', int(desde), int(hasta) - 1) for desde, hasta in zip(limites[:-1], limites[1:]) if hasta > desde]
+
+
+# Una partición por tipo de servicio (más una para los clientes sin tipo)
+def particiones_por_tipo(session):
+    tipos = [tipo_id for tipo_id, in session.query(Cliente.TipoServicioID).distinct().order_by(Cliente.TipoServicioID)]
+    return [('tipo', tipo_id) for tipo_id in tipos]
+
+
+def _filtro_clientes(particion):
+    if particion[0] == 'ID':
+        return Cliente.ID.between(particion[1], particion[2])
+    return Cliente.TipoServicioID.is_(None) if particion[1] is None else Cliente.TipoServicioID == particion[1]
+
+
+# Último periodo pagado por cliente de la partición, leído por lotes con un cursor del lado del servidor.
+# fuente='resumen' lee una fila por cliente de resumen_pagos; fuente='pagos' recorre los pagos y se queda
+# con el último mes de cada cliente (mismo resultado, sin depender del resumen).
+def ultimos_pagos(session, particion, fuente='resumen'):
+    if fuente == 'resumen':
+        consulta = session.query(ResumenPagoCliente.ClienteID, ResumenPagoCliente.UltimoAno.label('Ano'), ResumenPagoCliente.UltimoMes.label('Mes'))
+        consulta = consulta.join(Cliente, Cliente.ID == ResumenPagoCliente.ClienteID)
+    else:
+        consulta = session.query(Pago.ClienteID, Pago.Ano, Pago.Mes).join(Cliente, Cliente.ID == Pago.ClienteID)
+        consulta = consulta.filter(Pago.Ano.isnot(None), Pago.Mes.between(1, 12))
+    consulta = consulta.filter(_filtro_clientes(particion))
+
+    ultimos = pd.Series(dtype=np.float64)
+    resultado = session.connection().execution_options(stream_results=True, yield_per=TAMANO_LOTE).execute(consulta.statement)
+    for filas in resultado.partitions():
+        lote = pd.DataFrame(filas, columns=['ClienteID', 'Ano', 'Mes']).dropna()
+        periodos = pd.Series(indice_mes(lote['Ano'].astype(np.int64), lote['Mes'].astype(np.int64)).to_numpy(), index=lote['ClienteID'])
+        ultimos = pd.concat([ultimos, periodos]).groupby(level=0).max()
+
+    periodo = ultimos.astype(np.int64)
+    return pd.DataFrame({
+        'ClienteID': ultimos.index.astype(np.int64),
+        'UltimoAno': (periodo // 12).to_numpy(),
+        'UltimoMes': (periodo % 12 + 1).to_numpy()
+    })
+
+
+def calcular_particion(session, particion, meses_deuda_minima, hoy, fuente='resumen'):
+    clientes = cargar_clientes(session, _filtro_clientes(particion))
+    return calcular_morosos_resumen(clientes, ultimos_pagos(session, particion, fuente), meses_deuda_minima, hoy)
+
+
+_engine_proceso = None
+
+
+# Punto de entrada de cada proceso del pool: un engine propio por proceso, reutilizado entre particiones
+def _calcular_en_proceso(url, particion, meses_deuda_minima, hoy, fuente):
+    global _engine_proceso
+    if _engine_proceso is None:
+        from db_config import crear_engine
+        _engine_proceso = crear_engine(url, pool_size=1, max_overflow=0)
+    with Session(_engine_proceso) as session:
+        return calcular_particion(session, particion, meses_deuda_minima, hoy, fuente)
+
+
+_pool = None
+_pool_trabajadores = 0
+_lock = threading.Lock()
+
+
+# Pool de procesos único (persiste entre las ejecuciones del script de Streamlit).
+# Se usa "spawn" para no copiar al hijo los hilos ni las conexiones abiertas del proceso de Streamlit.
+def obtener_pool(trabajadores):
+    global _pool, _pool_trabajadores
+    with _lock:
+        if _pool is None or _pool_trabajadores != trabajadores:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            _pool = ProcessPoolExecutor(max_workers=trabajadores, mp_context=multiprocessing.get_context('spawn'))
+            _pool_trabajadores = trabajadores
+        return _pool
+
+
+# Calcular los morosos por particiones y unir los resultados (mismo DataFrame y avisos que calcular_morosos_resumen).
+# particionar_por: 'ID' (rangos de ID) o 'tipo' (tipo de servicio).
+def calcular_morosos_paralelo(session, meses_deuda_minima, hoy=None, trabajadores=TRABAJADORES,
+                              particionar_por='ID', fuente='resumen', minimo_paralelo=MINIMO_PARALELO):
+    hoy = hoy or date.today()  # La misma fecha para todas las particiones
+    en_paralelo = trabajadores > 1 and session.query(func.count(Cliente.ID)).scalar() >= minimo_paralelo
+    if particionar_por == 'tipo':
+        particiones = particiones_por_tipo(session)
+    else:
+        particiones = particiones_por_id(session, trabajadores * PARTICIONES_POR_TRABAJADOR if en_paralelo else 1)
+
+    if en_paralelo:
+        url = session.get_bind().url.render_as_string(hide_password=False)
+        pool = obtener_pool(trabajadores)
+        futuros = [pool.submit(_calcular_en_proceso, url, particion, meses_deuda_minima, hoy, fuente) for particion in particiones]
+        resultados = [futuro.result() for futuro in futuros]
+    else:
+        resultados = [calcular_particion(session, particion, meses_deuda_minima, hoy, fuente) for particion in particiones]
+
+    reportes = [reporte for reporte, _ in resultados if not reporte.empty]
+    avisos = [aviso for _, avisos_particion in resultados for aviso in avisos_particion]
+    if not reportes:
+        return pd.DataFrame(columns=COLUMNAS_MOROSOS), avisos
+    return pd.concat(reportes).sort_values('ID').reset_index(drop=True), avisos
+
+
+if __name__ == '__main__':
+    import time
+    from db_config import crear_engine, session_scope
+
+    parser = argparse.ArgumentParser(description='Calcular morosos por particiones en varios procesos.')
+    parser.add_argument('--minimo', type=int, default=3, help='Meses de deuda mínimos')
+    parser.add_argument('--trabajadores', type=int, default=TRABAJADORES)
+    parser.add_argument('--por', choices=['ID', 'tipo'], default='ID')
+    parser.add_argument('--fuente', choices=['resumen', 'pagos'], default='resumen')
+    parser.add_argument('--url', default=None, help='Base a usar en lugar de DB_URL (por ejemplo una copia o datos sintéticos)')
+    parser.add_argument('--verificar', action='store_true', help='Comparar con el cálculo en un solo proceso (requiere --url)')
+    args = parser.parse_args()
+    # La verificación calcula todo dos veces: no se corre contra la base configurada (producción) sin pedirlo
+    if args.verificar and not args.url:
+        parser.error('--verificar requiere --url con una base de prueba o una copia, no la base de producción')
+
+    with session_scope() if args.url is None else Session(crear_engine(args.url)) as session:
+        inicio = time.perf_counter()
+        morosos, _ = calcular_morosos_paralelo(session, args.minimo, None, args.trabajadores, args.por, args.fuente, minimo_paralelo=0)
+        print(f'{len(morosos)} morosos en {time.perf_counter() - inicio:.2f} s con {args.trabajadores} procesos')
+        if args.verificar:
+            inicio = time.perf_counter()
+            esperado, _ = calcular_morosos_paralelo(session, args.minimo, None, 1, fuente=args.fuente)
+            print(f'Un solo proceso: {time.perf_counter() - inicio:.2f} s')
+            pd.testing.assert_frame_equal(morosos, esperado)
+            print('Resultados idénticos')
@@ -0,0 +1,261 @@
+import argparse
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from sqlalchemy import func
+from models import EnvioRecordatorio
+from db_config import session_scope
+
+# Despacho de recordatorios por WhatsApp en segundo plano.
+# La página de morosos solo encola los envíos (tabla recordatorios) y vuelve de inmediato;
+# un hilo despachador los toma por lotes, respeta el límite de mensajes por minuto y
+# reintenta los que fallan con espera exponencial. Como el estado está en la base,
+# un despacho interrumpido se retoma al volver a iniciar el despachador.
+
+POR_MINUTO = float(os.environ.get('WHATSAPP_POR_MINUTO', 4))
+# pywhatkit maneja el navegador con el teclado y el mouse: con más de un hilo los envíos se pisan
+HILOS = int(os.environ.get('WHATSAPP_HILOS', 1))
+MAX_INTENTOS = int(os.environ.get('WHATSAPP_MAX_INTENTOS', 5))
+ESPERA_BASE = int(os.environ.get('WHATSAPP_ESPERA_BASE', 60))  # Segundos antes del primer reintento
+ESPERA_MAXIMA = 3600
+PREFIJO_PAIS = os.environ.get('WHATSAPP_PREFIJO_PAIS', '+57')
+
+PLANTILLA = ('Hola {nombre}, le recordamos que tiene {meses} mes(es) pendiente(s) de pago '
+             'por un valor de ${monto:,.0f}. Gracias por estar al día con Vozip.')
+
+
+# Envío real por WhatsApp Web con pywhatkit (se importa solo al usarlo: necesita navegador y pantalla).
+# Si no se puede cargar (sin instalar o sin pantalla) se avisa con RuntimeError al crear el enviador.
+class EnviadorWhatsApp:
+    def __init__(self, espera=15, cerrar_pestana=True):
+        try:
+            import pywhatkit
+        except Exception as e:
+            raise RuntimeError(f'No se puede enviar por WhatsApp: pywhatkit no está disponible ({e})') from e
+        self.kit = pywhatkit
+        self.espera = espera
+        self.cerrar_pestana = cerrar_pestana
+
+    def enviar(self, telefono, mensaje):
+        self.kit.sendwhatmsg_instantly(telefono, mensaje, wait_time=self.espera, tab_close=self.cerrar_pestana)
+
+
+# Enviador local que solo guarda los mensajes (pruebas y desarrollo); los teléfonos en fallar dan error
+class EnviadorPrueba:
+    def __init__(self, fallar=()):
+        self.enviados = []
+        self.fallar = set(fallar)
+        self._lock = threading.Lock()
+
+    def enviar(self, telefono, mensaje):
+        if telefono in self.fallar:
+            raise RuntimeError(f'Envío simulado fallido a {telefono}')
+        with self._lock:
+            self.enviados.append((telefono, mensaje))
+
+
+ENVIADORES = {
+    'whatsapp': EnviadorWhatsApp,
+    'prueba': EnviadorPrueba
+}
+
+
+# Límite de envíos por minuto compartido por todos los hilos (un turno cada 60 / por_minuto segundos)
+class LimiteEnvios:
+    def __init__(self, por_minuto):
+        self.intervalo = 60.0 / por_minuto
+        self.siguiente = 0.0
+        self._lock = threading.Lock()
+
+    def esperar(self):
+        with self._lock:
+            ahora = time.monotonic()
+            turno = max(ahora, self.siguiente)
+            self.siguiente = turno + self.intervalo
+        time.sleep(turno - ahora)
+
+
+# Teléfono en formato internacional (+57...) o None si no tiene la cantidad de dígitos esperada
+def formatear_telefono(telefono):
+    digitos = ''.join(c for c in str(telefono or '') if c.isdigit())
+    prefijo = PREFIJO_PAIS.lstrip('+')
+    if len(digitos) == 10:
+        return f'+{prefijo}{digitos}'
+    if len(digitos) == 10 + len(prefijo) and digitos.startswith(prefijo):
+        return f'+{digitos}'
+    return None
+
+
+def espera_reintento(intentos):
+    return min(ESPERA_BASE * 2 ** (intentos - 1), ESPERA_MAXIMA)
+
+
+# Encolar un recordatorio por cada moroso del reporte (ID, Nombre, Telefono, Meses Deuda, Monto Deuda).
+# Se omiten los clientes sin teléfono válido y los que ya tienen un recordatorio pendiente.
+# Devuelve (cantidad encolada, lista de omitidos con el motivo). El commit queda a cargo de quien llama.
+def encolar_recordatorios(session, df_morosos):
+    en_cola = {
+        cliente_id for cliente_id, in session.query(EnvioRecordatorio.ClienteID)
+        .filter(EnvioRecordatorio.Estado.in_(['pendiente', 'enviando']))
+    }
+    ahora = datetime.now()
+    nuevos, omitidos = [], []
+    columnas = ['ID', 'Nombre', 'Telefono', 'Meses Deuda', 'Monto Deuda']
+    for cliente_id, nombre, telefono_original, meses, monto in df_morosos[columnas].itertuples(index=False, name=None):
+        cliente_id = int(cliente_id)
+        telefono = formatear_telefono(telefono_original)
+        if telefono is None:
+            omitidos.append({'ID': cliente_id, 'Nombre': nombre, 'Motivo': f'Teléfono no válido: {telefono_original!r}'})
+            continue
+        if cliente_id in en_cola:
+            omitidos.append({'ID': cliente_id, 'Nombre': nombre, 'Motivo': 'Ya tiene un recordatorio pendiente'})
+            continue
+        en_cola.add(cliente_id)
+        nuevos.append({
+            'ClienteID': cliente_id,
+            'Telefono': telefono,
+            'Mensaje': PLANTILLA.format(nombre=(nombre or '').title(), meses=int(meses), monto=float(monto)),
+            'Estado': 'pendiente',
+            'Intentos': 0,
+            'ProximoIntento': ahora,
+            'Creado': ahora
+        })
+    session.bulk_insert_mappings(EnvioRecordatorio, nuevos)
+    return len(nuevos), omitidos
+
+
+# Cantidad de recordatorios por estado
+def resumen_envios(session):
+    conteo = dict(session.query(EnvioRecordatorio.Estado, func.count()).group_by(EnvioRecordatorio.Estado).all())
+    return {estado: conteo.get(estado, 0) for estado in ['pendiente', 'enviando', 'enviado', 'fallido']}
+
+
+class Despachador:
+    def __init__(self, enviador, fabrica_sesiones=None, hilos=HILOS, por_minuto=POR_MINUTO,
+                 max_intentos=MAX_INTENTOS, tamano_lote=50, pausa=5.0):
+        self.enviador = enviador
+        self.fabrica_sesiones = fabrica_sesiones
+        self.hilos = hilos
+        self.limite = LimiteEnvios(por_minuto)
+        self.max_intentos = max_intentos
+        self.tamano_lote = tamano_lote
+        self.pausa = pausa
+        self.enviados = 0
+        self.fallidos = 0
+        self._detener = threading.Event()
+        self._hilo = None
+        self._lock = threading.Lock()
+
+    def activo(self):
+        return self._hilo is not None and self._hilo.is_alive()
+
+    # Iniciar el hilo de despacho (si ya está corriendo no hace nada)
+    def iniciar(self):
+        with self._lock:
+            if self.activo():
+                return
+            self.recuperar_interrumpidos()
+            self._detener.clear()
+            self._hilo = threading.Thread(target=self._bucle, name='despachador-recordatorios', daemon=True)
+            self._hilo.start()
+
+    def detener(self, esperar=True):
+        self._detener.set()
+        if esperar and self._hilo is not None:
+            self._hilo.join()
+
+    # Los envíos que quedaron "enviando" cuando se cortó la aplicación vuelven a la cola
+    def recuperar_interrumpidos(self):
+        with session_scope(self.fabrica_sesiones) as session:
+            return session.query(EnvioRecordatorio).filter_by(Estado='enviando').update(
+                {'Estado': 'pendiente'}, synchronize_session=False
+            )
+
+    def _bucle(self):
+        while not self._detener.is_set():
+            if not self.procesar_pendientes():
+                self._detener.wait(self.pausa)
+
+    # Tomar un lote de envíos vencidos y despacharlos con el pool de hilos; devuelve cuántos se tomaron
+    def procesar_pendientes(self):
+        trabajos = self._reservar()
+        if trabajos:
+            with ThreadPoolExecutor(max_workers=self.hilos) as pool:
+                list(pool.map(self._enviar, trabajos))
+        return len(trabajos)
+
+    def _reservar(self):
+        with session_scope(self.fabrica_sesiones) as session:
+            envios = session.query(EnvioRecordatorio).filter(
+                EnvioRecordatorio.Estado == 'pendiente',
+                EnvioRecordatorio.ProximoIntento <= datetime.now()
+            ).order_by(EnvioRecordatorio.ProximoIntento, EnvioRecordatorio.ID).limit(self.tamano_lote).with_for_update(skip_locked=True).all()
+            for envio in envios:
+                envio.Estado = 'enviando'
+            return [(envio.ID, envio.Telefono, envio.Mensaje) for envio in envios]
+
+    def _enviar(self, trabajo):
+        envio_id, telefono, mensaje = trabajo
+        if self._detener.is_set():
+            self._registrar(envio_id, None, devolver=True)
+            return
+        self.limite.esperar()
+        try:
+            self.enviador.enviar(telefono, mensaje)
+            error = None
+        except Exception as e:
+            error = str(e)[:500] or type(e).__name__
+        self._registrar(envio_id, error)
+
+    def _registrar(self, envio_id, error, devolver=False):
+        with session_scope(self.fabrica_sesiones) as session:
+            envio = session.get(EnvioRecordatorio, envio_id)
+            if devolver:
+                envio.Estado = 'pendiente'
+                return
+            envio.Intentos = (envio.Intentos or 0) + 1
+            envio.UltimoError = error
+            if error is None:
+                envio.Estado = 'enviado'
+                envio.Enviado = datetime.now()
+                self.enviados += 1
+            elif envio.Intentos >= self.max_intentos:
+                envio.Estado = 'fallido'
+                self.fallidos += 1
+            else:
+                envio.Estado = 'pendiente'
+                envio.ProximoIntento = datetime.now() + timedelta(seconds=espera_reintento(envio.Intentos))
+
+
+_despachador = None
+_lock = threading.Lock()
+
+
+# Despachador único por proceso (persiste entre las ejecuciones del script de Streamlit).
+# WHATSAPP_ENVIADOR=prueba usa el enviador local en lugar de WhatsApp Web.
+def obtener_despachador():
+    global _despachador
+    if _despachador is None:
+        with _lock:
+            if _despachador is None:
+                _despachador = Despachador(ENVIADORES[os.environ.get('WHATSAPP_ENVIADOR', 'whatsapp')]())
+    return _despachador
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Despachar los recordatorios por WhatsApp pendientes.')
+    parser.add_argument('--estado', action='store_true', help='Solo mostrar la cantidad de recordatorios por estado')
+    args = parser.parse_args()
+
+    if not args.estado:
+        despachador = obtener_despachador()
+        despachador.recuperar_interrumpidos()
+        try:
+            while despachador.procesar_pendientes():
+                print(f'{despachador.enviados} enviados, {despachador.fallidos} fallidos')
+        except KeyboardInterrupt:
+            despachador.detener(esperar=False)
+    with session_scope() as session:
+        print(resumen_envios(session))
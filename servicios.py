@@ -0,0 +1,370 @@
+import io
+from sqlalchemy.exc import IntegrityError
+from models import MasterUser, Cliente, TipoServicio, Pago
+from morosidad_paralela import calcular_morosos_paralelo
+from libro_pagos import registrar_pago
+from consultas import COLUMNAS_CLIENTE, cargar_catalogos, construir_df_clientes, contar_clientes, pagina_clientes, consultar_pagos_cliente
+from estadisticas import MESES
+from snapshot_dashboard import leer_snapshot, refrescar_snapshot
+from busqueda import obtener_indice, actualizar_indice, invalidar_indice
+from importar_pagos import importar_pagos
+from importar_clientes import importar_clientes
+from recordatorios import encolar_recordatorios, resumen_envios, obtener_despachador
+from exportacion import lotes_clientes
+from archivos import clave_documento
+import analitica
+import historico
+from cache import cache
+from autenticacion import (hash_password, verificar_password, necesita_rehash, verificacion_ficticia,
+                           comprobar_intentos, registrar_intento, crear_sesion, usuario_de_sesion, cerrar_sesion)
+
+# Capa de servicios entre las páginas de Streamlit y la base de datos: las páginas solo
+# muestran y piden datos; las consultas, el ORM, la caché y los commits quedan aquí.
+# Todas las funciones reciben la sesión de la ejecución en curso (db_config.session_scope),
+# que no toma una conexión del pool hasta la primera consulta: una página que no lee datos
+# no abre ninguna conexión.
+
+# Estados en los que la tarifa se fuerza a 0
+ESTADOS_SIN_TARIFA = ['retirado', 'suspendido']
+
+# El historial de pagos de un cliente se invalida al registrar sus pagos; el TTL solo cubre
+# cambios hechos fuera de la aplicación
+TTL_HISTORIAL_PAGOS = 3600
+
+
+# ---- Usuarios ----
+
+# Iniciar sesión: devuelve (token, datos del usuario) si el nombre y la contraseña son correctos, o None.
+# Lanza autenticacion.IntentosExcedidos si el usuario o la IP tienen demasiados fallos recientes
+# (se rechaza sin consultar la base ni calcular el hash). Los hashes SHA-256 antiguos se
+# reemplazan por el formato nuevo al iniciar sesión.
+def autenticar(session, username, password, ip=None):
+    comprobar_intentos(username, ip)
+    usuario = session.query(MasterUser).filter_by(User=username).one_or_none()
+    if usuario is None:
+        verificacion_ficticia(password)
+        correcto = False
+    else:
+        correcto = verificar_password(usuario.Password, password)
+    registrar_intento(username, ip, correcto)
+    if not correcto:
+        return None
+
+    if necesita_rehash(usuario.Password):
+        usuario.Password = hash_password(password)
+        session.commit()
+    datos = {'ID': usuario.ID, 'Nombre': usuario.Nombre, 'User': usuario.User, 'Funcion': usuario.Funcion}
+    return crear_sesion(datos), datos
+
+
+# Datos del usuario de una sesión iniciada, sin consultar la base; None si expiró o se cerró
+def usuario_sesion(token):
+    return usuario_de_sesion(token)
+
+
+def terminar_sesion(token):
+    cerrar_sesion(token)
+
+
+# Crear un usuario; devuelve False si el nombre de usuario ya existe
+def crear_usuario(session, nombre, cedula, telefono, funcion, username, password):
+    session.add(MasterUser(
+        Cedula=cedula,
+        Telefono=telefono,
+        Nombre=nombre,
+        User=username,
+        Password=hash_password(password),
+        Funcion=funcion
+    ))
+    try:
+        session.commit()
+        return True
+    except IntegrityError:
+        session.rollback()
+        return False
+
+
+# ---- Catálogos ----
+
+# Catálogos (estados, tipos de servicio, métodos de pago) desde la caché
+def obtener_catalogos(session):
+    return cache.obtener_o_calcular('catalogos', 'todos', lambda: cargar_catalogos(session))
+
+
+# Primer tipo de servicio cuyo nombre contiene el texto, o None
+def buscar_tipo_servicio(session, texto):
+    return session.query(TipoServicio.Tipo).filter(TipoServicio.Tipo.ilike(f"%{texto}%")).scalar()
+
+
+# ---- Clientes ----
+
+# DataFrame de clientes desde la caché
+def obtener_df_clientes(session):
+    return cache.obtener_o_calcular('clientes', 'df_clientes', lambda: construir_df_clientes(session))
+
+
+# Una página del listado de clientes y el total de clientes con esos filtros (cacheado)
+def listar_clientes(session, estado_id, tipo_servicio_id, orden, despues_de, tamano):
+    total = cache.obtener_o_calcular('clientes', ('conteo', estado_id, tipo_servicio_id), lambda: contar_clientes(session, estado_id, tipo_servicio_id))
+    df_pagina, siguiente = pagina_clientes(session, obtener_catalogos(session), estado_id, tipo_servicio_id, orden, despues_de, tamano)
+    return df_pagina, siguiente, total
+
+
+# Columnas de un cliente como diccionario, o None si no existe
+def obtener_cliente(session, cliente_id):
+    fila = session.query(*COLUMNAS_CLIENTE).filter(Cliente.ID == cliente_id).first()
+    return dict(fila._mapping) if fila else None
+
+
+# IDs que coinciden con el texto en los campos indicados, desde el índice en memoria
+def buscar_clientes(session, texto, campos, pagina=0, por_pagina=20):
+    return obtener_indice(session).buscar(texto, campos, pagina, por_pagina)
+
+
+def valor_indexado(session, cliente_id, campo):
+    return obtener_indice(session).valor(cliente_id, campo)
+
+
+def _aplicar_datos(cliente, datos, estado):
+    for columna, valor in datos.items():
+        setattr(cliente, columna, valor)
+    if estado in ESTADOS_SIN_TARIFA:
+        cliente.Tarifa = 0.0
+    cliente.CedulaClave = clave_documento(cliente.Cedula) or None
+
+
+# Guardar el cliente; devuelve None si su cédula ya es de otro cliente (índice único sobre CedulaClave)
+def _cliente_guardado(session, cliente):
+    try:
+        session.commit()
+    except IntegrityError:
+        session.rollback()
+        return None
+    cache.invalidar('clientes')
+    actualizar_indice(cliente)
+    return cliente.ID
+
+
+# Crear un cliente con las columnas de Cliente indicadas (el ID lo asigna la base); devuelve el ID,
+# o None si ya existe un cliente con la misma cédula
+def crear_cliente(session, datos):
+    cliente = Cliente()
+    _aplicar_datos(cliente, datos, obtener_catalogos(session)['estados'].get(datos.get('EstadoID')))
+    session.add(cliente)
+    return _cliente_guardado(session, cliente)
+
+
+# Guardar los cambios de un cliente; devuelve el ID, o None si no existe o la cédula ya es de otro cliente
+def actualizar_cliente(session, cliente_id, datos):
+    cliente = session.get(Cliente, cliente_id)
+    if cliente is None:
+        return None
+    _aplicar_datos(cliente, datos, obtener_catalogos(session)['estados'].get(datos.get('EstadoID', cliente.EstadoID)))
+    return _cliente_guardado(session, cliente)
+
+
+# Lotes de clientes para exportar (se leen por partes al generar el archivo)
+def lotes_exportacion_clientes(session):
+    return lotes_clientes(session)
+
+
+# ---- Pagos ----
+
+# Cada cliente tiene su propio grupo en la caché: registrar un pago invalida solo el historial de ese cliente
+def _grupo_pagos(cliente_id):
+    return f'pagos_cliente:{cliente_id}'
+
+
+# Historial de pagos de un cliente con el mes y el método de pago por nombre (los más recientes primero),
+# cacheado hasta que se registre o importe un pago del cliente
+def pagos_de_cliente(session, cliente_id):
+    return cache.obtener_o_calcular(_grupo_pagos(cliente_id), 'historial', lambda: consultar_pagos_cliente(session, cliente_id), ttl=TTL_HISTORIAL_PAGOS)
+
+
+# Registrar un pago y actualizar el resumen en la misma transacción
+def registrar_nuevo_pago(session, cliente_id, fecha_pago, mes, ano, monto, metodo_pago_id):
+    nuevo_pago = Pago(
+        ClienteID=cliente_id,
+        FechaPago=fecha_pago,
+        Mes=mes,
+        Ano=ano,
+        Monto=monto,
+        Metodo_de_PagoID=metodo_pago_id
+    )
+    session.add(nuevo_pago)
+    registrar_pago(session, nuevo_pago)
+    session.commit()
+    cache.invalidar('ingresos', _grupo_pagos(cliente_id))
+    return nuevo_pago.ID
+
+
+# ---- Importaciones ----
+
+def importar_pagos_archivo(session, archivo, nombre_archivo, metodo_defecto_id, simular):
+    resultado = importar_pagos(session, archivo, nombre_archivo, metodo_defecto_id, simular=simular)
+    if not simular:
+        session.commit()
+        cache.invalidar('ingresos', *map(_grupo_pagos, resultado['clientes']))
+    return resultado
+
+
+# Si otra importación (o un alta) crea un cliente con la misma cédula mientras tanto, el índice único
+# rechaza el duplicado: se descarta todo y se importa otra vez, y esas filas pasan a ser actualizaciones
+def importar_clientes_archivo(session, archivo, nombre_archivo, simular):
+    contenido = archivo.read()
+    for intento in range(2):
+        try:
+            resultado = importar_clientes(session, io.BytesIO(contenido), nombre_archivo, simular=simular)
+            if not simular:
+                session.commit()
+            break
+        except IntegrityError:
+            session.rollback()
+            if intento:
+                raise
+    if not simular:
+        cache.invalidar('clientes')
+        invalidar_indice()
+    return resultado
+
+
+# ---- Dashboard y morosos ----
+
+def _leer_snapshot(session):
+    snapshot = leer_snapshot(session)
+    if snapshot is None:
+        # Primera vez: se arma el snapshot en el momento
+        try:
+            refrescar_snapshot(session)
+            session.commit()
+        except IntegrityError:
+            # Otra sesión creó el snapshot al mismo tiempo: se lee el suyo
+            session.rollback()
+        snapshot = leer_snapshot(session)
+    return snapshot
+
+
+# Estadísticas de clientes y pagos desde el snapshot precalculado (una consulta)
+def obtener_estadisticas(session, anio_seleccionado=None, anios_comparar=None):
+    snapshot = _leer_snapshot(session)
+
+    # Clientes por estado (sin filtro de año)
+    clientes_por_estado = snapshot['clientes_por_estado']
+    total_clientes = sum(clientes_por_estado.values())
+    clientes_activos = clientes_por_estado.get(1, 0)  # EstadoID=1 es 'activo'
+    clientes_retirados = clientes_por_estado.get(2, 0)  # EstadoID=2 es 'retirado'
+    clientes_suspendidos = clientes_por_estado.get(3, 0)  # EstadoID=3 es 'suspendido'
+
+    # Ingresos mensuales del año seleccionado y de los años a comparar (0 si no hubo pagos)
+    anios = sorted(set(anios_comparar or []) | ({anio_seleccionado} if anio_seleccionado else set()))
+    ingresos_por_anio = snapshot['ingresos'].reindex(columns=anios, fill_value=0.0)
+    if anio_seleccionado:
+        ingresos_por_mes = ingresos_por_anio[anio_seleccionado].to_dict()
+    else:
+        # Si no se selecciona un año, inicializamos ingresos en 0
+        ingresos_por_mes = {mes: 0 for mes in MESES}
+
+    return {
+        'total_clientes': total_clientes,
+        'clientes_activos': clientes_activos,
+        'clientes_retirados': clientes_retirados,
+        'clientes_suspendidos': clientes_suspendidos,
+        'ingresos_por_mes': ingresos_por_mes,
+        'ingresos_por_anio': ingresos_por_anio,
+        'actualizado': snapshot['actualizado']
+    }
+
+
+# Ingresos mensuales (filas: meses, columnas: años) de los años indicados o de todos los del snapshot
+def ingresos_por_anio(session, anios=None):
+    snapshot = _leer_snapshot(session)
+    ingresos = snapshot['ingresos'] if anios is None else snapshot['ingresos'].reindex(columns=sorted(anios), fill_value=0.0)
+    return ingresos, snapshot['actualizado']
+
+
+def actualizar_estadisticas(session):
+    try:
+        refrescar_snapshot(session)
+        session.commit()
+    except IntegrityError:
+        # Otra sesión creó el snapshot al mismo tiempo: se actualiza el suyo
+        session.rollback()
+        refrescar_snapshot(session)
+        session.commit()
+
+
+# Reporte de morosos con deuda de al menos meses_deuda_minima meses; devuelve (df, avisos).
+# Con muchos clientes se reparte por rangos de ID en varios procesos (MOROSOS_TRABAJADORES).
+def reporte_morosos(session, meses_deuda_minima):
+    return calcular_morosos_paralelo(session, meses_deuda_minima)
+
+
+# Reporte de morosos a una fecha de corte pasada, con los pagos recibidos hasta esa fecha (historico.py).
+# Se guarda en la caché (grupo 'ingresos') porque recalcularlo exige cargar todos los pagos.
+def reporte_morosos_a_fecha(session, meses_deuda_minima, fecha):
+    return cache.obtener_o_calcular(
+        'ingresos', ('morosos_a_fecha', meses_deuda_minima, fecha),
+        lambda: historico.morosos_a_fecha(
+            historico.cargar_clientes(session), historico.cargar_pagos_fechados(session), fecha, meses_deuda_minima
+        )
+    )
+
+
+# Cierres de fin de mes (facturado, recaudado y morosos) ya guardados. Los calcula el hilo de
+# snapshot_dashboard.py (o python historico.py); la página solo los lee.
+def cierres_mensuales(session):
+    return historico.leer_cierres(session)
+
+
+# Encolar recordatorios por WhatsApp para los morosos y arrancar el despachador en segundo plano.
+# El despachador (y con él el enviador) se crea antes de encolar: si no se puede enviar, no queda nada en cola.
+def enviar_recordatorios(session, df_morosos):
+    despachador = obtener_despachador()
+    encolados, omitidos = encolar_recordatorios(session, df_morosos)
+    session.commit()
+    despachador.iniciar()
+    return encolados, omitidos
+
+
+# Cantidad de recordatorios por estado
+def estado_recordatorios(session):
+    return resumen_envios(session)
+
+
+# ---- Analítica (snapshot Parquet, sin consultar la base) ----
+
+# Manifiesto del snapshot de analítica vigente (fecha, años, filas), o None si todavía no hay
+def estado_analitica():
+    return analitica.leer_manifiesto()
+
+
+# (pyarrow instalado, exportación periódica en segundo plano activa)
+def disponibilidad_analitica():
+    return analitica.disponible(), analitica.disponible() and analitica.INTERVALO > 0
+
+
+def actualizar_analitica(session):
+    return analitica.exportar_snapshot(session)
+
+
+# Resultado de una consulta sobre el snapshot vigente, cacheado por snapshot; None si no hay snapshot
+def _consulta_analitica(calcular, *parametros):
+    manifiesto = analitica.leer_manifiesto()
+    if manifiesto is None:
+        return None
+    return cache.obtener_o_calcular(
+        'analitica', (manifiesto['snapshot'], calcular.__name__, parametros),
+        lambda: calcular(analitica.ruta_snapshot(manifiesto), *parametros)
+    )
+
+
+def ingresos_por_tipo_servicio(anios=None):
+    return _consulta_analitica(analitica.ingresos_por_tipo_servicio, tuple(anios) if anios else None)
+
+
+def arpu_mensual(anios=None):
+    return _consulta_analitica(analitica.arpu_mensual, tuple(anios) if anios else None)
+
+
+def bajas_por_mes_instalacion():
+    return _consulta_analitica(analitica.bajas_por_mes_instalacion)
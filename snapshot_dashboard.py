@@ -0,0 +1,117 @@
+import argparse
+import json
+import os
+import threading
+import time
+import traceback
+from datetime import datetime
+import pandas as pd
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from models import Cliente, ResumenIngresoMensual, SnapshotDashboard
+from estadisticas import MESES, contar_clientes_por_estado
+from db_config import session_scope
+import historico
+
+# Indicadores del Dashboard (clientes por estado e ingresos mensuales de todos los años)
+# guardados en una sola fila, para que la página los lea con una consulta.
+#
+# La actualización es incremental:
+#   - Ingresos: se copian del resumen mensual (resumen_ingresos), que libro_pagos.py actualiza en la
+#     misma transacción que cada pago. Son unas pocas filas por año y siempre reflejan los pagos
+#     confirmados, aunque se confirmen en otro orden que el de sus ID.
+#   - Clientes: solo se vuelven a contar si algún cliente cambió (clientes.Actualizado) desde el último conteo.
+# Si los pagos se corrigen a mano en la base, reconstruir el resumen con: python libro_pagos.py --reconstruir
+#
+# El mismo hilo calcula los cierres de fin de mes que falten (historico.py); el Dashboard solo los lee.
+
+INTERVALO = int(os.environ.get('SNAPSHOT_INTERVALO', 60))  # Segundos entre actualizaciones en segundo plano
+
+
+# Actualizar el snapshot (o volver a contar los clientes con completo=True); devuelve la fila actualizada.
+# La primera vez crea la fila: si otra sesión la crea al mismo tiempo, el commit falla con IntegrityError.
+def refrescar_snapshot(session, completo=False):
+    snapshot = session.query(SnapshotDashboard).filter_by(ID=1).with_for_update().first()
+    if snapshot is None:
+        snapshot = SnapshotDashboard(ID=1)
+        session.add(snapshot)
+    if completo:
+        snapshot.ClientesPorEstado = None
+
+    inicio = datetime.now()
+    ultimo_cambio = session.query(func.max(Cliente.Actualizado)).scalar()
+    if snapshot.ClientesPorEstado is None or (ultimo_cambio is not None and ultimo_cambio >= snapshot.ClientesContados):
+        snapshot.ClientesPorEstado = json.dumps(contar_clientes_por_estado(session))
+        snapshot.ClientesContados = inicio
+
+    ingresos = {}
+    filas = session.query(ResumenIngresoMensual.Ano, ResumenIngresoMensual.Mes, ResumenIngresoMensual.Total)
+    for ano, mes, total in filas:
+        ingresos.setdefault(str(ano), [0.0] * 12)[mes - 1] = float(total or 0.0)
+    snapshot.IngresosMensuales = json.dumps(ingresos)
+
+    snapshot.Actualizado = datetime.now()
+    return snapshot
+
+
+# Leer el snapshot: clientes por EstadoID, ingresos (meses x años) y fecha de actualización; None si no existe
+def leer_snapshot(session):
+    snapshot = session.get(SnapshotDashboard, 1)
+    if snapshot is None or snapshot.ClientesPorEstado is None:
+        return None
+    ingresos = json.loads(snapshot.IngresosMensuales or '{}')
+    return {
+        'clientes_por_estado': {int(estado_id): total for estado_id, total in json.loads(snapshot.ClientesPorEstado).items()},
+        'ingresos': pd.DataFrame({int(ano): totales for ano, totales in ingresos.items()}, index=MESES),
+        'actualizado': snapshot.Actualizado
+    }
+
+
+_hilo = None
+_lock = threading.Lock()
+
+
+# Guardar los cierres de los meses ya cerrados que falten; devuelve la cantidad calculada
+def actualizar_cierres():
+    try:
+        with session_scope() as session:
+            return historico.actualizar_cierres(session)
+    except IntegrityError:
+        # Otro proceso guardó los mismos cierres al mismo tiempo: quedan los suyos
+        return 0
+
+
+def _actualizar_periodicamente(intervalo):
+    while True:
+        try:
+            with session_scope() as session:
+                refrescar_snapshot(session)
+        except Exception:
+            traceback.print_exc()
+        try:
+            actualizar_cierres()
+        except Exception:
+            traceback.print_exc()
+        time.sleep(intervalo)
+
+
+# Hilo único por proceso que mantiene el snapshot al día (persiste entre las ejecuciones del script de Streamlit)
+def iniciar_actualizacion_periodica(intervalo=INTERVALO):
+    global _hilo
+    with _lock:
+        if _hilo is None or not _hilo.is_alive():
+            _hilo = threading.Thread(target=_actualizar_periodicamente, args=(intervalo,), name='snapshot-dashboard', daemon=True)
+            _hilo.start()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Actualizar el snapshot de indicadores del Dashboard.')
+    parser.add_argument('--completo', action='store_true', help='Volver a contar los clientes aunque no hayan cambiado')
+    parser.add_argument('--cada', type=int, default=None, help='Repetir cada N segundos (en lugar de usar cron)')
+    args = parser.parse_args()
+
+    with session_scope() as session:
+        snapshot = refrescar_snapshot(session, args.completo)
+        print(f'Snapshot actualizado ({snapshot.Actualizado:%Y-%m-%d %H:%M:%S})')
+    if args.cada:
+        _actualizar_periodicamente(args.cada)
@@ -0,0 +1,46 @@
+from datetime import date
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+import analitica
+from libro_pagos import registrar_pagos_masivo
+from models import Base, Pago
+
+pq = pytest.importorskip('pyarrow.parquet')
+
+
+def _pago(pago_id, ano, mes, monto):
+    return {'ID': pago_id, 'ClienteID': 1, 'Ano': ano, 'Mes': mes, 'Monto': monto, 'FechaPago': date(ano, mes, 5)}
+
+
+# Guardar los pagos y actualizar el resumen, como importar_pagos
+def _registrar(session, pagos):
+    session.bulk_insert_mappings(Pago, pagos)
+    registrar_pagos_masivo(session, pagos)
+    session.commit()
+
+
+def _ids(manifiesto, directorio, anio):
+    tabla = pq.read_table(analitica._particion(analitica.ruta_snapshot(manifiesto, directorio), anio))
+    return sorted(tabla['ID'].to_pylist())
+
+
+# Un pago con ID menor que confirma después de una exportación se incluye en la siguiente;
+# solo se reescribe el año que cambió
+def test_exportacion_por_meses_cambiados(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'analitica.db'}")
+    Base.metadata.create_all(engine)
+    directorio = str(tmp_path / 'snapshots')
+    with sessionmaker(bind=engine)() as session:
+        _registrar(session, [_pago(2, 2024, 5, 100.0), _pago(3, 2025, 3, 80.0)])
+        primero = analitica.exportar_snapshot(session, directorio)
+        assert primero['anios_reescritos'] == [2024, 2025]
+
+        _registrar(session, [_pago(1, 2025, 3, 50.0)])
+        segundo = analitica.exportar_snapshot(session, directorio)
+        assert segundo['anios_reescritos'] == [2025]
+        assert _ids(segundo, directorio, 2025) == [1, 3]
+        assert _ids(segundo, directorio, 2024) == [2]
+
+        tercero = analitica.exportar_snapshot(session, directorio)
+        assert tercero['anios_reescritos'] == [] and tercero['pagos'] == 3
@@ -0,0 +1,109 @@
+import gzip
+import json
+from functools import partial
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+import api
+from api import codificar_cursor, decodificar_cursor, procesar
+from benchmarks.datos_sinteticos import cargar_datos
+from cache import cache
+from db_config import session_scope
+
+TOKEN = 'token-de-prueba'
+AUTORIZADO = {'authorization': f'Bearer {TOKEN}'}
+
+
+@pytest.fixture(scope='module')
+def fabrica(tmp_path_factory):
+    engine = create_engine(f"sqlite:///{tmp_path_factory.mktemp('api') / 'api.db'}")
+    cargar_datos(engine, 300, pagos_por_cliente=3, semilla=5)
+    return sessionmaker(bind=engine)
+
+
+# Cada prueba usa la base sintética, el token de prueba y la caché vacía
+@pytest.fixture(autouse=True)
+def base(fabrica, monkeypatch):
+    monkeypatch.setattr(api, 'session_scope', partial(session_scope, fabrica))
+    monkeypatch.setattr(api, 'API_TOKEN', TOKEN)
+    cache.invalidar('clientes', 'ingresos')
+
+
+def _get(ruta, consulta='', **encabezados):
+    return procesar('GET', ruta, consulta, {**AUTORIZADO, **encabezados})
+
+
+def test_etag_y_304():
+    estado, respuesta, cuerpo = _get('/clientes/1')
+    assert estado == 200 and json.loads(cuerpo)['ID'] == 1
+    valor_etag = dict(respuesta)['etag']
+
+    estado, respuesta, cuerpo = _get('/clientes/1', **{'if-none-match': valor_etag.removeprefix('W/')})
+    assert (estado, cuerpo) == (304, b'')
+    assert dict(respuesta)['etag'] == valor_etag
+    assert _get('/clientes/2', **{'if-none-match': valor_etag})[0] == 200
+
+
+def test_gzip():
+    _, respuesta, sin_comprimir = _get('/clientes', 'tamano=50')
+    assert 'content-encoding' not in dict(respuesta)
+
+    estado, respuesta, cuerpo = _get('/clientes', 'tamano=50', **{'accept-encoding': 'gzip, deflate'})
+    assert estado == 200 and dict(respuesta)['content-encoding'] == 'gzip'
+    assert gzip.decompress(cuerpo) == sin_comprimir
+
+    # Las respuestas chicas no se comprimen
+    _, respuesta, _ = _get('/clientes/1', **{'accept-encoding': 'gzip'})
+    assert 'content-encoding' not in dict(respuesta)
+
+
+@pytest.mark.parametrize('encabezados', [{}, {'authorization': 'Bearer otro'}, {'authorization': 'Bearer contraseña'}])
+def test_401(encabezados):
+    estado, _, cuerpo = procesar('GET', '/ingresos', '', encabezados)
+    assert estado == 401 and json.loads(cuerpo) == {'error': 'token inválido'}
+
+
+def test_sin_token_configurado_no_atiende(monkeypatch):
+    monkeypatch.setattr(api, 'API_TOKEN', None)
+    assert procesar('GET', '/ingresos', '', {})[0] == 401
+
+
+@pytest.mark.parametrize('metodo, ruta, consulta, estado', [
+    ('GET', '/clientes/999999', '', 404),
+    ('GET', '/clientes/999999/pagos', '', 404),
+    ('GET', '/no-existe', '', 404),
+    ('GET', '/clientes', 'tamano=0', 400),
+    ('GET', '/clientes', 'tamano=abc', 400),
+    ('GET', '/clientes', 'orden=Telefono', 400),
+    ('GET', '/clientes', 'despues=no-es-un-cursor', 400),
+    ('GET', '/ingresos', 'anios=2024,dos', 400),
+    ('POST', '/clientes', '', 405),
+])
+def test_errores(metodo, ruta, consulta, estado):
+    estado_respuesta, respuesta, cuerpo = procesar(metodo, ruta, consulta, AUTORIZADO)
+    assert estado_respuesta == estado
+    assert 'error' in json.loads(cuerpo) and 'etag' not in dict(respuesta)
+
+
+def test_cursor_codificado():
+    assert decodificar_cursor(codificar_cursor(('gomez juan', 17))) == ('gomez juan', 17)
+    assert codificar_cursor(None) is None and decodificar_cursor('') is None
+
+
+# Recorrer todas las páginas con el cursor "siguiente" devuelve cada cliente una sola vez y en orden
+@pytest.mark.parametrize('orden', ['ID', 'Nombre'])
+def test_recorrer_con_cursor(orden):
+    vistos, despues = [], None
+    while True:
+        consulta = f'orden={orden}&tamano=70' + (f'&despues={despues}' if despues else '')
+        estado, _, cuerpo = _get('/clientes', consulta)
+        assert estado == 200
+        pagina = json.loads(cuerpo)
+        vistos += pagina['datos']
+        despues = pagina['siguiente']
+        if despues is None:
+            break
+    assert len(vistos) == pagina['total'] == 300
+    assert len({cliente['ID'] for cliente in vistos}) == 300
+    claves = [(cliente[orden], cliente['ID']) for cliente in vistos]
+    assert claves == sorted(claves)
@@ -0,0 +1,33 @@
+import pytest
+from archivos import parsear_numero
+
+
+@pytest.mark.parametrize('texto, esperado', [
+    ('45000', 45000.0),
+    ('45.000', 45000.0),
+    ('45,000', 45000.0),
+    ('$ 60.000', 60000.0),
+    ('1.234.567', 1234567.0),
+    ('1,234,567', 1234567.0),
+    ('1.234,50', 1234.5),
+    ('1,234.50', 1234.5),
+    ('1.234.567,89', 1234567.89),
+    ('45000,5', 45000.5),
+    ('45000.50', 45000.5),
+    ('0,5', 0.5),
+    ('-1.500', -1500.0),
+    ('2025', 2025.0),
+])
+def test_formatos_aceptados(texto, esperado):
+    assert parsear_numero(texto) == esperado
+
+
+# Formas que no permiten saber cuál es el separador decimal, o que no son números
+@pytest.mark.parametrize('texto', ['1.2345', '0.500', '1.23.4', '12.34.567', '1.234.5', '1,234,5', '1.234,567,8', '1,2.3', 'abc', '', '.', '45.000,', None])
+def test_formatos_ambiguos_o_invalidos(texto):
+    assert parsear_numero(texto) is None
+
+
+def test_celdas_numericas_sin_cambios():
+    assert parsear_numero(45000) == 45000
+    assert parsear_numero(1234.5) == 1234.5
@@ -0,0 +1,129 @@
+import hashlib
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+import autenticacion
+import cache as modulo_cache
+import servicios
+from autenticacion import (IntentosExcedidos, LimiteIntentos, hash_password, verificar_password, necesita_rehash,
+                           crear_sesion, usuario_de_sesion, cerrar_sesion)
+from cache import CacheMemoria
+from models import Base, MasterUser
+
+
+class Reloj:
+    def __init__(self):
+        self.ahora = 1000.0
+
+    def __call__(self):
+        return self.ahora
+
+
+@pytest.fixture
+def reloj(monkeypatch):
+    reloj = Reloj()
+    monkeypatch.setattr(autenticacion.time, 'monotonic', reloj)
+    monkeypatch.setattr(modulo_cache.time, 'monotonic', reloj)
+    return reloj
+
+
+@pytest.fixture
+def fabrica(tmp_path, monkeypatch):
+    monkeypatch.setattr(autenticacion, 'limite_intentos', LimiteIntentos())
+    engine = create_engine(f"sqlite:///{tmp_path / 'usuarios.db'}")
+    Base.metadata.create_all(engine)
+    return sessionmaker(bind=engine)
+
+
+def test_hash_y_verificacion():
+    guardado = hash_password('clave secreta')
+    algoritmo, *_, sal, hash_ = guardado.split('$')
+    assert algoritmo == autenticacion.ALGORITMO
+    assert verificar_password(guardado, 'clave secreta')
+    assert not verificar_password(guardado, 'clave secret')
+    # Cada hash lleva su propia sal
+    assert hash_password('clave secreta') != guardado
+    assert not necesita_rehash(guardado)
+
+
+@pytest.mark.parametrize('guardado', [None, '', 'texto plano', 'scrypt$1$2$sal$hash', 'md5$abc$def'])
+def test_hash_no_valido(guardado):
+    assert not verificar_password(guardado, 'texto plano')
+
+
+# Si cambia el costo configurado, los hashes con el costo anterior se siguen aceptando pero piden rehash
+def test_rehash_al_cambiar_el_costo(monkeypatch):
+    guardado = hash_password('clave')
+    if autenticacion.ALGORITMO == 'scrypt':
+        monkeypatch.setattr(autenticacion, 'SCRYPT_N', autenticacion.SCRYPT_N * 2)
+    else:
+        monkeypatch.setattr(autenticacion, 'PBKDF2_ITERACIONES', autenticacion.PBKDF2_ITERACIONES + 1)
+    assert verificar_password(guardado, 'clave')
+    assert necesita_rehash(guardado)
+
+
+# Los hashes SHA-256 sin sal de versiones anteriores se aceptan y se reemplazan al iniciar sesión
+def test_rehash_de_sha256_antiguo(fabrica):
+    antiguo = hashlib.sha256('clave'.encode()).hexdigest()
+    with fabrica() as session:
+        session.add(MasterUser(Nombre='Ana', User='ana', Password=antiguo, Funcion='operador'))
+        session.commit()
+        assert verificar_password(antiguo, 'clave') and necesita_rehash(antiguo)
+
+        assert servicios.autenticar(session, 'ana', 'otra') is None
+        assert session.query(MasterUser).one().Password == antiguo
+
+        token, datos = servicios.autenticar(session, 'ana', 'clave')
+        assert datos['Funcion'] == 'operador'
+        assert usuario_de_sesion(token) == datos
+    with fabrica() as session:
+        nuevo = session.query(MasterUser).one().Password
+        assert nuevo.startswith(autenticacion.ALGORITMO + '$') and not necesita_rehash(nuevo)
+        assert servicios.autenticar(session, 'ana', 'clave') is not None
+
+
+# Tras MAX_INTENTOS_USUARIO fallos el usuario queda bloqueado (aun con la contraseña correcta)
+# hasta que sale de la ventana el fallo más antiguo; un inicio correcto reinicia la cuenta
+def test_bloqueo_por_usuario(fabrica, reloj):
+    with fabrica() as session:
+        servicios.crear_usuario(session, 'Ana', '1', '300', 'operador', 'ana', 'clave')
+        assert servicios.autenticar(session, 'ana', 'mala') is None
+        assert servicios.autenticar(session, 'ana', 'clave') is not None
+        for _ in range(autenticacion.MAX_INTENTOS_USUARIO):
+            reloj.ahora += 1
+            assert servicios.autenticar(session, 'ANA', 'mala') is None
+
+        with pytest.raises(IntentosExcedidos) as error:
+            servicios.autenticar(session, 'ana', 'clave')
+        assert error.value.segundos == autenticacion.VENTANA_INTENTOS - autenticacion.MAX_INTENTOS_USUARIO + 2
+
+        reloj.ahora += error.value.segundos
+        assert servicios.autenticar(session, 'ana', 'clave') is not None
+
+
+# Los fallos por IP cuentan aunque se prueben usuarios distintos (o inexistentes)
+def test_bloqueo_por_ip(fabrica, reloj, monkeypatch):
+    monkeypatch.setattr(autenticacion, 'MAX_INTENTOS_IP', 3)
+    with fabrica() as session:
+        servicios.crear_usuario(session, 'Ana', '1', '300', 'operador', 'ana', 'clave')
+        for usuario in ['luis', 'pedro', 'ana']:
+            assert servicios.autenticar(session, usuario, 'mala', ip='10.0.0.1') is None
+        with pytest.raises(IntentosExcedidos):
+            servicios.autenticar(session, 'ana', 'clave', ip='10.0.0.1')
+        assert servicios.autenticar(session, 'ana', 'clave', ip='10.0.0.2') is not None
+
+
+def test_expiracion_de_sesion(reloj, monkeypatch):
+    monkeypatch.setattr(autenticacion, '_sesiones', CacheMemoria())
+    token = crear_sesion({'ID': 1, 'User': 'ana'})
+    assert usuario_de_sesion(token) == {'ID': 1, 'User': 'ana'}
+    assert usuario_de_sesion('otro') is None and usuario_de_sesion(None) is None
+
+    reloj.ahora += autenticacion.DURACION_SESION - 1
+    assert usuario_de_sesion(token) is not None
+    reloj.ahora += 2
+    assert usuario_de_sesion(token) is None
+
+    token = crear_sesion({'ID': 1, 'User': 'ana'})
+    cerrar_sesion(token)
+    assert usuario_de_sesion(token) is None
@@ -0,0 +1,100 @@
+import random
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+import busqueda
+from busqueda import CAMPOS, IndiceClientes, normalizar
+from models import Base, Cliente
+
+NOMBRES = ['Juan Gómez', 'MARÍA López', 'josé pérez', 'Ana María Gomez', 'luis gomez', 'Jo', None]
+
+
+def _filas(cantidad, semilla=7):
+    rng = random.Random(semilla)
+    return [
+        (cliente_id, f'{rng.choice(NOMBRES)} {cliente_id}' if rng.random() > 0.1 else None,
+         str(rng.randint(1000000, 1099999)), f'3{rng.randint(100000000, 199999999)}',
+         f'10.0.{cliente_id // 256}.{cliente_id % 256}')
+        for cliente_id in range(1, cantidad + 1)
+    ]
+
+
+# Referencia: filtro de subcadena sobre las filas vigentes, como hacía la búsqueda con pandas
+def _filtrar(filas, texto, campos=None):
+    texto = normalizar(texto)
+    posiciones = [list(CAMPOS).index(campo) for campo in campos or CAMPOS]
+    return sorted(fila[0] for fila in filas if any(texto in normalizar(fila[1 + i]) for i in posiciones))
+
+
+TERMINOS = ['juan gom', 'GÓMEZ', 'mez 1', 'maría', '10.0.1.', '3155', '100', 'ana maría gomez 4', 'no existe',
+            'jo', 'j', '1', '', ' ', '.']
+
+
+def test_resultados_iguales_a_filtro_de_subcadena():
+    filas = _filas(2000)
+    indice = IndiceClientes(filas)
+    for texto in TERMINOS:
+        assert indice.buscar(texto, por_pagina=None)[0] == _filtrar(filas, texto), texto
+        for campo in CAMPOS:
+            assert indice.buscar(texto, campos=[campo], por_pagina=None)[0] == _filtrar(filas, texto, [campo]), texto
+
+
+# Los términos de menos de 3 caracteres no tienen trigramas: se resuelven con el recorrido directo
+def test_terminos_cortos_recorren_todas_las_filas():
+    filas = _filas(500)
+    indice = IndiceClientes(filas)
+    for texto in ['jo', 'é', '7', '.1']:
+        ids, total = indice.buscar(texto, por_pagina=None)
+        assert ids == _filtrar(filas, texto)
+        assert total == len(ids) > 0
+
+
+def test_paginacion():
+    filas = _filas(300)
+    indice = IndiceClientes(filas)
+    todos = _filtrar(filas, 'gomez')
+    assert indice.buscar('gomez', pagina=1, por_pagina=20) == (todos[20:40], len(todos))
+
+
+# Altas y ediciones posteriores a la construcción se acumulan aparte y se combinan con el índice base
+def test_actualizaciones_incrementales():
+    filas = _filas(1000)
+    indice = IndiceClientes(filas)
+    filas = {fila[0]: fila for fila in filas}
+    rng = random.Random(11)
+    for paso in range(300):
+        cliente_id = rng.choice(list(filas)) if paso % 2 else 5000 + paso
+        fila = (cliente_id, f'{rng.choice(NOMBRES)} editado {paso}', str(2000000 + paso), None, f'192.168.0.{paso % 256}')
+        filas[cliente_id] = fila
+        indice.actualizar(cliente_id, dict(zip(CAMPOS, fila[1:])))
+
+    assert indice.cantidad_cambios() == 300
+    for texto in TERMINOS + ['editado', 'editado 1', '2000', '192.168', 'juan gómez 1']:
+        assert indice.buscar(texto, por_pagina=None)[0] == _filtrar(filas.values(), texto), texto
+
+
+# actualizar_indice mantiene al día el índice compartido del proceso tras guardar un cliente
+def test_actualizar_indice_compartido(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'busqueda.db'}")
+    Base.metadata.create_all(engine)
+    monkeypatch.setattr(busqueda, '_indice', None)
+    with sessionmaker(bind=engine)() as session:
+        session.add_all([Cliente(NombreCliente='juan gomez', Cedula='123'), Cliente(NombreCliente='ana diaz', Cedula='456')])
+        session.commit()
+        assert busqueda.obtener_indice(session).buscar('gomez')[0] == [1]
+
+        cliente = session.get(Cliente, 2)
+        cliente.NombreCliente = 'ana gomez'
+        session.commit()
+        busqueda.actualizar_indice(cliente)
+        nuevo = Cliente(NombreCliente='pedro gomez', Cedula='789')
+        session.add(nuevo)
+        session.commit()
+        busqueda.actualizar_indice(nuevo)
+
+        indice = busqueda.obtener_indice(session)
+        assert indice.buscar('gomez')[0] == [1, 2, 3]
+        assert indice.buscar('diaz')[0] == []
+        assert indice.valor(2, 'Nombre') == 'ana gomez'
+
+        busqueda.invalidar_indice()
+        assert busqueda.obtener_indice(session).buscar('gomez')[0] == [1, 2, 3]
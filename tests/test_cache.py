@@ -0,0 +1,48 @@
+import cache as modulo_cache
+from cache import Cache, CacheMemoria, DURACION_VERSION
+
+
+class Reloj:
+    def __init__(self):
+        self.ahora = 1000.0
+
+    def __call__(self):
+        return self.ahora
+
+
+# Los grupos por cliente que ya no se invalidan se olvidan: la tabla de versiones no crece sin límite
+def test_versiones_de_grupos_por_cliente_acotadas(monkeypatch):
+    reloj = Reloj()
+    monkeypatch.setattr(modulo_cache.time, 'monotonic', reloj)
+    memoria = CacheMemoria()
+    cache = Cache(memoria)
+
+    for cliente_id in range(5000):
+        cache.obtener_o_calcular(f'pagos_cliente:{cliente_id}', 'historial', lambda: [cliente_id])
+        cache.invalidar(f'pagos_cliente:{cliente_id}')
+        reloj.ahora += 10
+    assert len(memoria._versiones) <= DURACION_VERSION // 10 + 1
+
+
+def test_invalidar_despues_de_olvidar_la_version(monkeypatch):
+    reloj = Reloj()
+    monkeypatch.setattr(modulo_cache.time, 'monotonic', reloj)
+    cache = Cache(CacheMemoria())
+    grupo = 'pagos_cliente:7'
+
+    assert cache.obtener_o_calcular(grupo, 'historial', lambda: 'v1') == 'v1'
+    cache.invalidar(grupo)
+    version_invalidada = cache.backend.version(grupo)
+    assert cache.obtener_o_calcular(grupo, 'historial', lambda: 'v2') == 'v2'
+    assert cache.obtener_o_calcular(grupo, 'historial', lambda: 'v3') == 'v2'
+
+    # Pasado DURACION_VERSION, otra invalidación olvida la versión del grupo, que vuelve a 0
+    reloj.ahora += DURACION_VERSION + 1
+    cache.invalidar('pagos_cliente:8')
+    assert cache.backend.version(grupo) == 0
+    assert cache.obtener_o_calcular(grupo, 'historial', lambda: 'v4') == 'v4'
+
+    # Al invalidarlo de nuevo no repite ninguna versión anterior
+    cache.invalidar(grupo)
+    assert cache.backend.version(grupo) > version_invalidada
+    assert cache.obtener_o_calcular(grupo, 'historial', lambda: 'v5') == 'v5'
@@ -0,0 +1,127 @@
+import io
+from datetime import date
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import sessionmaker
+import importar_clientes as modulo_importar
+import servicios
+from importar_clientes import importar_clientes
+from models import Base, Cliente, Estado, TipoServicio
+
+ENCABEZADO = 'Nombre;Plan;Fecha de instalación;Tipo de servicio;Tarifa;IP;Teléfono;Ubicación;Cédula;Estado\n'
+
+
+def _fabrica(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'clientes.db'}")
+    Base.metadata.create_all(engine)
+    fabrica = sessionmaker(bind=engine)
+    with fabrica() as session:
+        session.add_all([Estado(ID=1, Estado='activo'), Estado(ID=2, Estado='retirado'), TipoServicio(ID=1, Tipo='Fibra')])
+        session.add(Cliente(NombreCliente='ana diaz', Cedula='1.234.567', CedulaClave='1234567', Tarifa=60000.0,
+                            EstadoID=1, TipoServicioID=1, FechaInstalacion=date(2023, 1, 10)))
+        session.commit()
+    return fabrica
+
+
+def _planilla(*filas):
+    return io.BytesIO((ENCABEZADO + ''.join(fila + '\n' for fila in filas)).encode('utf-8'))
+
+
+FILAS = [
+    # Cédula existente con otro formato: se actualiza el cliente 1 (solo las columnas que trae la fila)
+    ';;;;80.000;;;;1234567;',
+    'Pedro Ruiz;10;2024-03-01;fibra;45000;10.0.0.2;3001112233;Centro;98765432;Activo',
+    # Retirado: la tarifa se guarda en 0
+    'Luis Mora;5;01/02/2024;Fibra;45000;;;Norte;55.555.555;retirado',
+    'Sin Cedula;5;2024-01-01;Fibra;1;;;;;activo',
+    'Repetido;5;2024-01-01;Fibra;1;;;;98.765.432;activo',
+    'Estado Raro;5;2024-01-01;Fibra;1;;;;111;moroso',
+    'Sin Tipo;5;2024-01-01;;1;;;;222;activo',
+    'Fecha Mala;5;31/31/2024;Fibra;1;;;;333;activo',
+    ';5;2024-01-01;Fibra;1;;;;444;activo',
+]
+
+
+def test_alta_y_actualizacion_por_cedula(tmp_path):
+    fabrica = _fabrica(tmp_path)
+    with fabrica() as session:
+        resultado = importar_clientes(session, _planilla(*FILAS), 'clientes.csv')
+        session.commit()
+
+        assert (resultado['leidas'], resultado['nuevos'], resultado['actualizados']) == (9, 2, 1)
+        existente = session.get(Cliente, 1)
+        assert (existente.NombreCliente, existente.Tarifa, existente.Cedula) == ('ana diaz', 80000.0, '1234567')
+        nuevos = {cliente.CedulaClave: cliente for cliente in session.query(Cliente).filter(Cliente.ID > 1)}
+        assert set(nuevos) == {'98765432', '55555555'}
+        assert (nuevos['98765432'].NombreCliente, nuevos['98765432'].FechaInstalacion) == ('pedro ruiz', date(2024, 3, 1))
+        assert nuevos['55555555'].Tarifa == 0.0 and nuevos['55555555'].EstadoID == 2
+
+
+def test_filas_rechazadas(tmp_path):
+    fabrica = _fabrica(tmp_path)
+    with fabrica() as session:
+        rechazadas = importar_clientes(session, _planilla(*FILAS), 'clientes.csv')['rechazadas']
+    assert [(rechazo['Fila'], rechazo['Motivo']) for rechazo in rechazadas] == [
+        (5, 'Falta la cédula'),
+        (6, 'Cédula repetida en el archivo (fila 3)'),
+        (7, "Estado no válido: 'moroso'"),
+        (8, 'Falta el tipo de servicio'),
+        (9, "Fecha de instalación no válida: '31/31/2024'"),
+        (10, 'Falta el nombre del cliente'),
+    ]
+
+
+# La simulación valida y cuenta igual que la importación, sin escribir nada
+def test_simular_no_escribe(tmp_path):
+    fabrica = _fabrica(tmp_path)
+    with fabrica() as session:
+        resultado = servicios.importar_clientes_archivo(session, _planilla(*FILAS), 'clientes.csv', simular=True)
+        assert (resultado['nuevos'], resultado['actualizados'], len(resultado['rechazadas'])) == (2, 1, 6)
+    with fabrica() as session:
+        assert session.query(Cliente).count() == 1
+        assert session.get(Cliente, 1).Tarifa == 60000.0
+
+
+# Otra importación crea el mismo cliente después de que esta leyó las cédulas: el índice único
+# rechaza el duplicado y la importación se repite, esta vez como actualización
+def test_cedula_creada_por_otra_importacion(tmp_path, monkeypatch):
+    fabrica = _fabrica(tmp_path)
+    indice_cedulas = modulo_importar.indice_cedulas
+
+    def indice_desactualizado(session):
+        indice = indice_cedulas(session)
+        with fabrica() as otra:
+            if otra.query(Cliente).filter_by(CedulaClave='98765432').count() == 0:
+                otra.add(Cliente(NombreCliente='pedro (otra importación)', Cedula='98765432', CedulaClave='98765432'))
+                otra.commit()
+                indice.pop('98765432', None)
+        return indice
+
+    monkeypatch.setattr(modulo_importar, 'indice_cedulas', indice_desactualizado)
+    with fabrica() as session:
+        resultado = servicios.importar_clientes_archivo(session, _planilla(FILAS[1]), 'clientes.csv', simular=False)
+        assert (resultado['nuevos'], resultado['actualizados']) == (0, 1)
+    with fabrica() as session:
+        pedros = session.query(Cliente).filter_by(CedulaClave='98765432').all()
+        assert [cliente.NombreCliente for cliente in pedros] == ['pedro ruiz']
+
+
+def test_cedula_unica_en_la_base(tmp_path):
+    fabrica = _fabrica(tmp_path)
+    with fabrica() as session:
+        session.add(Cliente(NombreCliente='otra ana', Cedula='1234567', CedulaClave='1234567'))
+        with pytest.raises(IntegrityError):
+            session.commit()
+
+
+# El alta y la edición desde el Dashboard no duplican la cédula de otro cliente
+def test_crear_o_editar_con_cedula_de_otro_cliente(tmp_path):
+    fabrica = _fabrica(tmp_path)
+    with fabrica() as session:
+        assert servicios.crear_cliente(session, {'NombreCliente': 'otra ana', 'Cedula': '1234567', 'EstadoID': 1}) is None
+        cliente_id = servicios.crear_cliente(session, {'NombreCliente': 'juan', 'Cedula': '777', 'EstadoID': 1})
+        assert cliente_id is not None
+        assert servicios.actualizar_cliente(session, cliente_id, {'Cedula': '1.234.567'}) is None
+        assert servicios.actualizar_cliente(session, cliente_id, {'Cedula': '777-1'}) == cliente_id
+        assert session.get(Cliente, cliente_id).CedulaClave == '7771'
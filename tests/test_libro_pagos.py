@@ -0,0 +1,91 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+import libro_pagos
+from libro_pagos import registrar_pagos_masivo
+from models import Base, Pago, ResumenPagoCliente, ResumenIngresoMensual
+
+
+def _fabrica(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'libro.db'}")
+    Base.metadata.create_all(engine)
+    return sessionmaker(bind=engine)
+
+
+# Otra transacción crea las filas de resumen después de que esta las buscó y no las encontró:
+# el pago se suma a las filas existentes en lugar de fallar con IntegrityError
+def test_primer_pago_concurrente(tmp_path, monkeypatch):
+    fabrica = _fabrica(tmp_path)
+    with fabrica() as otra:
+        registrar_pagos_masivo(otra, [{'ClienteID': 1, 'Ano': 2025, 'Mes': 3, 'Monto': 100.0}])
+        otra.commit()
+
+    leer_resumenes, leer_ingresos = libro_pagos._leer_resumenes, libro_pagos._leer_ingresos
+    primeras = {'resumenes': True, 'ingresos': True}
+
+    def resumenes_aun_no_creados(session, ids, tamano_bloque):
+        if primeras.pop('resumenes', False):
+            return {}
+        return leer_resumenes(session, ids, tamano_bloque)
+
+    def ingresos_aun_no_creados(session, periodos):
+        if primeras.pop('ingresos', False):
+            return {}
+        return leer_ingresos(session, periodos)
+
+    monkeypatch.setattr(libro_pagos, '_leer_resumenes', resumenes_aun_no_creados)
+    monkeypatch.setattr(libro_pagos, '_leer_ingresos', ingresos_aun_no_creados)
+    with fabrica() as session:
+        registrar_pagos_masivo(session, [{'ClienteID': 1, 'Ano': 2025, 'Mes': 3, 'Monto': 50.0}])
+        session.commit()
+
+        resumen = session.get(ResumenPagoCliente, 1)
+        assert (resumen.TotalPagado, resumen.CantidadPagos, resumen.UltimoAno, resumen.UltimoMes) == (150.0, 2, 2025, 3)
+        ingreso = session.get(ResumenIngresoMensual, (2025, 3))
+        assert (ingreso.Total, ingreso.CantidadPagos) == (150.0, 2)
+
+
+def test_pagos_nuevos_y_existentes(tmp_path):
+    fabrica = _fabrica(tmp_path)
+    with fabrica() as session:
+        registrar_pagos_masivo(session, [{'ClienteID': 1, 'Ano': 2025, 'Mes': 1, 'Monto': 10.0}])
+        session.commit()
+        registrar_pagos_masivo(session, [
+            {'ClienteID': 1, 'Ano': 2025, 'Mes': 2, 'Monto': 20.0},
+            {'ClienteID': 2, 'Ano': 2025, 'Mes': 2, 'Monto': 30.0},
+            {'ClienteID': 2, 'Ano': 2025, 'Mes': 13, 'Monto': 5.0}
+        ])
+        session.commit()
+
+        assert session.get(ResumenPagoCliente, 1).TotalPagado == 30.0
+        assert session.get(ResumenPagoCliente, 2).CantidadPagos == 2
+        assert libro_pagos.meses_pagados(session.get(ResumenPagoCliente, 1).MesesPagados) == [(2025, 1), (2025, 2)]
+        assert session.get(ResumenIngresoMensual, (2025, 2)).Total == 50.0
+
+
+
+# Los años que no caben en el mapa de meses pagados se rechazan antes de escribir nada
+def test_ano_fuera_del_mapa_rechazado(tmp_path):
+    fabrica = _fabrica(tmp_path)
+    with fabrica() as session:
+        for ano in (libro_pagos.ANO_BASE - 1, libro_pagos.ANO_MAXIMO + 1):
+            with pytest.raises(ValueError, match='fuera de rango'):
+                registrar_pagos_masivo(session, [
+                    {'ClienteID': 1, 'Ano': 2025, 'Mes': 1, 'Monto': 10.0},
+                    {'ClienteID': 1, 'Ano': ano, 'Mes': 1, 'Monto': 10.0}
+                ])
+            assert session.get(ResumenPagoCliente, 1) is None
+
+        registrar_pagos_masivo(session, [{'ClienteID': 1, 'Ano': libro_pagos.ANO_MAXIMO, 'Mes': 12, 'Monto': 10.0}])
+        mapa = session.get(ResumenPagoCliente, 1).MesesPagados
+        assert len(mapa) <= libro_pagos.BYTES_MAPA
+        assert libro_pagos.meses_pagados(mapa) == [(libro_pagos.ANO_MAXIMO, 12)]
+
+
+def test_reconstruir_con_ano_fuera_del_mapa(tmp_path):
+    fabrica = _fabrica(tmp_path)
+    with fabrica() as session:
+        session.add(Pago(ClienteID=1, Ano=1999, Mes=5, Monto=10.0))
+        session.flush()
+        with pytest.raises(ValueError, match='1 pago'):
+            libro_pagos.reconstruir_resumen(session)
@@ -0,0 +1,151 @@
+import random
+from calendar import monthrange
+from datetime import date
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from models import Base, Cliente, TipoServicio, Estado, Pago
+from morosidad import cargar_clientes, cargar_pagos, calcular_morosos
+
+# calcular_morosos debe dar el mismo reporte y los mismos avisos que el cálculo cliente por cliente
+# de la página Mostrar Morosos. La referencia es el bucle original con Mes numérico: el último pago
+# es el de mayor (Ano, Mes) y los pagos sin año o con mes fuera de 1-12 no cuentan (antes el último
+# pago se elegía por el nombre del mes en orden alfabético y un mes no válido omitía al cliente).
+
+
+# Cálculo original: una consulta de pagos por cliente y conjuntos de meses
+def morosos_por_cliente(session, meses_deuda_minima, hoy):
+    clientes = session.query(Cliente).all()
+    clientes_morosos = []
+    avisos = []
+
+    for cliente in clientes:
+        # Omitimos clientes con tarifa nula
+        if cliente.Tarifa is None or cliente.Tarifa == 0.0:
+            continue
+
+        # Verificamos el estado del cliente
+        if cliente.EstadoID in [2, 3]:  # Suspendido o retirado
+            continue
+
+        # Fecha de corte personalizada basada en la instalación
+        dia_corte = cliente.FechaInstalacion.day
+
+        # Tomar el último pago registrado del cliente
+        pagos = session.query(Pago).filter(
+            Pago.ClienteID == cliente.ID, Pago.Ano.isnot(None), Pago.Mes.between(1, 12)
+        ).order_by(Pago.Ano.desc(), Pago.Mes.desc()).all()
+        if pagos:
+            ultimo_pago = pagos[0]
+
+            # Validar el día de corte ajustándolo al último día del mes si es necesario
+            ano = ultimo_pago.Ano
+            mes = ultimo_pago.Mes
+            ultimo_dia_del_mes = monthrange(ano, mes)[1]  # Obtiene el último día del mes
+            dia_ajustado = min(dia_corte, ultimo_dia_del_mes)  # Ajusta el día si excede el máximo permitido
+
+            try:
+                fecha_ultimo_pago = date(ano, mes, dia_ajustado)
+            except Exception as e:
+                avisos.append(('error', f"Error al calcular la fecha del último pago para el cliente {cliente.NombreCliente}: {e}"))
+                continue
+        else:
+            # Si no hay pagos, usamos la fecha de instalación o el inicio de 2024
+            fecha_instalacion_ajustada = min(
+                cliente.FechaInstalacion.day,
+                monthrange(cliente.FechaInstalacion.year, cliente.FechaInstalacion.month)[1]
+            )
+            fecha_ultimo_pago = max(date(2024, 1, 1), cliente.FechaInstalacion.replace(day=fecha_instalacion_ajustada))
+
+        # Crear un conjunto de los meses desde el último pago hasta hoy
+        meses_totales = set()
+        for ano in range(fecha_ultimo_pago.year, hoy.year + 1):
+            for mes in range(1, 13):
+                if (ano == fecha_ultimo_pago.year and mes < fecha_ultimo_pago.month) or (ano == hoy.year and mes > hoy.month):
+                    continue
+                meses_totales.add((ano, mes))
+
+        # Crear un conjunto de los meses que ya han sido pagados
+        meses_pagados = set()
+        for pago in pagos:
+            meses_pagados.add((pago.Ano, pago.Mes))
+
+        # Identificar los meses de deuda (diferencia entre los meses totales y los pagados)
+        meses_deuda = meses_totales - meses_pagados
+
+        # Asegurarse de contar solo los meses vencidos con respecto al día de corte
+        meses_deuda_filtrados = {
+            (ano, mes) for (ano, mes) in meses_deuda if (ano < hoy.year or (ano == hoy.year and mes < hoy.month) or (ano == hoy.year and mes == hoy.month and hoy.day >= dia_corte))
+        }
+
+        # Si el cliente debe más meses de los seleccionados, calcular la deuda
+        if len(meses_deuda_filtrados) >= meses_deuda_minima:
+            total_deuda = len(meses_deuda_filtrados) * cliente.Tarifa
+            tipo_servicio = session.query(TipoServicio).filter_by(ID=cliente.TipoServicioID).first().Tipo
+            clientes_morosos.append({
+                'ID': cliente.ID,
+                'Nombre': cliente.NombreCliente,
+                'Telefono': cliente.Telefono,
+                'Ubicacion': cliente.Ubicacion,
+                'Fecha de Instalación': cliente.FechaInstalacion,
+                'Meses Deuda': len(meses_deuda_filtrados),
+                'Monto Deuda': total_deuda,
+                'Tipo de Servicio': tipo_servicio
+            })
+
+
+    return pd.DataFrame(clientes_morosos), avisos
+
+
+@pytest.fixture(scope='module')
+def session():
+    rng = random.Random(7)
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    session.add_all([TipoServicio(ID=1, Tipo='Fibra'), TipoServicio(ID=2, Tipo='Radio')])
+    session.add_all([Estado(ID=1, Estado='activo'), Estado(ID=2, Estado='retirado'), Estado(ID=3, Estado='suspendido')])
+    for cliente_id in range(1, 301):
+        ano, mes = rng.randint(2021, 2026), rng.randint(1, 12)
+        session.add(Cliente(
+            ID=cliente_id,
+            NombreCliente=f'cliente {cliente_id}',
+            FechaInstalacion=date(ano, mes, rng.randint(1, monthrange(ano, mes)[1])),
+            TipoServicioID=rng.randint(1, 2),
+            Tarifa=rng.choice([None, 0.0, 45000.0, 60000.0, 80000.0]),
+            EstadoID=rng.choice([1, 1, 1, 2, 3]),
+            Telefono='300',
+            Ubicacion='centro'
+        ))
+        for _ in range(rng.randint(0, 20)):
+            # Algunos pagos repetidos, sin año o con mes no válido
+            mes = rng.choice([rng.randint(1, 12)] * 30 + [0, 13, None])
+            ano = rng.choice([rng.randint(2023, 2026)] * 30 + [None])
+            session.add(Pago(ClienteID=cliente_id, Ano=ano, Mes=mes, Monto=10.0))
+    session.commit()
+    yield session
+    session.close()
+
+
+@pytest.mark.parametrize('hoy', [date(2026, 10, 18), date(2025, 1, 1), date(2024, 6, 30), date(2026, 2, 28)])
+@pytest.mark.parametrize('meses_deuda_minima', [1, 3])
+def test_igual_al_calculo_por_cliente(session, hoy, meses_deuda_minima):
+    esperado, avisos_esperados = morosos_por_cliente(session, meses_deuda_minima, hoy)
+    obtenido, avisos = calcular_morosos(cargar_clientes(session), cargar_pagos(session), meses_deuda_minima, hoy)
+
+    assert len(obtenido) > 0
+    pd.testing.assert_frame_equal(obtenido, esperado, check_dtype=False)
+    assert sorted(avisos) == sorted(avisos_esperados)
+
+
+# El bucle original fallaba con los clientes sin fecha de instalación; ahora se omiten con un aviso
+def test_cliente_sin_fecha_de_instalacion():
+    clientes = pd.DataFrame([{
+        'ID': 1, 'NombreCliente': 'ana', 'Telefono': '300', 'Ubicacion': 'centro', 'FechaInstalacion': None,
+        'Tarifa': 45000.0, 'EstadoID': 1, 'TipoServicioID': 1, 'Tipo': 'Fibra'
+    }])
+    pagos = pd.DataFrame(columns=['ClienteID', 'Ano', 'Mes'])
+    morosos, avisos = calcular_morosos(clientes, pagos, 1, date(2025, 6, 1))
+    assert morosos.empty
+    assert avisos == [('error', 'El cliente ana no tiene fecha de instalación. Ignorando cliente.')]
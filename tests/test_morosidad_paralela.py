@@ -0,0 +1,33 @@
+from datetime import date
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+import morosidad_paralela
+from benchmarks.datos_sinteticos import cargar_datos
+from morosidad_paralela import calcular_morosos_paralelo
+
+HOY = date(2025, 9, 20)
+
+
+# Base SQLite en archivo con datos sintéticos: los procesos del pool abren su propia conexión
+@pytest.fixture(scope='module')
+def engine(tmp_path_factory):
+    engine = create_engine(f"sqlite:///{tmp_path_factory.mktemp('paralela') / 'morosos.db'}")
+    cargar_datos(engine, 3000, pagos_por_cliente=4, semilla=11)
+    yield engine
+    if morosidad_paralela._pool is not None:
+        morosidad_paralela._pool.shutdown()
+        morosidad_paralela._pool = None
+
+
+@pytest.mark.parametrize('particionar_por, fuente', [('ID', 'resumen'), ('ID', 'pagos'), ('tipo', 'resumen')])
+@pytest.mark.parametrize('minimo', [1, 3])
+def test_particiones_igual_que_un_proceso(engine, particionar_por, fuente, minimo):
+    with Session(engine) as session:
+        esperado, avisos_esperados = calcular_morosos_paralelo(session, minimo, HOY, trabajadores=1, fuente=fuente)
+        morosos, avisos = calcular_morosos_paralelo(session, minimo, HOY, trabajadores=2, particionar_por=particionar_por,
+                                                    fuente=fuente, minimo_paralelo=0)
+    assert not esperado.empty
+    pd.testing.assert_frame_equal(morosos, esperado)
+    assert sorted(map(str, avisos)) == sorted(map(str, avisos_esperados))
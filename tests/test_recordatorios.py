@@ -0,0 +1,140 @@
+import sys
+from datetime import datetime, timedelta
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+import recordatorios
+import servicios
+from models import Base, EnvioRecordatorio
+from recordatorios import Despachador, EnviadorPrueba, LimiteEnvios, encolar_recordatorios, espera_reintento, resumen_envios
+
+MOROSOS = pd.DataFrame([
+    {'ID': 1, 'Nombre': 'ANA DIAZ', 'Telefono': '300 123 4567', 'Meses Deuda': 2, 'Monto Deuda': 90000.0},
+    {'ID': 2, 'Nombre': 'luis mora', 'Telefono': '573109876543', 'Meses Deuda': 4, 'Monto Deuda': 180000.0},
+    {'ID': 3, 'Nombre': 'sin telefono', 'Telefono': '12345', 'Meses Deuda': 1, 'Monto Deuda': 45000.0}
+])
+
+
+def _fabrica(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'recordatorios.db'}")
+    Base.metadata.create_all(engine)
+    fabrica = sessionmaker(bind=engine)
+    with fabrica() as session:
+        encolar_recordatorios(session, MOROSOS)
+        session.commit()
+    return fabrica
+
+
+def _envios(fabrica):
+    with fabrica() as session:
+        return {envio.ClienteID: envio for envio in session.query(EnvioRecordatorio)}
+
+
+# Sin pywhatkit el envío falla antes de encolar: no quedan recordatorios pendientes que nadie enviará
+def test_sin_pywhatkit_no_encola(monkeypatch):
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(engine)
+    monkeypatch.setitem(sys.modules, 'pywhatkit', None)
+    monkeypatch.setattr(recordatorios, '_despachador', None)
+    monkeypatch.delenv('WHATSAPP_ENVIADOR', raising=False)
+    morosos = pd.DataFrame([{'ID': 1, 'Nombre': 'ANA', 'Telefono': '3001234567', 'Meses Deuda': 2, 'Monto Deuda': 90000.0}])
+
+    with sessionmaker(bind=engine)() as session:
+        with pytest.raises(RuntimeError, match='pywhatkit'):
+            servicios.enviar_recordatorios(session, morosos)
+        session.rollback()
+        assert session.query(EnvioRecordatorio).count() == 0
+    assert recordatorios._despachador is None
+
+
+def test_despacho_exitoso(tmp_path):
+    fabrica = _fabrica(tmp_path)
+    enviador = EnviadorPrueba()
+    despachador = Despachador(enviador, fabrica, por_minuto=6000)
+
+    assert despachador.procesar_pendientes() == 2
+    assert despachador.procesar_pendientes() == 0
+    assert sorted(telefono for telefono, _ in enviador.enviados) == ['+573001234567', '+573109876543']
+    assert 'Ana Diaz' in dict(enviador.enviados)['+573001234567']
+    envios = _envios(fabrica)
+    assert (envios[1].Estado, envios[1].Intentos, envios[1].UltimoError) == ('enviado', 1, None)
+    assert envios[1].Enviado is not None
+    assert (despachador.enviados, despachador.fallidos) == (2, 0)
+
+
+# Un envío que falla vuelve a la cola con espera exponencial hasta agotar los intentos
+def test_reintentos_hasta_fallido(tmp_path, monkeypatch):
+    fabrica = _fabrica(tmp_path)
+    despachador = Despachador(EnviadorPrueba(fallar={'+573109876543'}), fabrica, por_minuto=6000, max_intentos=3)
+
+    antes = datetime.now()
+    despachador.procesar_pendientes()
+    envio = _envios(fabrica)[2]
+    assert (envio.Estado, envio.Intentos, envio.UltimoError) == ('pendiente', 1, 'Envío simulado fallido a +573109876543')
+    assert envio.ProximoIntento >= antes + timedelta(seconds=espera_reintento(1))
+    # Todavía no venció la espera: no se vuelve a tomar
+    assert despachador.procesar_pendientes() == 0
+
+    monkeypatch.setattr(recordatorios, 'ESPERA_BASE', 0)
+    with fabrica() as session:
+        session.query(EnvioRecordatorio).filter_by(ClienteID=2).update({'ProximoIntento': datetime.now()})
+        session.commit()
+    while despachador.procesar_pendientes():
+        pass
+
+    envios = _envios(fabrica)
+    assert (envios[2].Estado, envios[2].Intentos) == ('fallido', 3)
+    assert envios[1].Estado == 'enviado'
+    assert (despachador.enviados, despachador.fallidos) == (1, 1)
+    with fabrica() as session:
+        assert resumen_envios(session) == {'pendiente': 0, 'enviando': 0, 'enviado': 1, 'fallido': 1}
+
+
+def test_espera_exponencial_con_tope():
+    esperas = [espera_reintento(intentos) for intentos in range(1, 10)]
+    assert esperas[:3] == [recordatorios.ESPERA_BASE, 2 * recordatorios.ESPERA_BASE, 4 * recordatorios.ESPERA_BASE]
+    assert esperas == sorted(esperas) and max(esperas) == recordatorios.ESPERA_MAXIMA
+
+
+# Los envíos que quedaron en "enviando" al cortarse la aplicación se retoman al reiniciar
+def test_retomar_envios_interrumpidos(tmp_path):
+    fabrica = _fabrica(tmp_path)
+    with fabrica() as session:
+        session.query(EnvioRecordatorio).update({'Estado': 'enviando'})
+        session.commit()
+
+    enviador = EnviadorPrueba()
+    despachador = Despachador(enviador, fabrica, por_minuto=6000)
+    assert despachador.procesar_pendientes() == 0
+    assert despachador.recuperar_interrumpidos() == 2
+    assert despachador.procesar_pendientes() == 2
+    assert len(enviador.enviados) == 2
+    assert {envio.Estado for envio in _envios(fabrica).values()} == {'enviado'}
+
+
+# Con N envíos por minuto los turnos quedan separados 60 / N segundos, aunque lleguen todos juntos
+def test_limite_de_envios_por_minuto(monkeypatch):
+    reloj = [100.0]
+    esperas = []
+    monkeypatch.setattr(recordatorios.time, 'monotonic', lambda: reloj[0])
+    monkeypatch.setattr(recordatorios.time, 'sleep', esperas.append)
+
+    limite = LimiteEnvios(por_minuto=4)
+    for _ in range(3):
+        limite.esperar()
+    assert esperas == [0.0, 15.0, 30.0]
+
+    # Pasado el intervalo no hay que esperar
+    reloj[0] += 60
+    limite.esperar()
+    assert esperas[-1] == 0.0
+
+
+def test_despacho_respeta_el_limite(tmp_path, monkeypatch):
+    fabrica = _fabrica(tmp_path)
+    esperas = []
+    monkeypatch.setattr(recordatorios.time, 'sleep', esperas.append)
+    despachador = Despachador(EnviadorPrueba(), fabrica, hilos=2, por_minuto=2)
+    assert despachador.procesar_pendientes() == 2
+    assert sorted(esperas)[-1] == pytest.approx(30.0, abs=1.0)
@@ -0,0 +1,85 @@
+from datetime import date
+from functools import partial
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+import historico
+import servicios
+import snapshot_dashboard
+from benchmarks.datos_sinteticos import cargar_datos
+from db_config import session_scope
+from libro_pagos import registrar_pagos_masivo
+from models import Base, SnapshotDashboard
+from snapshot_dashboard import actualizar_cierres, leer_snapshot, refrescar_snapshot
+
+
+def _fabrica(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'snapshot.db'}")
+    Base.metadata.create_all(engine)
+    return sessionmaker(bind=engine)
+
+
+def _pago(pago_id, mes, monto):
+    return {'ID': pago_id, 'ClienteID': 1, 'Ano': 2025, 'Mes': mes, 'Monto': monto, 'FechaPago': date(2025, mes, 5)}
+
+
+# Un pago con ID menor que confirma después de una actualización también se suma
+def test_pago_confirmado_fuera_de_orden(tmp_path):
+    fabrica = _fabrica(tmp_path)
+    with fabrica() as session:
+        registrar_pagos_masivo(session, [_pago(2, 3, 100.0)])
+        session.commit()
+        refrescar_snapshot(session)
+        session.commit()
+
+        registrar_pagos_masivo(session, [_pago(1, 3, 50.0), _pago(3, 4, 70.0)])
+        session.commit()
+        refrescar_snapshot(session)
+        session.commit()
+
+        ingresos = leer_snapshot(session)['ingresos'][2025]
+        assert ingresos.iloc[2] == 150.0
+        assert ingresos.iloc[3] == 70.0
+
+
+# Dos sesiones crean el snapshot por primera vez al mismo tiempo: la que pierde lee el de la otra
+def test_primer_snapshot_concurrente(tmp_path, monkeypatch):
+    fabrica = _fabrica(tmp_path)
+    with fabrica() as otra:
+        registrar_pagos_masivo(otra, [_pago(1, 3, 100.0)])
+        refrescar_snapshot(otra)
+        otra.commit()
+
+    # La primera lectura no encuentra el snapshot y la creación choca con el de la otra sesión
+    leer = servicios.leer_snapshot
+    lecturas = iter([None])
+    monkeypatch.setattr(servicios, 'leer_snapshot', lambda session: next(lecturas, None) or leer(session))
+    monkeypatch.setattr(servicios, 'refrescar_snapshot', lambda session: session.add(SnapshotDashboard(ID=1)))
+    with fabrica() as session:
+        snapshot = servicios._leer_snapshot(session)
+    assert snapshot['ingresos'][2025].iloc[2] == 100.0
+
+
+# Otro proceso guarda los cierres mientras este los calcula: se descartan los propios y quedan los del otro
+def test_cierres_concurrentes(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'cierres.db'}")
+    cargar_datos(engine, 100, pagos_por_cliente=3)
+    fabrica = sessionmaker(bind=engine)
+    monkeypatch.setattr(snapshot_dashboard, 'session_scope', partial(session_scope, fabrica))
+
+    indicadores = historico.indicadores_a_fechas
+    otro_proceso = [True]
+
+    def calcular_mientras_otro_guarda(*args):
+        if otro_proceso:
+            otro_proceso.pop()
+            with session_scope(fabrica) as otra:
+                historico.actualizar_cierres(otra)
+        return indicadores(*args)
+
+    monkeypatch.setattr(historico, 'indicadores_a_fechas', calcular_mientras_otro_guarda)
+    assert actualizar_cierres() == 0
+    with fabrica() as session:
+        cierres = servicios.cierres_mensuales(session)
+        esperados = historico.fines_de_mes(historico.INICIO_COBRO, date.today().replace(day=1))
+    assert list(cierres['Fecha']) == esperados
+    assert actualizar_cierres() == 0